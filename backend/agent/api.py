@@ -3,7 +3,7 @@ from fastapi.responses import StreamingResponse
 import asyncio
 import json
 import traceback
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 import uuid
 from typing import Optional, List, Dict, Any
 import jwt
@@ -14,13 +14,19 @@ import os
 from agentpress.thread_manager import ThreadManager
 from services.supabase import DBConnection
 from services import redis
+from services import run_registry
+from services import run_lease
+from services import run_scheduler
+from services import run_affinity
 from utils.auth_utils import get_current_user_id_from_jwt, get_user_id_from_stream_auth, verify_thread_access
 from utils.logger import logger
-from services.billing import check_billing_status, can_use_model
+from services.billing import check_billing_status, can_use_model, get_subscription_tier_name
 from utils.config import config
 from sandbox.sandbox import create_sandbox, get_or_start_sandbox
+from sandbox import sandbox_pool
+from sandbox.file_upload import upload_files
 from services.llm import make_llm_api_call
-from run_agent_background import run_agent_background, _cleanup_redis_response_list, update_agent_run_status
+from run_agent_background import send_agent_run, _cleanup_redis_response_list, update_agent_run_status
 from utils.constants import MODEL_NAME_ALIASES
 
 # Initialize shared resources
@@ -130,20 +136,14 @@ async def cleanup():
     """Clean up resources and stop running agents on shutdown."""
     logger.info("Starting cleanup of agent API resources")
 
-    # Use the instance_id to find and clean up this instance's keys
+    # Use the instance_id to find and clean up this instance's runs
     try:
         if instance_id: # Ensure instance_id is set
-            running_keys = await redis.keys(f"active_run:{instance_id}:*")
-            logger.info(f"Found {len(running_keys)} running agent runs for instance {instance_id} to clean up")
-
-            for key in running_keys:
-                # Key format: active_run:{instance_id}:{agent_run_id}
-                parts = key.split(":")
-                if len(parts) == 3:
-                    agent_run_id = parts[2]
-                    await stop_agent_run(agent_run_id, error_message=f"Instance {instance_id} shutting down")
-                else:
-                    logger.warning(f"Unexpected key format found: {key}")
+            running_run_ids = await run_registry.get_instance_runs(instance_id)
+            logger.info(f"Found {len(running_run_ids)} running agent runs for instance {instance_id} to clean up")
+
+            for agent_run_id in running_run_ids:
+                await stop_agent_run(agent_run_id, error_message=f"Instance {instance_id} shutting down")
         else:
             logger.warning("Instance ID not set, cannot clean up instance-specific agent runs.")
 
@@ -179,6 +179,14 @@ async def stop_agent_run(agent_run_id: str, error_message: Optional[str] = None)
     if not update_success:
         logger.error(f"Failed to update database status for stopped/failed run {agent_run_id}")
 
+    # Drop the run from the scheduler queue, or free its slot for the next queued run
+    try:
+        await run_affinity.release(agent_run_id)
+        if await run_scheduler.release(agent_run_id):
+            await run_scheduler.dispatch(send_agent_run)
+    except Exception as e:
+        logger.warning(f"Failed to release agent run {agent_run_id} from the scheduler: {str(e)}")
+
     # Send STOP signal to the global control channel
     global_control_channel = f"agent_run:{agent_run_id}:control"
     try:
@@ -187,24 +195,18 @@ async def stop_agent_run(agent_run_id: str, error_message: Optional[str] = None)
     except Exception as e:
         logger.error(f"Failed to publish STOP signal to global channel {global_control_channel}: {str(e)}")
 
-    # Find all instances handling this agent run and send STOP to instance-specific channels
+    # Find the instance handling this agent run and send STOP to its instance-specific channel
     try:
-        instance_keys = await redis.keys(f"active_run:*:{agent_run_id}")
-        logger.debug(f"Found {len(instance_keys)} active instance keys for agent run {agent_run_id}")
-
-        for key in instance_keys:
-            # Key format: active_run:{instance_id}:{agent_run_id}
-            parts = key.split(":")
-            if len(parts) == 3:
-                instance_id_from_key = parts[1]
-                instance_control_channel = f"agent_run:{agent_run_id}:control:{instance_id_from_key}"
-                try:
-                    await redis.publish(instance_control_channel, "STOP")
-                    logger.debug(f"Published STOP signal to instance channel {instance_control_channel}")
-                except Exception as e:
-                    logger.warning(f"Failed to publish STOP signal to instance channel {instance_control_channel}: {str(e)}")
-            else:
-                 logger.warning(f"Unexpected key format found: {key}")
+        run_instance_id = await run_registry.get_run_instance(agent_run_id)
+        if run_instance_id:
+            instance_control_channel = f"agent_run:{agent_run_id}:control:{run_instance_id}"
+            try:
+                await redis.publish(instance_control_channel, "STOP")
+                logger.debug(f"Published STOP signal to instance channel {instance_control_channel}")
+            except Exception as e:
+                logger.warning(f"Failed to publish STOP signal to instance channel {instance_control_channel}: {str(e)}")
+        else:
+            logger.debug(f"No active instance registered for agent run {agent_run_id}")
 
         # Clean up the response list immediately on stop/fail
         await _cleanup_redis_response_list(agent_run_id)
@@ -214,38 +216,55 @@ async def stop_agent_run(agent_run_id: str, error_message: Optional[str] = None)
 
     logger.info(f"Successfully initiated stop process for agent run: {agent_run_id}")
 
-# async def restore_running_agent_runs():
-#     """Mark agent runs that were still 'running' in the database as failed and clean up Redis resources."""
-#     logger.info("Restoring running agent runs after server restart")
-#     client = await db.client
-#     running_agent_runs = await client.table('agent_runs').select('id').eq("status", "running").execute()
-
-#     for run in running_agent_runs.data:
-#         agent_run_id = run['id']
-#         logger.warning(f"Found running agent run {agent_run_id} from before server restart")
-
-#         # Clean up Redis resources for this run
-#         try:
-#             # Clean up active run key
-#             active_run_key = f"active_run:{instance_id}:{agent_run_id}"
-#             await redis.delete(active_run_key)
-
-#             # Clean up response list
-#             response_list_key = f"agent_run:{agent_run_id}:responses"
-#             await redis.delete(response_list_key)
+async def reap_orphaned_agent_runs():
+    """Mark agent runs that lost their worker as failed.
 
-#             # Clean up control channels
-#             control_channel = f"agent_run:{agent_run_id}:control"
-#             instance_control_channel = f"agent_run:{agent_run_id}:control:{instance_id}"
-#             await redis.delete(control_channel)
-#             await redis.delete(instance_control_channel)
-
-#             logger.info(f"Cleaned up Redis resources for agent run {agent_run_id}")
-#         except Exception as e:
-#             logger.error(f"Error cleaning up Redis resources for agent run {agent_run_id}: {e}")
+    A run is orphaned when its lease expired (the worker died or the run never
+    left the dramatiq queue) or when it is still 'running' in the database without
+    any lease after the queue lease would have expired (e.g. Redis was flushed).
+    Runs still waiting in the scheduler queue are not orphans.
+    """
+    client = await db.client
+    orphaned_ids = await run_lease.claim_expired()
+
+    cutoff = (datetime.now(timezone.utc) - timedelta(seconds=run_lease.QUEUED_LEASE_TTL)).isoformat()
+    stale_runs = await client.table('agent_runs').select('id').eq('status', 'running').lt('started_at', cutoff).limit(100).execute()
+    stale_ids = [run['id'] for run in stale_runs.data if run['id'] not in orphaned_ids]
+    leased = await run_lease.has_lease(stale_ids)
+    orphaned_ids += [agent_run_id for agent_run_id in stale_ids if not leased.get(agent_run_id)]
+
+    # Runs still waiting in the scheduler queue never had a worker, keep them leased until dispatched
+    queued_ids = await run_scheduler.get_queued(orphaned_ids)
+    for agent_run_id in queued_ids:
+        await run_lease.grant_queued(agent_run_id)
+    orphaned_ids = [agent_run_id for agent_run_id in orphaned_ids if agent_run_id not in queued_ids]
+    if not orphaned_ids:
+        return
+
+    run_lease.lease_stats["orphans_detected"] += len(orphaned_ids)
+    # Runs that finished but could not release their lease are not orphans
+    running = await client.table('agent_runs').select('id').in_('id', orphaned_ids).eq('status', 'running').execute()
+    for run in running.data:
+        agent_run_id = run['id']
+        logger.warning(f"Reaping orphaned agent run {agent_run_id}")
+        await stop_agent_run(agent_run_id, error_message="Agent run lost its worker (lease expired)")
+        try:
+            await run_registry.unregister(agent_run_id)
+        except Exception as e:
+            logger.warning(f"Failed to unregister orphaned agent run {agent_run_id}: {str(e)}")
+        run_lease.lease_stats["orphans_reaped"] += 1
 
-#         # Call stop_agent_run to handle status update and cleanup
-#         await stop_agent_run(agent_run_id, error_message="Server restarted while agent was running")
+async def run_orphan_reaper():
+    """Periodically reap orphaned agent runs and dispatch queued runs, for the lifetime of the API process."""
+    while True:
+        try:
+            await reap_orphaned_agent_runs()
+        except Exception as e:
+            logger.error(f"Error reaping orphaned agent runs: {str(e)}")
+        # Dispatch queued runs whose release was missed (e.g. a worker died)
+        await run_scheduler.dispatch(send_agent_run)
+        await run_lease.publish_stats()
+        await asyncio.sleep(config.RUN_ORPHAN_REAPER_INTERVAL)
 
 async def check_for_active_project_agent_run(client, project_id: str):
     """
@@ -453,16 +472,19 @@ async def start_agent(
     agent_run_id = agent_run.data[0]['id']
     logger.info(f"Created new agent run: {agent_run_id}")
 
-    # Register this run in Redis with TTL using instance ID
-    instance_key = f"active_run:{instance_id}:{agent_run_id}"
+    # Register this run in the Redis run registry under this instance
     try:
-        await redis.set(instance_key, "running", ex=redis.REDIS_KEY_TTL)
+        await run_registry.register(instance_id, agent_run_id)
+        await run_lease.grant_queued(agent_run_id)
     except Exception as e:
-        logger.warning(f"Failed to register agent run in Redis ({instance_key}): {str(e)}")
-
-    # Run the agent in the background
-    run_agent_background.send(
-        agent_run_id=agent_run_id, thread_id=thread_id, instance_id=instance_id,
+        logger.warning(f"Failed to register agent run {agent_run_id} in Redis: {str(e)}")
+
+    # Queue the run for the account, it is sent to the workers when a slot is free
+    await run_scheduler.submit(
+        send_agent_run, agent_run_id,
+        account_id=account_id, account_tier=get_subscription_tier_name(subscription),
+        lane=run_scheduler.get_run_lane(is_agent_builder),
+        thread_id=thread_id, instance_id=instance_id,
         project_id=project_id,
         model_name=model_name,  # Already resolved above
         enable_thinking=body.enable_thinking, reasoning_effort=body.reasoning_effort,
@@ -913,9 +935,13 @@ async def initiate_agent_with_files(
         # Trigger Background Naming Task
         asyncio.create_task(generate_and_update_project_name(project_id=project_id, prompt=prompt))
 
-        # 3. Create Sandbox
-        sandbox_pass = str(uuid.uuid4())
-        sandbox = create_sandbox(sandbox_pass, project_id)
+        # 3. Create Sandbox, taking a warm one from the pool when available
+        pooled = await sandbox_pool.claim(project_id)
+        if pooled:
+            sandbox, sandbox_pass = pooled
+        else:
+            sandbox_pass = str(uuid.uuid4())
+            sandbox = create_sandbox(sandbox_pass, project_id)
         sandbox_id = sandbox.id
         logger.info(f"Created new sandbox {sandbox_id} for project {project_id}")
 
@@ -945,52 +971,7 @@ async def initiate_agent_with_files(
         # 4. Upload Files to Sandbox (if any)
         message_content = prompt
         if files:
-            successful_uploads = []
-            failed_uploads = []
-            for file in files:
-                if file.filename:
-                    try:
-                        safe_filename = file.filename.replace('/', '_').replace('\\', '_')
-                        target_path = f"/workspace/{safe_filename}"
-                        logger.info(f"Attempting to upload {safe_filename} to {target_path} in sandbox {sandbox_id}")
-                        content = await file.read()
-                        upload_successful = False
-                        try:
-                            if hasattr(sandbox, 'fs') and hasattr(sandbox.fs, 'upload_file'):
-                                import inspect
-                                if inspect.iscoroutinefunction(sandbox.fs.upload_file):
-                                    await sandbox.fs.upload_file(target_path, content)
-                                else:
-                                    sandbox.fs.upload_file(target_path, content)
-                                logger.debug(f"Called sandbox.fs.upload_file for {target_path}")
-                                upload_successful = True
-                            else:
-                                raise NotImplementedError("Suitable upload method not found on sandbox object.")
-                        except Exception as upload_error:
-                            logger.error(f"Error during sandbox upload call for {safe_filename}: {str(upload_error)}", exc_info=True)
-
-                        if upload_successful:
-                            try:
-                                await asyncio.sleep(0.2)
-                                parent_dir = os.path.dirname(target_path)
-                                files_in_dir = sandbox.fs.list_files(parent_dir)
-                                file_names_in_dir = [f.name for f in files_in_dir]
-                                if safe_filename in file_names_in_dir:
-                                    successful_uploads.append(target_path)
-                                    logger.info(f"Successfully uploaded and verified file {safe_filename} to sandbox path {target_path}")
-                                else:
-                                    logger.error(f"Verification failed for {safe_filename}: File not found in {parent_dir} after upload attempt.")
-                                    failed_uploads.append(safe_filename)
-                            except Exception as verify_error:
-                                logger.error(f"Error verifying file {safe_filename} after upload: {str(verify_error)}", exc_info=True)
-                                failed_uploads.append(safe_filename)
-                        else:
-                            failed_uploads.append(safe_filename)
-                    except Exception as file_error:
-                        logger.error(f"Error processing file {file.filename}: {str(file_error)}", exc_info=True)
-                        failed_uploads.append(file.filename)
-                    finally:
-                        await file.close()
+            successful_uploads, failed_uploads = await upload_files(sandbox, files)
 
             if successful_uploads:
                 message_content += "\n\n" if message_content else ""
@@ -1017,15 +998,18 @@ async def initiate_agent_with_files(
         logger.info(f"Created new agent run: {agent_run_id}")
 
         # Register run in Redis
-        instance_key = f"active_run:{instance_id}:{agent_run_id}"
         try:
-            await redis.set(instance_key, "running", ex=redis.REDIS_KEY_TTL)
+            await run_registry.register(instance_id, agent_run_id)
+            await run_lease.grant_queued(agent_run_id)
         except Exception as e:
-            logger.warning(f"Failed to register agent run in Redis ({instance_key}): {str(e)}")
-
-        # Run agent in background
-        run_agent_background.send(
-            agent_run_id=agent_run_id, thread_id=thread_id, instance_id=instance_id,
+            logger.warning(f"Failed to register agent run {agent_run_id} in Redis: {str(e)}")
+
+        # Queue the run for the account, it is sent to the workers when a slot is free
+        await run_scheduler.submit(
+            send_agent_run, agent_run_id,
+            account_id=account_id, account_tier=get_subscription_tier_name(subscription),
+            lane=run_scheduler.get_run_lane(is_agent_builder),
+            thread_id=thread_id, instance_id=instance_id,
             project_id=project_id,
             model_name=model_name,  # Already resolved above
             enable_thinking=enable_thinking, reasoning_effort=reasoning_effort,
@@ -0,0 +1,210 @@
+"""
+Compiled system prompt cache.
+
+The system prompt of a run is split in two parts:
+- A static prefix (base or custom prompt, sample response, MCP tool listing)
+  that only changes with the agent configuration, the model family and the MCP
+  tool catalog. It is compiled once per key and reused byte-for-byte, so the
+  provider-side prompt cache keeps hitting across runs.
+- A small dynamic suffix with the current date and time, sent as a separate
+  text block after the prefix.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from agent.agent_builder_prompt import get_agent_builder_prompt
+from agent.gemini_prompt import get_gemini_system_prompt
+from agent.prompt import get_system_prompt
+from agentpress.tool import SchemaType
+from utils.logger import logger
+
+# Maximum number of compiled prompts kept per process
+PROMPT_CACHE_MAX_ENTRIES = 256
+
+_compiled_prompts: "OrderedDict[Tuple, str]" = OrderedDict()
+
+
+def get_model_family(model_name: str) -> str:
+    """Group models by the parts of the system prompt that depend on the model."""
+    model_name = model_name.lower()
+    if "gemini-2.5-flash" in model_name:
+        return "gemini-flash"
+    if "anthropic" in model_name:
+        return "anthropic"
+    return "default"
+
+
+@lru_cache(maxsize=1)
+def get_sample_response() -> str:
+    sample_response_path = os.path.join(os.path.dirname(__file__), 'sample_responses/1.txt')
+    with open(sample_response_path, 'r') as file:
+        return file.read()
+
+
+def _get_mcp_tool_schemas(mcp_wrapper_instance) -> List[Tuple[str, Dict[str, Any]]]:
+    """(method name, function schema) of every dynamic MCP tool, in registration order."""
+    tool_schemas = []
+    for method_name, schema_list in mcp_wrapper_instance.get_schemas().items():
+        if method_name == 'call_mcp_tool':
+            continue  # Skip the fallback method
+        for schema in schema_list:
+            if schema.schema_type == SchemaType.OPENAPI:
+                tool_schemas.append((method_name, schema.schema.get('function', {})))
+    return tool_schemas
+
+
+def get_mcp_catalog_hash(mcp_wrapper_instance) -> Optional[str]:
+    """Hash of the MCP tool catalog, None if no MCP tools are available."""
+    if not mcp_wrapper_instance or not mcp_wrapper_instance._initialized:
+        return None
+    try:
+        catalog = json.dumps(_get_mcp_tool_schemas(mcp_wrapper_instance), sort_keys=True, default=str)
+    except Exception as e:
+        logger.error(f"Error hashing MCP tool catalog: {e}")
+        return "unavailable"
+    return hashlib.sha256(catalog.encode()).hexdigest()
+
+
+def build_mcp_tool_info(mcp_wrapper_instance) -> str:
+    """System prompt section describing the available MCP tools."""
+    lines = [
+        "\n\n--- MCP Tools Available ---",
+        "You have access to external MCP (Model Context Protocol) server tools.",
+        "MCP tools can be called directly using their native function names in the standard function calling format:",
+        '<function_calls>',
+        '<invoke name="{tool_name}">',
+        '<parameter name="param1">value1</parameter>',
+        '<parameter name="param2">value2</parameter>',
+        '</invoke>',
+        '</function_calls>\n',
+        "Available MCP tools:",
+    ]
+    try:
+        for method_name, func_info in _get_mcp_tool_schemas(mcp_wrapper_instance):
+            description = func_info.get('description', 'No description available')
+            lines.append(f"- **{method_name}**: {description}")
+
+            # Show parameter info
+            props = func_info.get('parameters', {}).get('properties', {})
+            if props:
+                lines.append(f"  Parameters: {', '.join(props.keys())}")
+    except Exception as e:
+        logger.error(f"Error listing MCP tools: {e}")
+        lines.append("- Error loading MCP tool list")
+
+    # Add critical instructions for using search results
+    lines += [
+        "\n🚨 CRITICAL MCP TOOL RESULT INSTRUCTIONS 🚨",
+        "When you use ANY MCP (Model Context Protocol) tools:",
+        "1. ALWAYS read and use the EXACT results returned by the MCP tool",
+        "2. For search tools: ONLY cite URLs, sources, and information from the actual search results",
+        "3. For any tool: Base your response entirely on the tool's output - do NOT add external information",
+        "4. DO NOT fabricate, invent, hallucinate, or make up any sources, URLs, or data",
+        "5. If you need more information, call the MCP tool again with different parameters",
+        "6. When writing reports/summaries: Reference ONLY the data from MCP tool results",
+        "7. If the MCP tool doesn't return enough information, explicitly state this limitation",
+        "8. Always double-check that every fact, URL, and reference comes from the MCP tool output",
+        "\nIMPORTANT: MCP tool results are your PRIMARY and ONLY source of truth for external data!",
+        "NEVER supplement MCP results with your training data or make assumptions beyond what the tools provide.",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def _compile_system_prompt(model_family: str, agent_config: Optional[dict], is_agent_builder: bool, mcp_wrapper_instance) -> str:
+    if agent_config and agent_config.get('system_prompt'):
+        # Completely replace the default system prompt with the custom one
+        # This prevents confusion and tool hallucination
+        system_content = agent_config['system_prompt'].strip()
+    elif is_agent_builder:
+        system_content = get_agent_builder_prompt()
+    else:
+        if model_family == "gemini-flash":
+            system_content = get_gemini_system_prompt()
+        else:
+            # Use the original prompt - the LLM can only use tools that are registered
+            system_content = get_system_prompt()
+        # Add sample response for non-anthropic models
+        if model_family != "anthropic":
+            system_content += "\n\n <sample_assistant_response>" + get_sample_response() + "</sample_assistant_response>"
+
+    if mcp_wrapper_instance and mcp_wrapper_instance._initialized:
+        system_content += build_mcp_tool_info(mcp_wrapper_instance)
+    return system_content
+
+
+def get_compiled_system_prompt(
+    model_name: str,
+    agent_config: Optional[dict] = None,
+    is_agent_builder: bool = False,
+    mcp_wrapper_instance=None
+) -> str:
+    """Return the static system prompt prefix, compiling it on first use.
+
+    Compiled prompts are keyed by (agent_id, agent updated_at, model family,
+    MCP catalog hash), so editing an agent or its MCP servers yields a new prompt.
+    """
+    agent_config = agent_config or {}
+    agent_id = agent_config.get('agent_id')
+    updated_at = agent_config.get('updated_at')
+    # Agents without an id or timestamp (e.g. built in code) are keyed by their prompt
+    prompt_hash = None
+    if agent_config.get('system_prompt') and not (agent_id and updated_at):
+        prompt_hash = hashlib.sha256(agent_config['system_prompt'].encode()).hexdigest()
+
+    key = (
+        agent_id,
+        updated_at,
+        prompt_hash,
+        bool(is_agent_builder),
+        get_model_family(model_name),
+        get_mcp_catalog_hash(mcp_wrapper_instance),
+    )
+    compiled = _compiled_prompts.get(key)
+    if compiled is not None:
+        _compiled_prompts.move_to_end(key)
+        logger.debug(f"Using cached system prompt for agent {agent_id} ({key[4]})")
+        return compiled
+
+    compiled = _compile_system_prompt(key[4], agent_config, is_agent_builder, mcp_wrapper_instance)
+    _compiled_prompts[key] = compiled
+    if len(_compiled_prompts) > PROMPT_CACHE_MAX_ENTRIES:
+        _compiled_prompts.popitem(last=False)
+    logger.debug(f"Compiled system prompt for agent {agent_id} ({key[4]}), {len(compiled)} chars")
+    return compiled
+
+
+def get_dynamic_prompt_suffix(now: Optional[datetime.datetime] = None) -> str:
+    """Date and time section appended after the static system prompt prefix."""
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    return (
+        "\n\n--- CURRENT DATE AND TIME ---\n"
+        f"- CURRENT YEAR: {now.strftime('%Y')}\n"
+        f"- UTC DATE: {now.strftime('%Y-%m-%d')}\n"
+        f"- UTC TIME: {now.strftime('%H:%M:%S')}\n"
+    )
+
+
+def build_system_message(
+    model_name: str,
+    agent_config: Optional[dict] = None,
+    is_agent_builder: bool = False,
+    mcp_wrapper_instance=None
+) -> Dict[str, Any]:
+    """Build the system message: the cached prefix and the dynamic suffix as separate text blocks.
+
+    Keeping the suffix in its own block leaves the first block byte-identical
+    across runs; prompt caching is applied to that first block.
+    """
+    return {
+        "role": "system",
+        "content": [
+            {"type": "text", "text": get_compiled_system_prompt(model_name, agent_config, is_agent_builder, mcp_wrapper_instance)},
+            {"type": "text", "text": get_dynamic_prompt_suffix()},
+        ]
+    }
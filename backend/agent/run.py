@@ -1,6 +1,7 @@
 import os
 import json
 import re
+import asyncio
 from uuid import uuid4
 from typing import Optional
 
@@ -12,28 +13,47 @@ from agent.tools.web_search_tool import SandboxWebSearchTool
 from dotenv import load_dotenv
 from utils.config import config
 
-from agent.agent_builder_prompt import get_agent_builder_prompt
 from agentpress.thread_manager import ThreadManager
 from agentpress.response_processor import ProcessorConfig
+from agentpress.utils.cancellation import CancellationToken
 from agent.tools.sb_shell_tool import SandboxShellTool
 from agent.tools.sb_files_tool import SandboxFilesTool
 from agent.tools.sb_browser_tool import SandboxBrowserTool
 from agent.tools.data_providers_tool import DataProvidersTool
 from agent.tools.expand_msg_tool import ExpandMessageTool
-from agent.prompt import get_system_prompt
+from agent.prompt_cache import build_system_message
 from utils.logger import logger
 from utils.auth_utils import get_account_id_from_thread
-from services.billing import check_billing_status
+from services.billing import check_billing_status, get_subscription_tier_name
 from agent.tools.sb_vision_tool import SandboxVisionTool
 from services.langfuse import langfuse
 from langfuse.client import StatefulTraceClient
 from services.langfuse import langfuse
-from agent.gemini_prompt import get_gemini_system_prompt
 from agent.tools.mcp_tool_wrapper import MCPToolWrapper
 from agentpress.tool import SchemaType
+from agentpress.utils.json_helpers import ensure_dict
 
 load_dotenv()
 
+
+async def get_agent_run_state(client, thread_id: str) -> dict:
+    """Fetch the per-iteration thread state with a single RPC.
+
+    Returns the latest assistant/tool/user message type, the latest browser state
+    (without its base64 screenshot) and the latest image context. The image context
+    is left in the thread; the caller deletes it once it has been shown to the model.
+    """
+    result = await client.rpc('get_agent_run_state', {'p_thread_id': thread_id}).execute()
+    return ensure_dict(result.data)
+
+
+async def get_browser_screenshot_base64(client, message_id: str) -> Optional[str]:
+    """Fetch the base64 screenshot of a browser_state message."""
+    result = await client.table('messages').select('content').eq('message_id', message_id).limit(1).execute()
+    if not result.data:
+        return None
+    return ensure_dict(result.data[0]['content']).get('screenshot_base64')
+
 async def run_agent(
     thread_id: str,
     project_id: str,
@@ -48,7 +68,8 @@ async def run_agent(
     agent_config: Optional[dict] = None,    
     trace: Optional[StatefulTraceClient] = None,
     is_agent_builder: Optional[bool] = False,
-    target_agent_id: Optional[str] = None
+    target_agent_id: Optional[str] = None,
+    cancellation_token: Optional[CancellationToken] = None
 ):
     """Run the development agent with specified configuration."""
     logger.info(f"🚀 Starting agent with model: {model_name}")
@@ -168,105 +189,25 @@ async def run_agent(
                 logger.error(f"Failed to initialize MCP tools: {e}")
                 # Continue without MCP tools if initialization fails
 
-    # Prepare system prompt
-    # First, get the default system prompt
-    if "gemini-2.5-flash" in model_name.lower():
-        default_system_content = get_gemini_system_prompt()
-    else:
-        # Use the original prompt - the LLM can only use tools that are registered
-        default_system_content = get_system_prompt()
-        
-    # Add sample response for non-anthropic models
-    if "anthropic" not in model_name.lower():
-        sample_response_path = os.path.join(os.path.dirname(__file__), 'sample_responses/1.txt')
-        with open(sample_response_path, 'r') as file:
-            sample_response = file.read()
-        default_system_content = default_system_content + "\n\n <sample_assistant_response>" + sample_response + "</sample_assistant_response>"
-    
-    # Handle custom agent system prompt
+    # Prepare system prompt: the compiled prefix is cached per agent configuration,
+    # model family and MCP tool catalog, the current date and time follow it
     if agent_config and agent_config.get('system_prompt'):
-        custom_system_prompt = agent_config['system_prompt'].strip()
-        
-        # Completely replace the default system prompt with the custom one
-        # This prevents confusion and tool hallucination
-        system_content = custom_system_prompt
         logger.info(f"Using ONLY custom agent system prompt for: {agent_config.get('name', 'Unknown')}")
     elif is_agent_builder:
-        system_content = get_agent_builder_prompt()
         logger.info("Using agent builder system prompt")
     else:
-        # Use just the default system prompt
-        system_content = default_system_content
         logger.info("Using default system prompt only")
-    
-    # Add MCP tool information to system prompt if MCP tools are configured
-    if agent_config and agent_config.get('configured_mcps') and mcp_wrapper_instance and mcp_wrapper_instance._initialized:
-        mcp_info = "\n\n--- MCP Tools Available ---\n"
-        mcp_info += "You have access to external MCP (Model Context Protocol) server tools.\n"
-        mcp_info += "MCP tools can be called directly using their native function names in the standard function calling format:\n"
-        mcp_info += '<function_calls>\n'
-        mcp_info += '<invoke name="{tool_name}">\n'
-        mcp_info += '<parameter name="param1">value1</parameter>\n'
-        mcp_info += '<parameter name="param2">value2</parameter>\n'
-        mcp_info += '</invoke>\n'
-        mcp_info += '</function_calls>\n\n'
-        
-        # List available MCP tools
-        mcp_info += "Available MCP tools:\n"
-        try:
-            # Get the actual registered schemas from the wrapper
-            registered_schemas = mcp_wrapper_instance.get_schemas()
-            for method_name, schema_list in registered_schemas.items():
-                if method_name == 'call_mcp_tool':
-                    continue  # Skip the fallback method
-                    
-                # Get the schema info
-                for schema in schema_list:
-                    if schema.schema_type == SchemaType.OPENAPI:
-                        func_info = schema.schema.get('function', {})
-                        description = func_info.get('description', 'No description available')
-                        # Extract server name from description if available
-                        server_match = description.find('(MCP Server: ')
-                        if server_match != -1:
-                            server_end = description.find(')', server_match)
-                            server_info = description[server_match:server_end+1]
-                        else:
-                            server_info = ''
-                        
-                        mcp_info += f"- **{method_name}**: {description}\n"
-                        
-                        # Show parameter info
-                        params = func_info.get('parameters', {})
-                        props = params.get('properties', {})
-                        if props:
-                            mcp_info += f"  Parameters: {', '.join(props.keys())}\n"
-                            
-        except Exception as e:
-            logger.error(f"Error listing MCP tools: {e}")
-            mcp_info += "- Error loading MCP tool list\n"
-        
-        # Add critical instructions for using search results
-        mcp_info += "\n🚨 CRITICAL MCP TOOL RESULT INSTRUCTIONS 🚨\n"
-        mcp_info += "When you use ANY MCP (Model Context Protocol) tools:\n"
-        mcp_info += "1. ALWAYS read and use the EXACT results returned by the MCP tool\n"
-        mcp_info += "2. For search tools: ONLY cite URLs, sources, and information from the actual search results\n"
-        mcp_info += "3. For any tool: Base your response entirely on the tool's output - do NOT add external information\n"
-        mcp_info += "4. DO NOT fabricate, invent, hallucinate, or make up any sources, URLs, or data\n"
-        mcp_info += "5. If you need more information, call the MCP tool again with different parameters\n"
-        mcp_info += "6. When writing reports/summaries: Reference ONLY the data from MCP tool results\n"
-        mcp_info += "7. If the MCP tool doesn't return enough information, explicitly state this limitation\n"
-        mcp_info += "8. Always double-check that every fact, URL, and reference comes from the MCP tool output\n"
-        mcp_info += "\nIMPORTANT: MCP tool results are your PRIMARY and ONLY source of truth for external data!\n"
-        mcp_info += "NEVER supplement MCP results with your training data or make assumptions beyond what the tools provide.\n"
-        
-        system_content += mcp_info
-    
-    system_message = { "role": "system", "content": system_content }
+    system_message = build_system_message(
+        model_name,
+        agent_config=agent_config,
+        is_agent_builder=is_agent_builder,
+        mcp_wrapper_instance=mcp_wrapper_instance
+    )
 
     iteration_count = 0
     continue_execution = True
 
-    latest_user_message = await client.table('messages').select('*').eq('thread_id', thread_id).eq('type', 'user').order('created_at', desc=True).limit(1).execute()
+    latest_user_message = await client.table('messages').select('content').eq('thread_id', thread_id).eq('type', 'user').order('created_at', desc=True).limit(1).execute()
     if latest_user_message.data and len(latest_user_message.data) > 0:
         data = json.loads(latest_user_message.data[0]['content'])
         trace.update(input=data['content'])
@@ -275,8 +216,16 @@ async def run_agent(
         iteration_count += 1
         logger.info(f"🔄 Running iteration {iteration_count} of {max_iterations}...")
 
-        # Billing check on each iteration - still needed within the iterations
-        can_run, message, subscription = await check_billing_status(client, account_id)
+        if cancellation_token and cancellation_token.cancelled:
+            logger.info(f"Agent run cancelled ({cancellation_token.reason}), stopping execution")
+            break
+
+        # Billing check and thread state (latest message type, browser state, image context)
+        # are fetched concurrently; the thread state comes back in one round trip
+        (can_run, message, subscription), run_state = await asyncio.gather(
+            check_billing_status(client, account_id),
+            get_agent_run_state(client, thread_id)
+        )
         if not can_run:
             error_msg = f"Billing limit reached: {message}"
             trace.event(name="billing_limit_reached", level="ERROR", status_message=(f"{error_msg}"))
@@ -287,26 +236,22 @@ async def run_agent(
                 "message": error_msg
             }
             break
-        # Check if last message is from assistant using direct Supabase query
-        latest_message = await client.table('messages').select('*').eq('thread_id', thread_id).in_('type', ['assistant', 'tool', 'user']).order('created_at', desc=True).limit(1).execute()
-        if latest_message.data and len(latest_message.data) > 0:
-            message_type = latest_message.data[0].get('type')
-            if message_type == 'assistant':
-                logger.info(f"Last message was from assistant, stopping execution")
-                trace.event(name="last_message_from_assistant", level="DEFAULT", status_message=(f"Last message was from assistant, stopping execution"))
-                continue_execution = False
-                break
+        # Check if last message is from assistant
+        if run_state.get('latest_message_type') == 'assistant':
+            logger.info(f"Last message was from assistant, stopping execution")
+            trace.event(name="last_message_from_assistant", level="DEFAULT", status_message=(f"Last message was from assistant, stopping execution"))
+            continue_execution = False
+            break
 
         # ---- Temporary Message Handling (Browser State & Image Context) ----
         temporary_message = None
         temp_message_content_list = [] # List to hold text/image blocks
 
-        # Get the latest browser_state message
-        latest_browser_state_msg = await client.table('messages').select('*').eq('thread_id', thread_id).eq('type', 'browser_state').order('created_at', desc=True).limit(1).execute()
-        if latest_browser_state_msg.data and len(latest_browser_state_msg.data) > 0:
+        # Latest browser_state message (without its base64 screenshot)
+        latest_browser_state = run_state.get('browser_state')
+        if latest_browser_state:
             try:
-                browser_content = json.loads(latest_browser_state_msg.data[0]["content"])
-                screenshot_base64 = browser_content.get("screenshot_base64")
+                browser_content = ensure_dict(latest_browser_state.get('content'))
                 screenshot_url = browser_content.get("screenshot_url")
                 
                 # Create a copy of the browser state without screenshot data
@@ -328,14 +273,16 @@ async def run_agent(
                             "url": screenshot_url,
                         }
                     })
-                elif screenshot_base64:
-                    # Fallback to base64 if URL not available
-                    temp_message_content_list.append({
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{screenshot_base64}",
-                        }
-                    })
+                elif latest_browser_state.get('has_screenshot_base64'):
+                    # Fallback to base64 if URL not available, fetched only now that it's needed
+                    screenshot_base64 = await get_browser_screenshot_base64(client, latest_browser_state['message_id'])
+                    if screenshot_base64:
+                        temp_message_content_list.append({
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:image/jpeg;base64,{screenshot_base64}",
+                            }
+                        })
                 else:
                     logger.warning("Browser state found but no screenshot data.")
 
@@ -343,11 +290,11 @@ async def run_agent(
                 logger.error(f"Error parsing browser state: {e}")
                 trace.event(name="error_parsing_browser_state", level="ERROR", status_message=(f"{e}"))
 
-        # Get the latest image_context message (NEW)
-        latest_image_context_msg = await client.table('messages').select('*').eq('thread_id', thread_id).eq('type', 'image_context').order('created_at', desc=True).limit(1).execute()
-        if latest_image_context_msg.data and len(latest_image_context_msg.data) > 0:
+        # Latest image_context message, removed from the thread once added as it is only shown once
+        latest_image_context = run_state.get('image_context')
+        if latest_image_context:
             try:
-                image_context_content = json.loads(latest_image_context_msg.data[0]["content"])
+                image_context_content = ensure_dict(latest_image_context.get('content'))
                 base64_image = image_context_content.get("base64")
                 mime_type = image_context_content.get("mime_type")
                 file_path = image_context_content.get("file_path", "unknown file")
@@ -366,7 +313,7 @@ async def run_agent(
                 else:
                     logger.warning(f"Image context found for '{file_path}' but missing base64 or mime_type.")
 
-                await client.table('messages').delete().eq('message_id', latest_image_context_msg.data[0]["message_id"]).execute()
+                await client.table('messages').delete().eq('message_id', latest_image_context['message_id']).execute()
             except Exception as e:
                 logger.error(f"Error parsing image context: {e}")
                 trace.event(name="error_parsing_image_context", level="ERROR", status_message=(f"{e}"))
@@ -402,7 +349,7 @@ async def run_agent(
                     native_tool_calling=False,
                     execute_tools=True,
                     execute_on_stream=True,
-                    tool_execution_strategy="parallel",
+                    tool_execution_strategy="auto",
                     xml_adding_strategy="user_message"
                 ),
                 native_max_auto_continues=native_max_auto_continues,
@@ -410,7 +357,10 @@ async def run_agent(
                 enable_thinking=enable_thinking,
                 reasoning_effort=reasoning_effort,
                 enable_context_manager=enable_context_manager,
-                generation=generation
+                generation=generation,
+                account_id=account_id,
+                account_tier=get_subscription_tier_name(subscription),
+                cancellation_token=cancellation_token
             )
 
             if isinstance(response, dict) and "status" in response and response["status"] == "error":
@@ -234,17 +234,34 @@ class LinkedinProvider(RapidDataProviderBase):
             }
         }
         base_url = "https://linkedin-data-scraper.p.rapidapi.com"
-        super().__init__(base_url, endpoints)
+        # Profile and company lookups rarely change within a day, activity and searches do
+        cache_ttls = {
+            "profile_updates": 3600,
+            "profile_recent_comments": 3600,
+            "comments_from_recent_activity": 3600,
+            "company_jobs": 3600,
+            "company_updates": 3600,
+            "company_updates_post": 3600,
+            "search_posts_with_filters": 3600,
+            "search_jobs": 3600,
+            "search_people_with_filters": 3600,
+            "search_company_with_filters": 3600,
+        }
+        super().__init__(base_url, endpoints, default_cache_ttl=86400, cache_ttls=cache_ttls)
 
 
 if __name__ == "__main__":
+    import asyncio
     from dotenv import load_dotenv
     load_dotenv()
-    tool = LinkedinProvider()
 
-    result = tool.call_endpoint(
-        route="comments_from_recent_activity",
-        payload={"profile_url": "https://www.linkedin.com/in/adamcohenhillel/", "page": 1}
-    )
-    print(result)
+    async def main():
+        tool = LinkedinProvider()
+
+        result = await tool.call_endpoint(
+            route="comments_from_recent_activity",
+            payload={"profile_url": "https://www.linkedin.com/in/adamcohenhillel/", "page": 1}
+        )
+        print(result)
 
+    asyncio.run(main())
@@ -1,7 +1,15 @@
+import asyncio
+import hashlib
+import json
 import os
-import requests
+import random
+import httpx
 from typing import Dict, Any, Optional, TypedDict, Literal
 
+from services import redis
+from services.http_client import get_http_client
+from utils.logger import logger
+
 
 class EndpointSchema(TypedDict):
     route: str
@@ -11,27 +19,74 @@ class EndpointSchema(TypedDict):
     payload: Dict[str, Any]
 
 
+# Default response cache TTL (seconds) for endpoints without an explicit TTL
+DEFAULT_CACHE_TTL = 300
+
+# HTTP settings shared by all providers
+REQUEST_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 10.0
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+
+
+def _normalize_payload(payload: Optional[Dict[str, Any]]) -> str:
+    """Canonical form of a payload so equivalent requests share a cache entry"""
+    normalized = {
+        key: value.strip() if isinstance(value, str) else value
+        for key, value in (payload or {}).items()
+        if value is not None and value != ""
+    }
+    return json.dumps(normalized, sort_keys=True, separators=(",", ":"), default=str)
+
+
 class RapidDataProviderBase:
-    def __init__(self, base_url: str, endpoints: Dict[str, EndpointSchema]):
+    def __init__(
+            self,
+            base_url: str,
+            endpoints: Dict[str, EndpointSchema],
+            default_cache_ttl: int = DEFAULT_CACHE_TTL,
+            cache_ttls: Optional[Dict[str, int]] = None
+    ):
+        """
+        Args:
+            base_url (str): Base URL of the RapidAPI service
+            endpoints (Dict[str, EndpointSchema]): Endpoints keyed by route name
+            default_cache_ttl (int): Response cache TTL in seconds for endpoints not in cache_ttls
+            cache_ttls (Dict[str, int], optional): Per-endpoint cache TTLs in seconds, 0 disables caching
+        """
         self.base_url = base_url
         self.endpoints = endpoints
-    
+        self.default_cache_ttl = default_cache_ttl
+        self.cache_ttls = cache_ttls or {}
+
     def get_endpoints(self):
         return self.endpoints
-    
-    def call_endpoint(
+
+    def get_cache_ttl(self, route: str) -> int:
+        return self.cache_ttls.get(route, self.default_cache_ttl)
+
+    def _cache_key(self, route: str, payload: Optional[Dict[str, Any]]) -> str:
+        payload_hash = hashlib.sha256(_normalize_payload(payload).encode()).hexdigest()
+        host = self.base_url.split("//")[1].split("/")[0]
+        return f"data_provider:{host}:{route}:{payload_hash}"
+
+    async def call_endpoint(
             self,
             route: str,
             payload: Optional[Dict[str, Any]] = None
     ):
         """
         Call an API endpoint with the given parameters and data.
-        
+
+        Successful responses are cached in Redis per (route, normalized payload)
+        for the endpoint's TTL. Rate-limited (429) and gateway errors are retried
+        with exponential backoff, honouring Retry-After.
+
         Args:
-            endpoint (EndpointSchema): The endpoint configuration dictionary
-            params (dict, optional): Query parameters for GET requests
-            payload (dict, optional): JSON payload for POST requests
-            
+            route (str): The key of the endpoint to call
+            payload (dict, optional): Query parameters for GET requests or JSON body for POST requests
+
         Returns:
             dict: The JSON response from the API
         """
@@ -41,21 +96,53 @@ class RapidDataProviderBase:
         endpoint = self.endpoints.get(route)
         if not endpoint:
             raise ValueError(f"Endpoint {route} not found")
-        
+
+        method = endpoint.get('method', 'GET').upper()
+        if method not in ('GET', 'POST'):
+            raise ValueError(f"Unsupported HTTP method: {method}")
+
+        cache_ttl = self.get_cache_ttl(route)
+        cache_key = self._cache_key(route, payload) if cache_ttl > 0 else None
+        if cache_key:
+            try:
+                cached = await redis.get(cache_key)
+                if cached is not None:
+                    logger.debug(f"Data provider cache hit for {route}")
+                    return json.loads(cached)
+            except Exception as e:
+                logger.warning(f"Data provider cache read failed for {route}: {e}")
+
         url = f"{self.base_url}{endpoint['route']}"
-        
+
         headers = {
             "x-rapidapi-key": os.getenv("RAPID_API_KEY"),
             "x-rapidapi-host": url.split("//")[1].split("/")[0],
             "Content-Type": "application/json"
         }
 
-        method = endpoint.get('method', 'GET').upper()
-        
-        if method == 'GET':
-            response = requests.get(url, params=payload, headers=headers)
-        elif method == 'POST':
-            response = requests.post(url, json=payload, headers=headers)
-        else:
-            raise ValueError(f"Unsupported HTTP method: {method}")
-        return response.json()
+        client = get_http_client()
+        for attempt in range(MAX_RETRIES + 1):
+            if method == 'GET':
+                response = await client.get(url, params=payload, headers=headers, timeout=REQUEST_TIMEOUT)
+            else:
+                response = await client.post(url, json=payload, headers=headers, timeout=REQUEST_TIMEOUT)
+
+            if response.status_code not in RETRYABLE_STATUS_CODES or attempt == MAX_RETRIES:
+                break
+
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)) * (0.5 + random.random() / 2)
+            retry_after = response.headers.get("retry-after")
+            if retry_after and retry_after.isdigit():
+                delay = min(RETRY_MAX_DELAY, float(retry_after))
+            logger.warning(f"Data provider {route} returned {response.status_code}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+        result = response.json()
+
+        if cache_key and response.is_success:
+            try:
+                await redis.set(cache_key, json.dumps(result), ex=cache_ttl)
+            except Exception as e:
+                logger.warning(f"Data provider cache write failed for {route}: {e}")
+
+        return result
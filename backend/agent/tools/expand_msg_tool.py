@@ -1,4 +1,4 @@
-from agentpress.tool import Tool, ToolResult, openapi_schema, xml_schema
+from agentpress.tool import Tool, ToolResult, openapi_schema, xml_schema, read_only_tool
 from agentpress.thread_manager import ThreadManager
 import json
 
@@ -10,6 +10,7 @@ class ExpandMessageTool(Tool):
         self.thread_manager = thread_manager
         self.thread_id = thread_id
 
+    @read_only_tool(idempotent=True)
     @openapi_schema({
         "type": "function",
         "function": {
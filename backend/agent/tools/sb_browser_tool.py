@@ -1,12 +1,23 @@
 import traceback
 import json
 
-from agentpress.tool import ToolResult, openapi_schema, xml_schema
+from agentpress.tool import ToolResult, openapi_schema, xml_schema, read_only_tool
 from agentpress.thread_manager import ThreadManager
 from sandbox.tool_base import SandboxToolsBase
 from utils.logger import logger
 from utils.s3_upload_utils import upload_base64_image
 
+# Per-page content returned to the model by browser_fetch_pages is capped at this many characters
+FETCH_PAGES_MAX_CONTENT_CHARS = 20000
+
+# Page pool limits of the in-sandbox browser API (PAGE_POOL_MAX_URLS, PAGE_POOL_SIZE in browser_api.py)
+FETCH_PAGES_MAX_URLS = 20
+FETCH_PAGES_POOL_SIZE = 5
+# Worst case per page: navigation timeout (30s), settle, extraction, screenshot and tab reset
+FETCH_PAGES_PER_PAGE_SECONDS = 45
+# The exec waits for the slowest batch of pool pages to finish
+FETCH_PAGES_TIMEOUT = -(-FETCH_PAGES_MAX_URLS // FETCH_PAGES_POOL_SIZE) * FETCH_PAGES_PER_PAGE_SECONDS + 30
+
 
 class SandboxBrowserTool(SandboxToolsBase):
     """Tool for executing tasks in a Daytona sandbox with browser-use capabilities."""
@@ -15,6 +26,24 @@ class SandboxBrowserTool(SandboxToolsBase):
         super().__init__(project_id, thread_manager)
         self.thread_id = thread_id
 
+    def _build_curl_command(self, endpoint: str, params: dict = None, method: str = "POST") -> str:
+        """Build the curl command that calls the in-sandbox browser automation API"""
+        url = f"http://localhost:8003/api/automation/{endpoint}"
+        
+        if method == "GET" and params:
+            query_params = "&".join([f"{k}={v}" for k, v in params.items()])
+            url = f"{url}?{query_params}"
+            curl_cmd = f"curl -s -X {method} '{url}' -H 'Content-Type: application/json'"
+        else:
+            curl_cmd = f"curl -s -X {method} '{url}' -H 'Content-Type: application/json'"
+            if params:
+                json_data = json.dumps(params)
+                curl_cmd += f" -d '{json_data}'"
+        
+        logger.debug("\033[95mExecuting curl command:\033[0m")
+        logger.debug(f"{curl_cmd}")
+        return curl_cmd
+
     async def _execute_browser_action(self, endpoint: str, params: dict = None, method: str = "POST") -> ToolResult:
         """Execute a browser automation action through the API
         
@@ -30,22 +59,7 @@ class SandboxBrowserTool(SandboxToolsBase):
             # Ensure sandbox is initialized
             await self._ensure_sandbox()
             
-            # Build the curl command
-            url = f"http://localhost:8003/api/automation/{endpoint}"
-            
-            if method == "GET" and params:
-                query_params = "&".join([f"{k}={v}" for k, v in params.items()])
-                url = f"{url}?{query_params}"
-                curl_cmd = f"curl -s -X {method} '{url}' -H 'Content-Type: application/json'"
-            else:
-                curl_cmd = f"curl -s -X {method} '{url}' -H 'Content-Type: application/json'"
-                if params:
-                    json_data = json.dumps(params)
-                    curl_cmd += f" -d '{json_data}'"
-            
-            logger.debug("\033[95mExecuting curl command:\033[0m")
-            logger.debug(f"{curl_cmd}")
-            
+            curl_cmd = self._build_curl_command(endpoint, params, method)
             response = self.sandbox.process.exec(curl_cmd, timeout=30)
             
             if response.exit_code == 0:
@@ -943,4 +957,125 @@ class SandboxBrowserTool(SandboxToolsBase):
             dict: Result of the execution
         """
         logger.debug(f"\033[95mClicking at coordinates: ({x}, {y})\033[0m")
-        return await self._execute_browser_action("click_coordinates", {"x": x, "y": y})
\ No newline at end of file
+        return await self._execute_browser_action("click_coordinates", {"x": x, "y": y})
+
+    @read_only_tool(max_concurrency=1, idempotent=True)
+    @openapi_schema({
+        "type": "function",
+        "function": {
+            "name": "browser_fetch_pages",
+            "description": "Open several URLs in parallel background tabs and return the readable content of each page as markdown or plain text. Use this instead of navigating to pages one by one when you need to read multiple pages: all pages load concurrently, so the call takes roughly as long as the slowest page. The current tab is not changed. Screenshots are only captured when requested.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "urls": {
+                        "type": "string",
+                        "description": "Comma-separated list of URLs to fetch (maximum 20)"
+                    },
+                    "format": {
+                        "type": "string",
+                        "enum": ["markdown", "text"],
+                        "description": "Content format to extract from each page. Defaults to markdown.",
+                        "default": "markdown"
+                    },
+                    "include_screenshots": {
+                        "type": "boolean",
+                        "description": "Whether to capture a screenshot of each page. Defaults to false.",
+                        "default": False
+                    }
+                },
+                "required": ["urls"]
+            }
+        }
+    })
+    @xml_schema(
+        tag_name="browser-fetch-pages",
+        mappings=[
+            {"param_name": "urls", "node_type": "attribute", "path": "."},
+            {"param_name": "format", "node_type": "attribute", "path": ".", "required": False},
+            {"param_name": "include_screenshots", "node_type": "attribute", "path": ".", "required": False}
+        ],
+        example='''
+        <function_calls>
+        <invoke name="browser_fetch_pages">
+        <parameter name="urls">https://example.com/a,https://example.com/b,https://example.com/c</parameter>
+        <parameter name="format">markdown</parameter>
+        </invoke>
+        </function_calls>
+        '''
+    )
+    async def browser_fetch_pages(self, urls: str, format: str = "markdown", include_screenshots: bool = False) -> ToolResult:
+        """Fetch several pages in parallel browser tabs and extract their content
+        
+        Args:
+            urls (str): Comma-separated list of URLs to fetch
+            format (str, optional): "markdown" or "text". Defaults to "markdown".
+            include_screenshots (bool, optional): Capture a screenshot of each page. Defaults to False.
+            
+        Returns:
+            dict: Result of the execution
+        """
+        if isinstance(urls, list):
+            url_list = [str(url).strip() for url in urls if str(url).strip()]
+        else:
+            url_list = [url.strip() for url in str(urls).split(',') if url.strip()]
+        if not url_list:
+            return self.fail_response("At least one URL is required.")
+        
+        logger.debug(f"\033[95mFetching {len(url_list)} pages in parallel\033[0m")
+        try:
+            await self._ensure_sandbox()
+            
+            curl_cmd = self._build_curl_command("fetch_pages", {
+                "urls": url_list,
+                "format": format or "markdown",
+                "include_screenshots": bool(include_screenshots)
+            })
+            response = self.sandbox.process.exec(curl_cmd, timeout=FETCH_PAGES_TIMEOUT)
+            if response.exit_code != 0:
+                logger.error(f"Parallel page fetch request failed: {response}")
+                return self.fail_response(f"Parallel page fetch request failed: {response}")
+            
+            try:
+                result = json.loads(response.result)
+            except json.JSONDecodeError as e:
+                logger.error(f"Failed to parse response JSON: {response.result} {e}")
+                return self.fail_response(f"Failed to parse response JSON: {response.result} {e}")
+            
+            if not result.get("success"):
+                return self.fail_response(result.get("error") or result.get("message") or "Failed to fetch pages")
+            
+            pages = []
+            for page in result.get("results", []):
+                page_result = {"url": page.get("url"), "success": page.get("success", False)}
+                if not page_result["success"]:
+                    page_result["error"] = page.get("error", "")
+                    pages.append(page_result)
+                    continue
+                
+                content = page.get("content") or ""
+                page_result["final_url"] = page.get("final_url")
+                page_result["title"] = page.get("title")
+                page_result["content"] = content[:FETCH_PAGES_MAX_CONTENT_CHARS]
+                if len(content) > FETCH_PAGES_MAX_CONTENT_CHARS:
+                    page_result["content_truncated"] = True
+                
+                if page.get("screenshot_base64"):
+                    try:
+                        page_result["image_url"] = await upload_base64_image(page["screenshot_base64"])
+                    except Exception as e:
+                        logger.error(f"Failed to upload screenshot for {page.get('url')}: {e}")
+                        page_result["image_upload_error"] = str(e)
+                pages.append(page_result)
+            
+            return self.success_response({
+                "success": True,
+                "message": result.get("message", ""),
+                "elapsed_ms": result.get("elapsed_ms"),
+                "pages": pages
+            })
+        
+        except Exception as e:
+            logger.error(f"Error fetching pages: {e}")
+            logger.debug(traceback.format_exc())
+            return self.fail_response(f"Error fetching pages: {e}")
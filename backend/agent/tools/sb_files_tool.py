@@ -1,9 +1,21 @@
 from agentpress.tool import ToolResult, openapi_schema, xml_schema
 from sandbox.tool_base import SandboxToolsBase    
-from utils.files_utils import should_exclude_file, clean_path
+from utils.files_utils import should_exclude_file, clean_path, get_manifest_command
 from agentpress.thread_manager import ThreadManager
 from utils.logger import logger
+from datetime import datetime, timezone
+from typing import Dict, List
+import asyncio
+import io
+import json
 import os
+import shlex
+import tarfile
+import uuid
+
+# Changed files are downloaded as one archive when at least this many changed
+WORKSPACE_ARCHIVE_MIN_FILES = 10
+WORKSPACE_DOWNLOAD_CONCURRENCY = 8
 
 class SandboxFilesTool(SandboxToolsBase):
     """Tool for executing file system operations in a Daytona sandbox. All operations are performed relative to the /workspace directory."""
@@ -12,6 +24,9 @@ class SandboxFilesTool(SandboxToolsBase):
         super().__init__(project_id, thread_manager)
         self.SNIPPET_LINES = 4  # Number of context lines to show around edits
         self.workspace_path = "/workspace"  # Ensure we're always operating in /workspace
+        # Manifest and file states of the previous get_workspace_state call, by relative path
+        self._workspace_manifest: Dict[str, dict] = {}
+        self._workspace_files: Dict[str, dict] = {}
 
     def clean_path(self, path: str) -> str:
         """Clean and normalize a path to be relative to /workspace"""
@@ -30,40 +45,100 @@ class SandboxFilesTool(SandboxToolsBase):
             return False
 
     async def get_workspace_state(self) -> dict:
-        """Get the current workspace state by reading all files"""
-        files_state = {}
+        """Get the current workspace state with the content of every file.
+
+        A manifest of the workspace (path, size, mtime, sha1) is built in the sandbox
+        with one command, and only files that changed since the previous call are
+        downloaded: one by one when few changed, otherwise as one compressed archive.
+        """
         try:
             # Ensure sandbox is initialized
             await self._ensure_sandbox()
             
-            files = self.sandbox.fs.list_files(self.workspace_path)
-            for file_info in files:
-                rel_path = file_info.name
-                
-                # Skip excluded files and directories
-                if self._should_exclude_file(rel_path) or file_info.is_dir:
-                    continue
+            response = await asyncio.to_thread(self.sandbox.process.exec, get_manifest_command(self.workspace_path), timeout=120)
+            if response.exit_code != 0:
+                raise RuntimeError(f"Manifest command failed with exit code {response.exit_code}: {response.result}")
+            manifest = {}
+            for line in response.result.splitlines():
+                if line.startswith('{'):
+                    entry = json.loads(line)
+                    manifest[entry['path']] = entry
+            
+            changed = [
+                rel_path for rel_path, entry in manifest.items()
+                if self._workspace_manifest.get(rel_path, {}).get('sha1') != entry['sha1']
+            ]
+            contents = await self._download_workspace_files(changed)
+            
+            files_state = {}
+            for rel_path, entry in manifest.items():
+                state = self._workspace_files.get(rel_path)
+                if rel_path in contents:
+                    try:
+                        state = {"content": contents[rel_path].decode(), "is_dir": False}
+                    except UnicodeDecodeError:
+                        logger.debug(f"Skipping binary file: {rel_path}")
+                        state = None
+                if state is not None:
+                    state.update(size=entry['size'], modified=datetime.fromtimestamp(entry['mtime'], timezone.utc).isoformat())
+                    files_state[rel_path] = state
+            
+            # Files that failed to download are retried on the next call
+            self._workspace_manifest = {
+                rel_path: entry for rel_path, entry in manifest.items()
+                if rel_path in contents or rel_path not in changed
+            }
+            self._workspace_files = files_state
+            logger.debug(f"Workspace state has {len(files_state)} files, downloaded {len(contents)} of {len(changed)} changed")
+            return dict(files_state)
+        
+        except Exception as e:
+            logger.error(f"Error getting workspace state: {str(e)}")
+            return {}
+
+    async def _download_workspace_files(self, rel_paths: List[str]) -> Dict[str, bytes]:
+        """Download workspace files by relative path, skipping those that fail."""
+        if len(rel_paths) >= WORKSPACE_ARCHIVE_MIN_FILES:
+            try:
+                return await self._download_workspace_archive(rel_paths)
+            except Exception as e:
+                logger.warning(f"Failed to download {len(rel_paths)} workspace files as an archive, downloading them one by one: {str(e)}")
+        
+        semaphore = asyncio.Semaphore(WORKSPACE_DOWNLOAD_CONCURRENCY)
+        contents = {}
 
+        async def download(rel_path: str) -> None:
+            async with semaphore:
                 try:
-                    full_path = f"{self.workspace_path}/{rel_path}"
-                    content = self.sandbox.fs.download_file(full_path).decode()
-                    files_state[rel_path] = {
-                        "content": content,
-                        "is_dir": file_info.is_dir,
-                        "size": file_info.size,
-                        "modified": file_info.mod_time
-                    }
+                    contents[rel_path] = await asyncio.to_thread(self.sandbox.fs.download_file, f"{self.workspace_path}/{rel_path}")
                 except Exception as e:
-                    print(f"Error reading file {rel_path}: {e}")
-                except UnicodeDecodeError:
-                    print(f"Skipping binary file: {rel_path}")
+                    logger.warning(f"Error reading file {rel_path}: {e}")
 
-            return files_state
-        
-        except Exception as e:
-            print(f"Error getting workspace state: {str(e)}")
-            return {}
+        await asyncio.gather(*(download(rel_path) for rel_path in rel_paths))
+        return contents
 
+    async def _download_workspace_archive(self, rel_paths: List[str]) -> Dict[str, bytes]:
+        """Download workspace files as one gzipped tar archive built in the sandbox."""
+        name = f"/tmp/workspace-{uuid.uuid4().hex}"
+        await asyncio.to_thread(self.sandbox.fs.upload_file, f"{name}.list", "\n".join(rel_paths).encode())
+        try:
+            response = await asyncio.to_thread(
+                self.sandbox.process.exec,
+                f"tar -czf {name}.tar.gz -C {shlex.quote(self.workspace_path)} --verbatim-files-from -T {name}.list",
+                timeout=120
+            )
+            if response.exit_code != 0:
+                raise RuntimeError(f"tar failed with exit code {response.exit_code}: {response.result}")
+            archive = await asyncio.to_thread(self.sandbox.fs.download_file, f"{name}.tar.gz")
+        finally:
+            await asyncio.to_thread(self.sandbox.process.exec, f"rm -f {name}.list {name}.tar.gz", timeout=30)
+        
+        contents = {}
+        with tarfile.open(fileobj=io.BytesIO(archive), mode="r:gz") as tar:
+            for member in tar.getmembers():
+                if member.isfile():
+                    contents[member.name] = tar.extractfile(member).read()
+        return contents
 
     # def _get_preview_url(self, file_path: str) -> Optional[str]:
     #     """Get the preview URL for a file if it's an HTML file."""
@@ -1,7 +1,8 @@
 from typing import Optional, Dict, Any
+import asyncio
 import time
 from uuid import uuid4
-from agentpress.tool import ToolResult, openapi_schema, xml_schema
+from agentpress.tool import ToolResult, openapi_schema, xml_schema, read_only_tool
 from sandbox.tool_base import SandboxToolsBase
 from agentpress.thread_manager import ThreadManager
 
@@ -149,7 +150,7 @@ class SandboxShellTool(SandboxToolsBase):
                 start_time = time.time()
                 while (time.time() - start_time) < timeout:
                     # Wait a bit before checking
-                    time.sleep(2)
+                    await asyncio.sleep(2)
                     
                     # Check if session still exists (command might have exited)
                     check_result = await self._execute_raw_command(f"tmux has-session -t {session_name} 2>/dev/null || echo 'ended'")
@@ -188,6 +189,14 @@ class SandboxShellTool(SandboxToolsBase):
                     "completed": False
                 })
                 
+        except asyncio.CancelledError:
+            # The agent run was stopped: stop the command running in the sandbox as well
+            if blocking and session_name:
+                try:
+                    await self._execute_raw_command(f"tmux kill-session -t {session_name}")
+                except Exception:
+                    pass
+            raise
         except Exception as e:
             # Attempt to clean up session in case of error
             if session_name:
@@ -210,13 +219,17 @@ class SandboxShellTool(SandboxToolsBase):
             cwd=self.workspace_path
         )
         
-        response = self.sandbox.process.execute_session_command(
+        # The sandbox client is synchronous, run it in a thread so the event loop
+        # (and cancellation of the agent run) is not blocked while it waits
+        response = await asyncio.to_thread(
+            self.sandbox.process.execute_session_command,
             session_id=session_id,
             req=req,
             timeout=30  # Short timeout for utility commands
         )
         
-        logs = self.sandbox.process.get_session_command_logs(
+        logs = await asyncio.to_thread(
+            self.sandbox.process.get_session_command_logs,
             session_id=session_id,
             command_id=response.cmd_id
         )
@@ -357,6 +370,7 @@ class SandboxShellTool(SandboxToolsBase):
         except Exception as e:
             return self.fail_response(f"Error terminating command: {str(e)}")
 
+    @read_only_tool()
     @openapi_schema({
         "type": "function",
         "function": {
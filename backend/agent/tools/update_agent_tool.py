@@ -1,7 +1,7 @@
 import json
 import httpx
 from typing import Optional, Dict, Any, List
-from agentpress.tool import Tool, ToolResult, openapi_schema, xml_schema
+from agentpress.tool import Tool, ToolResult, openapi_schema, xml_schema, read_only_tool
 from agentpress.thread_manager import ThreadManager
 
 class UpdateAgentTool(Tool):
@@ -174,6 +174,7 @@ class UpdateAgentTool(Tool):
         except Exception as e:
             return self.fail_response(f"Error updating agent: {str(e)}")
 
+    @read_only_tool()
     @openapi_schema({
         "type": "function",
         "function": {
@@ -236,6 +237,7 @@ class UpdateAgentTool(Tool):
         except Exception as e:
             return self.fail_response(f"Error getting agent configuration: {str(e)}")
 
+    @read_only_tool()
     @openapi_schema({
         "type": "function",
         "function": {
@@ -361,6 +363,7 @@ class UpdateAgentTool(Tool):
         except Exception as e:
             return self.fail_response(f"Error searching MCP servers: {str(e)}")
 
+    @read_only_tool(max_concurrency=2)
     @openapi_schema({
         "type": "function",
         "function": {
@@ -675,6 +678,7 @@ class UpdateAgentTool(Tool):
         except Exception as e:
             return self.fail_response(f"Error configuring MCP server: {str(e)}")
 
+    @read_only_tool()
     @openapi_schema({
         "type": "function",
         "function": {
@@ -797,6 +801,7 @@ class UpdateAgentTool(Tool):
         
         return "Other"
 
+    @read_only_tool(max_concurrency=2)
     @openapi_schema({
         "type": "function",
         "function": {
@@ -1,18 +1,80 @@
 from tavily import AsyncTavilyClient
 import httpx
+from daytona_sdk import FileUpload
 from dotenv import load_dotenv
-from agentpress.tool import Tool, ToolResult, openapi_schema, xml_schema
+from agentpress.tool import Tool, ToolResult, openapi_schema, xml_schema, read_only_tool
 from utils.config import config
 from sandbox.tool_base import SandboxToolsBase
 from agentpress.thread_manager import ThreadManager
+from services import redis
+from services.http_client import get_http_client
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+import hashlib
 import json
+import re
 import os
 import datetime
+import uuid
 import asyncio
 import logging
 
 # TODO: add subpages, etc... in filters as sometimes its necessary 
 
+# Maximum number of URLs scraped at the same time by a single scrape_webpage call
+SCRAPE_MAX_CONCURRENCY = 5
+
+# Scraped pages are cached (by normalized URL) for this many seconds
+SCRAPE_CACHE_TTL = 3600
+
+# Tavily search topic and time range (None searches all dates)
+WEB_SEARCH_TOPIC = "general"
+WEB_SEARCH_TIME_RANGE = None
+
+# Query parameters that only track the visitor and never change page content
+TRACKING_QUERY_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid", "ref", "ref_src"}
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a URL so equivalent links share a scrape cache entry"""
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower()
+    netloc = parsed.netloc.lower()
+    if (scheme == "http" and netloc.endswith(":80")) or (scheme == "https" and netloc.endswith(":443")):
+        netloc = netloc.rsplit(":", 1)[0]
+    path = parsed.path.rstrip("/") or "/"
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_QUERY_PARAMS
+    ))
+    return urlunparse((scheme, netloc, path, parsed.params, query, ""))
+
+
+def scrape_cache_key(url: str) -> str:
+    return f"scrape_cache:{hashlib.sha256(normalize_url(url).encode()).hexdigest()}"
+
+
+# Search cache hit/miss counters for this process
+search_cache_stats = {"hits": 0, "misses": 0, "coalesced": 0}
+
+# Searches currently waiting on Tavily, keyed by search cache key
+_inflight_searches: Dict[str, asyncio.Task] = {}
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a search query so trivially re-worded repeats share a cache entry"""
+    query = re.sub(r"[^\w\s\-+#.:/]", " ", query.lower())
+    return " ".join(query.strip(" .:").split())
+
+
+def search_cache_key(query: str, search_params: Dict[str, Any]) -> str:
+    key_source = json.dumps(
+        {"query": normalize_query(query), **search_params},
+        sort_keys=True, separators=(",", ":"), default=str
+    )
+    return f"web_search_cache:{hashlib.sha256(key_source.encode()).hexdigest()}"
+
+
 class SandboxWebSearchTool(SandboxToolsBase):
     """Tool for performing web searches using Tavily API and web scraping using Firecrawl."""
 
@@ -33,6 +95,7 @@ class SandboxWebSearchTool(SandboxToolsBase):
         # Tavily asynchronous search client
         self.tavily_client = AsyncTavilyClient(api_key=self.tavily_api_key)
 
+    @read_only_tool(max_concurrency=4, idempotent=True)
     @openapi_schema({
         "type": "function",
         "function": {
@@ -106,9 +169,11 @@ class SandboxWebSearchTool(SandboxToolsBase):
 
             # Execute the search with Tavily
             logging.info(f"Executing web search for query: '{query}' with {num_results} results")
-            search_response = await self.tavily_client.search(
-                query=query,
+            search_response = await self._cached_search(
+                query,
                 max_results=num_results,
+                topic=WEB_SEARCH_TOPIC,
+                time_range=WEB_SEARCH_TIME_RANGE,
                 include_images=True,
                 include_answer="advanced",
                 search_depth="advanced",
@@ -144,6 +209,60 @@ class SandboxWebSearchTool(SandboxToolsBase):
                 simplified_message += "..."
             return self.fail_response(simplified_message)
 
+    async def _cached_search(self, query: str, **search_params) -> dict:
+        """
+        Run a Tavily search through the search cache.
+
+        Responses are cached per normalized query and search parameters for
+        config.WEB_SEARCH_CACHE_TTL seconds. With config.WEB_SEARCH_COALESCE_REQUESTS,
+        identical searches running at the same time share one Tavily call.
+        """
+        cache_ttl = config.WEB_SEARCH_CACHE_TTL
+        cache_key = search_cache_key(query, search_params)
+
+        if cache_ttl > 0:
+            try:
+                cached = await redis.get(cache_key)
+                if cached:
+                    search_cache_stats["hits"] += 1
+                    logging.info(f"Search cache hit for query: '{query}' (stats: {search_cache_stats})")
+                    return json.loads(cached)
+            except Exception as e:
+                logging.warning(f"Failed to read search cache: {str(e)}")
+
+        if config.WEB_SEARCH_COALESCE_REQUESTS:
+            inflight = _inflight_searches.get(cache_key)
+            if inflight is not None and not inflight.done() and inflight.get_loop() is asyncio.get_running_loop():
+                search_cache_stats["coalesced"] += 1
+                logging.info(f"Joining in-flight search for query: '{query}'")
+                return await asyncio.shield(inflight)
+
+        search_cache_stats["misses"] += 1
+
+        async def search() -> dict:
+            search_response = await self.tavily_client.search(query=query, **search_params)
+            has_content = search_response.get("results") or (search_response.get("answer") or "").strip()
+            if cache_ttl > 0 and has_content:
+                try:
+                    await redis.set(cache_key, json.dumps(search_response, ensure_ascii=False), ex=cache_ttl)
+                except Exception as e:
+                    logging.warning(f"Failed to write search cache: {str(e)}")
+            return search_response
+
+        if not config.WEB_SEARCH_COALESCE_REQUESTS:
+            return await search()
+
+        task = asyncio.create_task(search())
+        _inflight_searches[cache_key] = task
+
+        def forget(done_task: asyncio.Task) -> None:
+            if _inflight_searches.get(cache_key) is done_task:
+                del _inflight_searches[cache_key]
+
+        task.add_done_callback(forget)
+        # Shield so a cancelled caller doesn't cancel the search for callers sharing it
+        return await asyncio.shield(task)
+
     @openapi_schema({
         "type": "function",
         "function": {
@@ -184,6 +303,10 @@ class SandboxWebSearchTool(SandboxToolsBase):
         ALWAYS collect multiple relevant URLs from search results and scrape them all at once
         rather than making separate calls for each URL. This is much more efficient.
         
+        URLs are scraped concurrently (at most SCRAPE_MAX_CONCURRENCY at a time),
+        previously scraped pages are served from the scrape cache, and all results
+        are written to the sandbox in one batch.
+        
         Parameters:
         - urls: Multiple URLs to scrape, separated by commas
         """
@@ -208,28 +331,28 @@ class SandboxWebSearchTool(SandboxToolsBase):
             if len(url_list) == 1:
                 logging.warning("Only a single URL provided - for efficiency you should scrape multiple URLs at once")
             
+            # Add protocol if missing and drop duplicates of the same page
+            unique_urls = {}
+            for url in url_list:
+                if not (url.startswith('http://') or url.startswith('https://')):
+                    url = 'https://' + url
+                    logging.info(f"Added https:// protocol to URL: {url}")
+                unique_urls.setdefault(normalize_url(url), url)
+            url_list = list(unique_urls.values())
+            
             logging.info(f"Processing {len(url_list)} URLs: {url_list}")
             
-            # Process each URL and collect results
-            results = []
-            for url in url_list:
-                try:
-                    # Add protocol if missing
-                    if not (url.startswith('http://') or url.startswith('https://')):
-                        url = 'https://' + url
-                        logging.info(f"Added https:// protocol to URL: {url}")
-                    
-                    # Scrape this URL
-                    result = await self._scrape_single_url(url)
-                    results.append(result)
-                    
-                except Exception as e:
-                    logging.error(f"Error processing URL {url}: {str(e)}")
-                    results.append({
-                        "url": url,
-                        "success": False,
-                        "error": str(e)
-                    })
+            # Scrape all URLs concurrently with bounded concurrency
+            semaphore = asyncio.Semaphore(SCRAPE_MAX_CONCURRENCY)
+
+            async def scrape(url: str) -> dict:
+                async with semaphore:
+                    return await self._scrape_single_url(url)
+
+            results = list(await asyncio.gather(*(scrape(url) for url in url_list)))
+            
+            # Save all successful results to the sandbox in one batch
+            await self._save_scrape_results(results)
             
             # Summarize results
             successful = sum(1 for r in results if r.get("success", False))
@@ -267,52 +390,69 @@ class SandboxWebSearchTool(SandboxToolsBase):
     async def _scrape_single_url(self, url: str) -> dict:
         """
         Helper function to scrape a single URL and return the result information.
+
+        The formatted page is returned under "formatted_result" so the caller can
+        save all pages at once. Successful scrapes are cached by normalized URL.
         """
         logging.info(f"Scraping single URL: {url}")
         
         try:
-            # ---------- Firecrawl scrape endpoint ----------
-            logging.info(f"Sending request to Firecrawl for URL: {url}")
-            async with httpx.AsyncClient() as client:
-                headers = {
-                    "Authorization": f"Bearer {self.firecrawl_api_key}",
-                    "Content-Type": "application/json",
-                }
-                payload = {
+            cache_key = scrape_cache_key(url)
+            cached = await self._get_cached_scrape(cache_key)
+            if cached is not None:
+                logging.info(f"Scrape cache hit for URL: {url}")
+                cached["url"] = url
+                return {
                     "url": url,
-                    "formats": ["markdown"]
+                    "success": True,
+                    "title": cached.get("title", ""),
+                    "content_length": len(cached.get("text", "")),
+                    "formatted_result": cached,
+                    "cached": True
                 }
-                
-                # Use longer timeout and retry logic for more reliability
-                max_retries = 3
-                timeout_seconds = 120
-                retry_count = 0
-                
-                while retry_count < max_retries:
-                    try:
-                        logging.info(f"Sending request to Firecrawl (attempt {retry_count + 1}/{max_retries})")
-                        response = await client.post(
-                            f"{self.firecrawl_url}/v1/scrape",
-                            json=payload,
-                            headers=headers,
-                            timeout=timeout_seconds,
-                        )
-                        response.raise_for_status()
-                        data = response.json()
-                        logging.info(f"Successfully received response from Firecrawl for {url}")
-                        break
-                    except (httpx.ReadTimeout, httpx.ConnectTimeout, httpx.ReadError) as timeout_err:
-                        retry_count += 1
-                        logging.warning(f"Request timed out (attempt {retry_count}/{max_retries}): {str(timeout_err)}")
-                        if retry_count >= max_retries:
-                            raise Exception(f"Request timed out after {max_retries} attempts with {timeout_seconds}s timeout")
-                        # Exponential backoff
-                        logging.info(f"Waiting {2 ** retry_count}s before retry")
-                        await asyncio.sleep(2 ** retry_count)
-                    except Exception as e:
-                        # Don't retry on non-timeout errors
-                        logging.error(f"Error during scraping: {str(e)}")
-                        raise e
+
+            # ---------- Firecrawl scrape endpoint ----------
+            logging.info(f"Sending request to Firecrawl for URL: {url}")
+            client = get_http_client()
+            headers = {
+                "Authorization": f"Bearer {self.firecrawl_api_key}",
+                "Content-Type": "application/json",
+            }
+            payload = {
+                "url": url,
+                "formats": ["markdown"]
+            }
+            
+            # Use longer timeout and retry logic for more reliability
+            max_retries = 3
+            timeout_seconds = 120
+            retry_count = 0
+            
+            while retry_count < max_retries:
+                try:
+                    logging.info(f"Sending request to Firecrawl (attempt {retry_count + 1}/{max_retries})")
+                    response = await client.post(
+                        f"{self.firecrawl_url}/v1/scrape",
+                        json=payload,
+                        headers=headers,
+                        timeout=timeout_seconds,
+                    )
+                    response.raise_for_status()
+                    data = response.json()
+                    logging.info(f"Successfully received response from Firecrawl for {url}")
+                    break
+                except (httpx.ReadTimeout, httpx.ConnectTimeout, httpx.ReadError) as timeout_err:
+                    retry_count += 1
+                    logging.warning(f"Request timed out (attempt {retry_count}/{max_retries}): {str(timeout_err)}")
+                    if retry_count >= max_retries:
+                        raise Exception(f"Request timed out after {max_retries} attempts with {timeout_seconds}s timeout")
+                    # Exponential backoff
+                    logging.info(f"Waiting {2 ** retry_count}s before retry")
+                    await asyncio.sleep(2 ** retry_count)
+                except Exception as e:
+                    # Don't retry on non-timeout errors
+                    logging.error(f"Error during scraping: {str(e)}")
+                    raise e
 
             # Format the response
             title = data.get("data", {}).get("metadata", {}).get("title", "")
@@ -329,40 +469,16 @@ class SandboxWebSearchTool(SandboxToolsBase):
             if "metadata" in data.get("data", {}):
                 formatted_result["metadata"] = data["data"]["metadata"]
                 logging.info(f"Added metadata: {data['data']['metadata'].keys()}")
-            
-            # Create a simple filename from the URL domain and date
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            
-            # Extract domain from URL for the filename
-            from urllib.parse import urlparse
-            parsed_url = urlparse(url)
-            domain = parsed_url.netloc.replace("www.", "")
-            
-            # Clean up domain for filename
-            domain = "".join([c if c.isalnum() else "_" for c in domain])
-            safe_filename = f"{timestamp}_{domain}.json"
-            
-            logging.info(f"Generated filename: {safe_filename}")
-            
-            # Save results to a file in the /workspace/scrape directory
-            scrape_dir = f"{self.workspace_path}/scrape"
-            self.sandbox.fs.create_folder(scrape_dir, "755")
-            
-            results_file_path = f"{scrape_dir}/{safe_filename}"
-            json_content = json.dumps(formatted_result, ensure_ascii=False, indent=2)
-            logging.info(f"Saving content to file: {results_file_path}, size: {len(json_content)} bytes")
-            
-            self.sandbox.fs.upload_file(
-                results_file_path, 
-                json_content.encode()
-            )
+
+            if markdown_content:
+                await self._cache_scrape(cache_key, formatted_result)
             
             return {
                 "url": url,
                 "success": True,
                 "title": title,
-                "file_path": results_file_path,
-                "content_length": len(markdown_content)
+                "content_length": len(markdown_content),
+                "formatted_result": formatted_result
             }
         
         except Exception as e:
@@ -376,6 +492,65 @@ class SandboxWebSearchTool(SandboxToolsBase):
                 "error": error_message
             }
 
+    async def _get_cached_scrape(self, cache_key: str) -> Optional[dict]:
+        try:
+            cached = await redis.get(cache_key)
+            return json.loads(cached) if cached else None
+        except Exception as e:
+            logging.warning(f"Failed to read scrape cache: {str(e)}")
+            return None
+
+    async def _cache_scrape(self, cache_key: str, formatted_result: dict) -> None:
+        try:
+            await redis.set(cache_key, json.dumps(formatted_result, ensure_ascii=False), ex=SCRAPE_CACHE_TTL)
+        except Exception as e:
+            logging.warning(f"Failed to write scrape cache: {str(e)}")
+
+    async def _save_scrape_results(self, results: List[dict]) -> None:
+        """
+        Write every successful scrape result to /workspace/scrape in a single
+        batched upload, setting "file_path" on each saved result.
+        """
+        # Create a simple filename from the URL domain and date
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        scrape_dir = f"{self.workspace_path}/scrape"
+
+        uploads = []
+        saved = []
+        for result in results:
+            formatted_result = result.pop("formatted_result", None)
+            if not result.get("success") or formatted_result is None:
+                continue
+
+            # Clean up domain for filename, the random suffix keeps names unique
+            # across batches and concurrent scrapes
+            domain = urlparse(result["url"]).netloc.replace("www.", "")
+            domain = "".join([c if c.isalnum() else "_" for c in domain])
+            safe_filename = f"{timestamp}_{domain}_{uuid.uuid4().hex[:8]}.json"
+
+            results_file_path = f"{scrape_dir}/{safe_filename}"
+            json_content = json.dumps(formatted_result, ensure_ascii=False, indent=2)
+            uploads.append(FileUpload(path=results_file_path, content=json_content.encode()))
+            saved.append((result, results_file_path))
+
+        if not uploads:
+            return
+
+        logging.info(f"Saving {len(uploads)} scrape results to {scrape_dir}")
+        try:
+            self.sandbox.fs.create_folder(scrape_dir, "755")
+            self.sandbox.fs.upload_files(uploads)
+        except Exception as e:
+            error_message = f"Failed to save scrape results: {str(e)}"
+            logging.error(error_message)
+            for result, _ in saved:
+                result["success"] = False
+                result["error"] = error_message
+            return
+
+        for result, results_file_path in saved:
+            result["file_path"] = results_file_path
+
 if __name__ == "__main__":
     async def test_web_search():
         """Test function for the web search tool"""
@@ -19,7 +19,10 @@ from dataclasses import dataclass
 from utils.logger import logger
 from agentpress.tool import ToolResult
 from agentpress.tool_registry import ToolRegistry
+from agentpress.tool_scheduler import ToolScheduler, TERMINATING_TOOLS
 from agentpress.xml_tool_parser import XMLToolParser
+from agentpress.utils.incremental_json import IncrementalJSONParser
+from agentpress.utils.cancellation import CancellationToken
 from litellm import completion_cost
 from langfuse.client import StatefulTraceClient
 from services.langfuse import langfuse
@@ -32,7 +35,7 @@ from agentpress.utils.json_helpers import (
 XmlAddingStrategy = Literal["user_message", "assistant_message", "inline_edit"]
 
 # Type alias for tool execution strategy
-ToolExecutionStrategy = Literal["sequential", "parallel"]
+ToolExecutionStrategy = Literal["sequential", "parallel", "auto"]
 
 @dataclass
 class ToolExecutionContext:
@@ -59,7 +62,8 @@ class ProcessorConfig:
         native_tool_calling: Enable OpenAI-style function calling format
         execute_tools: Whether to automatically execute detected tool calls
         execute_on_stream: For streaming, execute tools as they appear vs. at the end
-        tool_execution_strategy: How to execute multiple tools ("sequential" or "parallel")
+        tool_execution_strategy: How to execute multiple tools ("sequential", "parallel" or "auto",
+            which runs read-only tools concurrently and mutating tools in order per sandbox)
         xml_adding_strategy: How to add XML tool results to the conversation
         max_xml_tool_calls: Maximum number of XML tool calls to process (0 = no limit)
     """
@@ -104,6 +108,9 @@ class ResponseProcessor:
         self.xml_parser = XMLToolParser(strict_mode=False)
         self.is_agent_builder = is_agent_builder
         self.target_agent_id = target_agent_id
+        # Orders tool calls by their dependencies for the "auto" execution strategy
+        self.tool_scheduler = ToolScheduler(tool_registry, self._execute_tool)
+        self.speculation_stats = {"started": 0, "hits": 0, "misses": 0}
 
     async def _yield_message(self, message_obj: Optional[Dict[str, Any]]) -> Dict[str, Any]:
         """Helper to yield a message with proper formatting.
@@ -120,6 +127,7 @@ class ResponseProcessor:
         prompt_messages: List[Dict[str, Any]],
         llm_model: str,
         config: ProcessorConfig = ProcessorConfig(),
+        cancellation_token: Optional[CancellationToken] = None,
     ) -> AsyncGenerator[Dict[str, Any], None]:
         """Process a streaming LLM response, handling tool calls and execution.
         
@@ -129,15 +137,20 @@ class ResponseProcessor:
             prompt_messages: List of messages sent to the LLM (the prompt)
             llm_model: The name of the LLM model used
             config: Configuration for parsing and execution
+            cancellation_token: Token that cancels the tool executions of this response
             
         Yields:
             Complete message objects matching the DB schema, except for content chunks.
         """
         accumulated_content = ""
         tool_calls_buffer = {}
+        argument_parsers = {} # native tool call index -> IncrementalJSONParser
+        executed_native_indices = set() # native tool call indices already started
+        speculative_executions = {} # native tool call index -> {"task", "arguments"}
         current_xml_content = ""
         xml_chunks_buffer = []
         pending_tool_executions = []
+        pending_status_writes = [] # tool_started saves, yielded in order once done
         yielded_tool_indices = set() # Stores indices of tools whose *status* has been yielded
         tool_index = 0
         xml_tool_call_count = 0
@@ -151,6 +164,18 @@ class ResponseProcessor:
                    f"Execute on stream={config.execute_on_stream}, Strategy={config.tool_execution_strategy}")
 
         thread_run_id = str(uuid.uuid4())
+        cancelled = False
+
+        def cancel_tool_executions():
+            # Tool calls started while streaming run as their own tasks, they
+            # are not cancelled along with the task consuming this generator
+            for execution in pending_tool_executions:
+                execution["task"].cancel()
+            for speculative in speculative_executions.values():
+                speculative["task"].cancel()
+            self.tool_scheduler.cancel_all()
+
+        remove_cancel_callback = cancellation_token.add_callback(cancel_tool_executions) if cancellation_token else None
 
         try:
             # --- Save and Yield Start Events ---
@@ -172,6 +197,11 @@ class ResponseProcessor:
             __sequence = 0
 
             async for chunk in llm_response:
+                # Yield tool_started statuses whose saves have finished
+                while pending_status_writes and pending_status_writes[0].done():
+                    started_msg_obj = pending_status_writes.pop(0).result()
+                    if started_msg_obj: yield format_for_yield(started_msg_obj)
+
                 if hasattr(chunk, 'choices') and chunk.choices and hasattr(chunk.choices[0], 'finish_reason') and chunk.choices[0].finish_reason:
                     finish_reason = chunk.choices[0].finish_reason
                     logger.debug(f"Detected finish_reason: {finish_reason}")
@@ -227,12 +257,14 @@ class ResponseProcessor:
                                     )
 
                                     if config.execute_tools and config.execute_on_stream:
-                                        # Save and Yield tool_started status
-                                        started_msg_obj = await self._yield_and_save_tool_started(context, thread_id, thread_run_id)
-                                        if started_msg_obj: yield format_for_yield(started_msg_obj)
+                                        execution_task = self._start_tool_execution(tool_call, config.tool_execution_strategy)
+
+                                        # Save tool_started status without blocking the stream, yielded once saved
+                                        pending_status_writes.append(asyncio.create_task(
+                                            self._yield_and_save_tool_started(context, thread_id, thread_run_id)
+                                        ))
                                         yielded_tool_indices.add(tool_index) # Mark status as yielded
 
-                                        execution_task = asyncio.create_task(self._execute_tool(tool_call))
                                         pending_tool_executions.append({
                                             "task": execution_task, "tool_call": tool_call,
                                             "tool_index": tool_index, "context": context
@@ -272,42 +304,74 @@ class ResponseProcessor:
                             # --- Buffer and Execute Complete Native Tool Calls ---
                             if not hasattr(tool_call_chunk, 'function'): continue
                             idx = tool_call_chunk.index if hasattr(tool_call_chunk, 'index') else 0
-                            # ... (buffer update logic remains same) ...
-                            # ... (check complete logic remains same) ...
-                            has_complete_tool_call = False # Placeholder
-                            if (tool_calls_buffer.get(idx) and
-                                tool_calls_buffer[idx]['id'] and
-                                tool_calls_buffer[idx]['function']['name'] and
-                                tool_calls_buffer[idx]['function']['arguments']):
-                                try:
-                                    safe_json_parse(tool_calls_buffer[idx]['function']['arguments'])
-                                    has_complete_tool_call = True
-                                except json.JSONDecodeError: pass
-
-
-                            if has_complete_tool_call and config.execute_tools and config.execute_on_stream:
-                                current_tool = tool_calls_buffer[idx]
-                                tool_call_data = {
-                                    "function_name": current_tool['function']['name'],
-                                    "arguments": safe_json_parse(current_tool['function']['arguments']),
-                                    "id": current_tool['id']
-                                }
-                                current_assistant_id = last_assistant_message_object['message_id'] if last_assistant_message_object else None
-                                context = self._create_tool_context(
-                                    tool_call_data, tool_index, current_assistant_id
-                                )
-
-                                # Save and Yield tool_started status
-                                started_msg_obj = await self._yield_and_save_tool_started(context, thread_id, thread_run_id)
-                                if started_msg_obj: yield format_for_yield(started_msg_obj)
-                                yielded_tool_indices.add(tool_index) # Mark status as yielded
-
-                                execution_task = asyncio.create_task(self._execute_tool(tool_call_data))
-                                pending_tool_executions.append({
-                                    "task": execution_task, "tool_call": tool_call_data,
-                                    "tool_index": tool_index, "context": context
-                                })
-                                tool_index += 1
+                            if idx not in tool_calls_buffer:
+                                tool_calls_buffer[idx] = {'id': None, 'type': 'function', 'function': {'name': None, 'arguments': ''}}
+                                argument_parsers[idx] = IncrementalJSONParser()
+                            current_tool = tool_calls_buffer[idx]
+                            if getattr(tool_call_chunk, 'id', None):
+                                current_tool['id'] = tool_call_chunk.id
+                            function_chunk = tool_call_chunk.function
+                            if getattr(function_chunk, 'name', None):
+                                current_tool['function']['name'] = function_chunk.name
+                            arguments_chunk = getattr(function_chunk, 'arguments', None)
+                            if arguments_chunk:
+                                if not isinstance(arguments_chunk, str):
+                                    arguments_chunk = to_json_string(arguments_chunk)
+                                current_tool['function']['arguments'] += arguments_chunk
+                                argument_parsers[idx].feed(arguments_chunk)
+
+                            if idx in executed_native_indices or not (config.execute_tools and config.execute_on_stream):
+                                continue
+                            if not (current_tool['id'] and current_tool['function']['name']):
+                                continue
+
+                            parser = argument_parsers[idx]
+                            if not parser.complete:
+                                # Start idempotent tools once their required arguments are final
+                                if idx not in speculative_executions and not parser.error:
+                                    speculative_call = self._build_speculative_tool_call(current_tool, parser)
+                                    if speculative_call:
+                                        speculative_executions[idx] = {
+                                            "task": self._start_tool_execution(speculative_call, config.tool_execution_strategy),
+                                            "arguments": speculative_call["arguments"]
+                                        }
+                                        self.speculation_stats["started"] += 1
+                                        logger.info(f"Speculatively started tool {current_tool['function']['name']} (index {idx})")
+                                continue
+
+                            executed_native_indices.add(idx)
+                            tool_call_data = {
+                                "function_name": current_tool['function']['name'],
+                                "arguments": parser.fields if not parser.error else safe_json_parse(current_tool['function']['arguments']),
+                                "id": current_tool['id']
+                            }
+                            current_assistant_id = last_assistant_message_object['message_id'] if last_assistant_message_object else None
+                            context = self._create_tool_context(
+                                tool_call_data, tool_index, current_assistant_id
+                            )
+
+                            speculative = speculative_executions.pop(idx, None)
+                            if speculative and speculative["arguments"] == self._with_schema_defaults(tool_call_data["function_name"], tool_call_data["arguments"]):
+                                self.speculation_stats["hits"] += 1
+                                execution_task = speculative["task"]
+                            else:
+                                if speculative:
+                                    self.speculation_stats["misses"] += 1
+                                    logger.info(f"Speculative arguments for {tool_call_data['function_name']} changed, restarting tool")
+                                    speculative["task"].cancel()
+                                execution_task = self._start_tool_execution(tool_call_data, config.tool_execution_strategy)
+
+                            # Save tool_started status without blocking the stream, yielded once saved
+                            pending_status_writes.append(asyncio.create_task(
+                                self._yield_and_save_tool_started(context, thread_id, thread_run_id)
+                            ))
+                            yielded_tool_indices.add(tool_index) # Mark status as yielded
+
+                            pending_tool_executions.append({
+                                "task": execution_task, "tool_call": tool_call_data,
+                                "tool_index": tool_index, "context": context
+                            })
+                            tool_index += 1
 
                 if finish_reason == "xml_tool_limit_reached":
                     logger.info("Stopping stream processing after loop due to XML tool call limit")
@@ -318,6 +382,18 @@ class ResponseProcessor:
 
             # --- After Streaming Loop ---
 
+            # Cancel speculative executions whose tool call never completed
+            for speculative in speculative_executions.values():
+                speculative["task"].cancel()
+                self.speculation_stats["misses"] += 1
+            speculative_executions = {}
+
+            # Yield the remaining tool_started statuses before any tool results
+            for status_write in pending_status_writes:
+                started_msg_obj = await status_write
+                if started_msg_obj: yield format_for_yield(started_msg_obj)
+            pending_status_writes = []
+
             # Wait for pending tool executions from streaming phase
             tool_results_buffer = [] # Stores (tool_call, result, tool_index, context)
             if pending_tool_executions:
@@ -342,7 +418,7 @@ class ResponseProcessor:
                                  context.result = result
                                  tool_results_buffer.append((execution["tool_call"], result, tool_idx, context))
                                  
-                                 if tool_name in ['ask', 'complete']:
+                                 if tool_name in TERMINATING_TOOLS:
                                      logger.info(f"Terminating tool '{tool_name}' completed during streaming. Setting termination flag.")
                                      self.trace.event(name="terminating_tool_completed_during_streaming", level="DEFAULT", status_message=(f"Terminating tool '{tool_name}' completed during streaming. Setting termination flag."))
                                      agent_should_terminate = True
@@ -367,7 +443,7 @@ class ResponseProcessor:
                             tool_results_buffer.append((execution["tool_call"], result, tool_idx, context))
                             
                             # Check if this is a terminating tool
-                            if tool_name in ['ask', 'complete']:
+                            if tool_name in TERMINATING_TOOLS:
                                 logger.info(f"Terminating tool '{tool_name}' completed during streaming. Setting termination flag.")
                                 self.trace.event(name="terminating_tool_completed_during_streaming", level="DEFAULT", status_message=(f"Terminating tool '{tool_name}' completed during streaming. Setting termination flag."))
                                 agent_should_terminate = True
@@ -399,8 +475,20 @@ class ResponseProcessor:
                 logger.info(f"Stream finished with reason: xml_tool_limit_reached after {xml_tool_call_count} XML tool calls")
                 self.trace.event(name="stream_finished_with_reason_xml_tool_limit_reached_after_xml_tool_calls", level="DEFAULT", status_message=(f"Stream finished with reason: xml_tool_limit_reached after {xml_tool_call_count} XML tool calls"))
 
+            # --- Extract complete native tool calls ---
+            complete_native_tool_calls = []
+            if config.native_tool_calling:
+                for idx, tc_buf in tool_calls_buffer.items():
+                    parser = argument_parsers.get(idx)
+                    if tc_buf['id'] and tc_buf['function']['name'] and parser and parser.complete:
+                        args = parser.fields if not parser.error else safe_json_parse(tc_buf['function']['arguments'])
+                        complete_native_tool_calls.append({
+                            "id": tc_buf['id'], "type": "function",
+                            "function": {"name": tc_buf['function']['name'],"arguments": args}
+                        })
+
             # --- SAVE and YIELD Final Assistant Message ---
-            if accumulated_content:
+            if accumulated_content or complete_native_tool_calls:
                 # ... (Truncate accumulated_content logic) ...
                 if config.max_xml_tool_calls > 0 and xml_tool_call_count >= config.max_xml_tool_calls and xml_chunks_buffer:
                     last_xml_chunk = xml_chunks_buffer[-1]
@@ -408,19 +496,6 @@ class ResponseProcessor:
                     if last_chunk_end_pos > 0:
                         accumulated_content = accumulated_content[:last_chunk_end_pos]
 
-                # ... (Extract complete_native_tool_calls logic) ...
-                complete_native_tool_calls = []
-                if config.native_tool_calling:
-                    for idx, tc_buf in tool_calls_buffer.items():
-                        if tc_buf['id'] and tc_buf['function']['name'] and tc_buf['function']['arguments']:
-                            try:
-                                args = safe_json_parse(tc_buf['function']['arguments'])
-                                complete_native_tool_calls.append({
-                                    "id": tc_buf['id'], "type": "function",
-                                    "function": {"name": tc_buf['function']['name'],"arguments": args}
-                                })
-                            except json.JSONDecodeError: continue
-
                 message_data = { # Dict to be saved in 'content'
                     "role": "assistant", "content": accumulated_content,
                     "tool_calls": complete_native_tool_calls or None
@@ -647,7 +722,22 @@ class ResponseProcessor:
             self.trace.event(name="re_raising_error_to_stop_further_processing", level="ERROR", status_message=(f"Re-raising error to stop further processing: {str(e)}"))
             raise # Use bare 'raise' to preserve the original exception with its traceback
 
+        except (asyncio.CancelledError, GeneratorExit):
+            # The run was stopped: stop the tools and the LLM stream right away
+            cancelled = True
+            logger.info(f"Stream processing cancelled for thread {thread_id}")
+            self.trace.event(name="stream_processing_cancelled", level="WARNING", status_message=(f"Stream processing cancelled for thread {thread_id}"))
+            cancel_tool_executions()
+            if hasattr(llm_response, 'aclose'):
+                try:
+                    await llm_response.aclose()
+                except Exception as close_e:
+                    logger.debug(f"Error closing LLM stream: {str(close_e)}")
+            raise
+
         finally:
+            if remove_cancel_callback:
+                remove_cancel_callback()
             # Save and Yield the final thread_run_end status
             try:
                 end_content = {"status_type": "thread_run_end"}
@@ -655,7 +745,8 @@ class ResponseProcessor:
                     thread_id=thread_id, type="status", content=end_content, 
                     is_llm_message=False, metadata={"thread_run_id": thread_run_id if 'thread_run_id' in locals() else None}
                 )
-                if end_msg_obj: yield format_for_yield(end_msg_obj)
+                # Nothing can be yielded while the generator is being cancelled or closed
+                if end_msg_obj and not cancelled: yield format_for_yield(end_msg_obj)
             except Exception as final_e:
                 logger.error(f"Error in finally block: {str(final_e)}", exc_info=True)
                 self.trace.event(name="error_in_finally_block", level="ERROR", status_message=(f"Error in finally block: {str(final_e)}"))
@@ -667,6 +758,7 @@ class ResponseProcessor:
         prompt_messages: List[Dict[str, Any]],
         llm_model: str,
         config: ProcessorConfig = ProcessorConfig(),
+        cancellation_token: Optional[CancellationToken] = None,
     ) -> AsyncGenerator[Dict[str, Any], None]:
         """Process a non-streaming LLM response, handling tool calls and execution.
         
@@ -676,6 +768,7 @@ class ResponseProcessor:
             prompt_messages: List of messages sent to the LLM (the prompt)
             llm_model: The name of the LLM model used
             config: Configuration for parsing and execution
+            cancellation_token: Token that cancels the tool executions of this response
             
         Yields:
             Complete message objects matching the DB schema.
@@ -688,6 +781,7 @@ class ResponseProcessor:
         tool_result_message_objects = {}
         finish_reason = None
         native_tool_calls_for_message = []
+        cancelled = False
 
         try:
             # Save and Yield thread_run_start status message
@@ -866,6 +960,13 @@ class ResponseProcessor:
              self.trace.event(name="re_raising_error_to_stop_further_processing", level="CRITICAL", status_message=(f"Re-raising error to stop further processing: {str(e)}"))
              raise # Use bare 'raise' to preserve the original exception with its traceback
 
+        except (asyncio.CancelledError, GeneratorExit):
+            # Tools of a non-streaming response run inline and are cancelled with this generator
+            cancelled = True
+            logger.info(f"Response processing cancelled for thread {thread_id}")
+            self.trace.event(name="response_processing_cancelled", level="WARNING", status_message=(f"Response processing cancelled for thread {thread_id}"))
+            raise
+
         finally:
              # Save and Yield the final thread_run_end status
             end_content = {"status_type": "thread_run_end"}
@@ -873,7 +974,8 @@ class ResponseProcessor:
                 thread_id=thread_id, type="status", content=end_content, 
                 is_llm_message=False, metadata={"thread_run_id": thread_run_id if 'thread_run_id' in locals() else None}
             )
-            if end_msg_obj: yield format_for_yield(end_msg_obj)
+            # Nothing can be yielded while the generator is being cancelled or closed
+            if end_msg_obj and not cancelled: yield format_for_yield(end_msg_obj)
 
     # XML parsing methods
     def _extract_tag_content(self, xml_chunk: str, tag_name: str) -> Tuple[Optional[str], Optional[str]]:
@@ -1249,6 +1351,7 @@ class ResponseProcessor:
             execution_strategy: Strategy for executing tools:
                 - "sequential": Execute tools one after another, waiting for each to complete
                 - "parallel": Execute all tools simultaneously for better performance 
+                - "auto": Run read-only tools concurrently and mutating tools in order per sandbox
                 
         Returns:
             List of tuples containing the original tool call and its result
@@ -1260,6 +1363,8 @@ class ResponseProcessor:
             return await self._execute_tools_sequentially(tool_calls)
         elif execution_strategy == "parallel":
             return await self._execute_tools_in_parallel(tool_calls)
+        elif execution_strategy == "auto":
+            return await self._execute_tools_auto(tool_calls)
         else:
             logger.warning(f"Unknown execution strategy: {execution_strategy}, falling back to sequential")
             return await self._execute_tools_sequentially(tool_calls)
@@ -1295,7 +1400,7 @@ class ResponseProcessor:
                     logger.debug(f"Completed tool {tool_name} with success={result.success}")
                     
                     # Check if this is a terminating tool (ask or complete)
-                    if tool_name in ['ask', 'complete']:
+                    if tool_name in TERMINATING_TOOLS:
                         logger.info(f"Terminating tool '{tool_name}' executed. Stopping further tool execution.")
                         self.trace.event(name="terminating_tool_executed", level="DEFAULT", status_message=(f"Terminating tool '{tool_name}' executed. Stopping further tool execution."))
                         break  # Stop executing remaining tools
@@ -1371,6 +1476,91 @@ class ResponseProcessor:
             return [(tool_call, ToolResult(success=False, output=f"Execution error: {str(e)}")) 
                     for tool_call in tool_calls]
 
+    async def _execute_tools_auto(self, tool_calls: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], ToolResult]]:
+        """Execute tool calls through the dependency-aware tool scheduler.
+        
+        Read-only tools run concurrently (within their per-tool concurrency caps),
+        mutating tools run in order per sandbox. As with sequential execution,
+        tool calls after a terminating tool (ask or complete) are not executed.
+        
+        Args:
+            tool_calls: List of tool calls to execute
+            
+        Returns:
+            List of tuples containing the original tool call and its result
+        """
+        if not tool_calls:
+            return []
+
+        for index, tool_call in enumerate(tool_calls):
+            if tool_call.get('function_name') in TERMINATING_TOOLS:
+                tool_calls = tool_calls[:index + 1]
+                break
+
+        tool_names = [t.get('function_name', 'unknown') for t in tool_calls]
+        logger.info(f"Executing {len(tool_calls)} tools with auto scheduling: {tool_names}")
+        self.trace.event(name="executing_tools_auto", level="DEFAULT", status_message=(f"Executing {len(tool_calls)} tools with auto scheduling: {tool_names}"))
+
+        tasks = [self.tool_scheduler.schedule(tool_call) for tool_call in tool_calls]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        processed_results = []
+        for tool_call, result in zip(tool_calls, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error executing tool {tool_call.get('function_name', 'unknown')}: {str(result)}")
+                self.trace.event(name="error_executing_tool", level="ERROR", status_message=(f"Error executing tool {tool_call.get('function_name', 'unknown')}: {str(result)}"))
+                processed_results.append((tool_call, ToolResult(success=False, output=f"Error executing tool: {str(result)}")))
+            else:
+                processed_results.append((tool_call, result))
+
+        logger.info(f"Auto execution completed for {len(tool_calls)} tools")
+        return processed_results
+
+    def _get_tool_parameters(self, function_name: str) -> Dict[str, Any]:
+        """JSON schema of a tool function's parameters, empty if unknown."""
+        tool_info = self.tool_registry.tools.get(function_name)
+        if not tool_info:
+            return {}
+        return tool_info['schema'].schema.get('function', {}).get('parameters', {})
+
+    def _with_schema_defaults(self, function_name: str, arguments: Any) -> Any:
+        """Arguments with schema defaults filled in for optional arguments that were not sent."""
+        if not isinstance(arguments, dict):
+            return arguments
+        properties = self._get_tool_parameters(function_name).get('properties', {})
+        defaults = {name: prop['default'] for name, prop in properties.items() if isinstance(prop, dict) and 'default' in prop}
+        return {**defaults, **arguments}
+
+    def _build_speculative_tool_call(self, buffered_tool: Dict[str, Any], parser: IncrementalJSONParser) -> Optional[Dict[str, Any]]:
+        """Build a tool call from partially streamed arguments if the tool can be started early.
+        
+        Only tools marked idempotent qualify, and only once every required
+        argument has its final value. Optional arguments that have not arrived
+        yet take their schema defaults, so the call matches the final one when
+        the model leaves them out or sends the default.
+        """
+        function_name = buffered_tool['function']['name']
+        tool_fn = self.tool_registry.get_available_functions().get(function_name)
+        if not getattr(tool_fn, 'tool_idempotent', False):
+            return None
+
+        parameters = self._get_tool_parameters(function_name)
+        required = parameters.get('required', [])
+        if not required or not parser.has_final_fields(required):
+            return None
+
+        return {
+            "function_name": function_name,
+            "arguments": self._with_schema_defaults(function_name, parser.fields),
+            "id": buffered_tool['id']
+        }
+
+    def _start_tool_execution(self, tool_call: Dict[str, Any], execution_strategy: ToolExecutionStrategy) -> asyncio.Task:
+        """Start executing a tool call found while streaming and return its task."""
+        if execution_strategy == "auto":
+            return self.tool_scheduler.schedule(tool_call)
+        return asyncio.create_task(self._execute_tool(tool_call))
+
     async def _add_tool_result(
         self, 
         thread_id: str, 
@@ -1717,7 +1907,7 @@ class ResponseProcessor:
             metadata["linked_tool_result_message_id"] = tool_message_id
             
         # <<< ADDED: Signal if this is a terminating tool >>>
-        if context.function_name in ['ask', 'complete']:
+        if context.function_name in TERMINATING_TOOLS:
             metadata["agent_should_terminate"] = True
             logger.info(f"Marking tool status for '{context.function_name}' with termination signal.")
             self.trace.event(name="marking_tool_status_for_termination", level="DEFAULT", status_message=(f"Marking tool status for '{context.function_name}' with termination signal."))
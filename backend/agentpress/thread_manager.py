@@ -10,6 +10,7 @@ This module provides comprehensive conversation management, including:
 - Context summarization to manage token limits
 """
 
+import copy
 import json
 from typing import List, Dict, Any, Optional, Type, Union, AsyncGenerator, Literal
 from services.llm import make_llm_api_call
@@ -20,6 +21,8 @@ from agentpress.response_processor import (
     ResponseProcessor,
     ProcessorConfig
 )
+from agentpress.utils.json_helpers import ensure_dict
+from agentpress.utils.cancellation import CancellationToken
 from services.supabase import DBConnection
 from utils.logger import logger
 from langfuse.client import StatefulGenerationClient, StatefulTraceClient
@@ -60,6 +63,8 @@ class ThreadManager:
             target_agent_id=self.target_agent_id
         )
         self.context_manager = ContextManager()
+        # LLM messages per thread, kept in sync by add_message so turns don't reload the thread
+        self._llm_messages: Dict[str, List[Dict[str, Any]]] = {}
 
     def add_tool(self, tool_class: Type[Tool], function_names: Optional[List[str]] = None, **kwargs):
         """Add a tool to the ThreadManager."""
@@ -103,6 +108,10 @@ class ThreadManager:
             logger.info(f"Successfully added message to thread {thread_id}")
 
             if result.data and len(result.data) > 0 and isinstance(result.data[0], dict) and 'message_id' in result.data[0]:
+                if is_llm_message and thread_id in self._llm_messages:
+                    llm_message = self._parse_llm_message(result.data[0])
+                    if llm_message is not None:
+                        self._llm_messages[thread_id].append(llm_message)
                 return result.data[0]
             else:
                 logger.error(f"Insert operation failed or did not return expected data structure for thread {thread_id}. Result data: {result.data}")
@@ -111,18 +120,47 @@ class ThreadManager:
             logger.error(f"Failed to add message to thread {thread_id}: {str(e)}", exc_info=True)
             raise
 
+    def _parse_llm_message(self, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Convert a stored message row into an LLM message with its message_id."""
+        if isinstance(item['content'], str):
+            try:
+                parsed_item = json.loads(item['content'])
+            except json.JSONDecodeError:
+                logger.error(f"Failed to parse message: {item['content']}")
+                return None
+        else:
+            parsed_item = dict(item['content'])
+        parsed_item['message_id'] = item['message_id']
+        return parsed_item
+
+    def invalidate_llm_messages(self, thread_id: Optional[str] = None):
+        """Drop cached LLM messages so the next get_llm_messages reloads them from the database.
+
+        Needed when a thread's messages are changed outside add_message (e.g. by
+        context summarization, which is currently disabled).
+        """
+        if thread_id is None:
+            self._llm_messages.clear()
+        else:
+            self._llm_messages.pop(thread_id, None)
+
     async def get_llm_messages(self, thread_id: str) -> List[Dict[str, Any]]:
         """Get all messages for a thread.
 
-        This method uses the SQL function which handles context truncation
-        by considering summary messages.
+        Messages are loaded from the database on the first call for a thread and
+        then kept up to date in memory by add_message, so later turns of the same
+        run assemble their prompt without reloading the thread.
 
         Args:
             thread_id: The ID of the thread to get messages for.
 
         Returns:
-            List of message objects.
+            List of message objects (copies, safe to modify).
         """
+        if thread_id in self._llm_messages:
+            logger.debug(f"Using cached messages for thread {thread_id}")
+            return [dict(message) for message in self._llm_messages[thread_id]]
+
         logger.debug(f"Getting messages for thread {thread_id}")
         client = await self.db.client
 
@@ -130,26 +168,15 @@ class ThreadManager:
             # result = await client.rpc('get_llm_formatted_messages', {'p_thread_id': thread_id}).execute()
             result = await client.table('messages').select('message_id, content').eq('thread_id', thread_id).eq('is_llm_message', True).order('created_at').execute()
 
-            # Parse the returned data which might be stringified JSON
-            if not result.data:
-                return []
-
             # Return properly parsed JSON objects
             messages = []
-            for item in result.data:
-                if isinstance(item['content'], str):
-                    try:
-                        parsed_item = json.loads(item['content'])
-                        parsed_item['message_id'] = item['message_id']
-                        messages.append(parsed_item)
-                    except json.JSONDecodeError:
-                        logger.error(f"Failed to parse message: {item['content']}")
-                else:
-                    content = item['content']
-                    content['message_id'] = item['message_id']
-                    messages.append(content)
+            for item in result.data or []:
+                parsed_item = self._parse_llm_message(item)
+                if parsed_item is not None:
+                    messages.append(parsed_item)
 
-            return messages
+            self._llm_messages[thread_id] = messages
+            return [dict(message) for message in messages]
 
         except Exception as e:
             logger.error(f"Failed to get messages for thread {thread_id}: {str(e)}", exc_info=True)
@@ -173,6 +200,9 @@ class ThreadManager:
         reasoning_effort: Optional[str] = 'low',
         enable_context_manager: bool = True,
         generation: Optional[StatefulGenerationClient] = None,
+        account_id: Optional[str] = None,
+        account_tier: Optional[str] = None,
+        cancellation_token: Optional[CancellationToken] = None,
     ) -> Union[Dict[str, Any], AsyncGenerator]:
         """Run a conversation thread with LLM integration and tool execution.
 
@@ -193,6 +223,10 @@ class ThreadManager:
             enable_thinking: Whether to enable thinking before making a decision
             reasoning_effort: The effort level for reasoning
             enable_context_manager: Whether to enable automatic context summarization.
+            generation: Optional Langfuse generation to record the LLM call on
+            account_id: Account the thread runs for, used for LLM rate limits
+            account_tier: Subscription tier name of the account
+            cancellation_token: Token that stops the run, cancelling in-flight tool executions
 
         Returns:
             An async generator yielding response chunks or error dict
@@ -212,7 +246,8 @@ class ThreadManager:
             processor_config.max_xml_tool_calls = max_xml_tool_calls
 
         # Create a working copy of the system prompt to potentially modify
-        working_system_prompt = system_prompt.copy()
+        # (deep, so text blocks of list content shared with the caller are not modified)
+        working_system_prompt = copy.deepcopy(system_prompt)
 
         # Add XML examples to system prompt if requested, do this only ONCE before the loop
         if include_xml_examples and processor_config.xml_tool_calling:
@@ -270,38 +305,7 @@ Here are the XML tools available with examples:
                 # 1. Get messages from thread for LLM call
                 messages = await self.get_llm_messages(thread_id)
 
-                # 2. Check token count before proceeding
-                token_count = 0
-                try:
-                    from litellm import token_counter
-                    # Use the potentially modified working_system_prompt for token counting
-                    token_count = token_counter(model=llm_model, messages=[working_system_prompt] + messages)
-                    token_threshold = self.context_manager.token_threshold
-                    logger.info(f"Thread {thread_id} token count: {token_count}/{token_threshold} ({(token_count/token_threshold)*100:.1f}%)")
-
-                    # if token_count >= token_threshold and enable_context_manager:
-                    #     logger.info(f"Thread token count ({token_count}) exceeds threshold ({token_threshold}), summarizing...")
-                    #     summarized = await self.context_manager.check_and_summarize_if_needed(
-                    #         thread_id=thread_id,
-                    #         add_message_callback=self.add_message,
-                    #         model=llm_model,
-                    #         force=True
-                    #     )
-                    #     if summarized:
-                    #         logger.info("Summarization complete, fetching updated messages with summary")
-                    #         messages = await self.get_llm_messages(thread_id)
-                    #         # Recount tokens after summarization, using the modified prompt
-                    #         new_token_count = token_counter(model=llm_model, messages=[working_system_prompt] + messages)
-                    #         logger.info(f"After summarization: token count reduced from {token_count} to {new_token_count}")
-                    #     else:
-                    #         logger.warning("Summarization failed or wasn't needed - proceeding with original messages")
-                    # elif not enable_context_manager:
-                    #     logger.info("Automatic summarization disabled. Skipping token count check and summarization.")
-
-                except Exception as e:
-                    logger.error(f"Error counting tokens or summarizing: {str(e)}")
-
-                # 3. Prepare messages for LLM call + add temporary message if it exists
+                # 2. Prepare messages for LLM call + add temporary message if it exists
                 # Use the working_system_prompt which may contain the XML examples
                 prepared_messages = [working_system_prompt]
 
@@ -324,15 +328,20 @@ Here are the XML tools available with examples:
                         prepared_messages.append(temp_msg)
                         logger.debug("Added temporary message to the end of prepared messages")
 
-                # 4. Prepare tools for LLM call
+                # 3. Prepare tools for LLM call
                 openapi_tool_schemas = None
                 if processor_config.native_tool_calling:
                     openapi_tool_schemas = self.tool_registry.get_openapi_schemas()
                     logger.debug(f"Retrieved {len(openapi_tool_schemas) if openapi_tool_schemas else 0} OpenAPI tool schemas")
 
 
+                # 4. Count tokens and compress long tool results
+                from litellm import token_counter
                 uncompressed_total_token_count = token_counter(model=llm_model, messages=prepared_messages)
+                token_threshold = self.context_manager.token_threshold
+                logger.info(f"Thread {thread_id} token count: {uncompressed_total_token_count}/{token_threshold} ({(uncompressed_total_token_count/token_threshold)*100:.1f}%)")
 
+                compressed = False
                 if uncompressed_total_token_count > (llm_max_tokens or (100 * 1000)):
                     _i = 0 # Count the number of ToolResult messages
                     for msg in reversed(prepared_messages): # Start from the end and work backwards
@@ -343,12 +352,17 @@ Here are the XML tools available with examples:
                                 if _i > 1: # If this is not the most recent ToolResult message
                                     message_id = msg.get('message_id') # Get the message_id
                                     if message_id:
+                                        compressed = True
                                         msg["content"] = msg["content"][:10000] + "... (truncated)" + f"\n\nThis message is too long, use the expand-message tool with message_id \"{message_id}\" to see the full message" # Truncate the message
                                 else:
+                                    compressed = True
                                     msg["content"] = msg["content"][:200000] + f"\n\nThis message is too long, repeat relevant information in your response to remember it" # Truncate to 300k characters to avoid overloading the context at once, but don't truncate otherwise
 
-                compressed_total_token_count = token_counter(model=llm_model, messages=prepared_messages)
-                logger.info(f"token_compression: {uncompressed_total_token_count} -> {compressed_total_token_count}") # Log the token compression for debugging later
+                prompt_token_count = uncompressed_total_token_count
+                if compressed:
+                    compressed_total_token_count = token_counter(model=llm_model, messages=prepared_messages)
+                    logger.info(f"token_compression: {uncompressed_total_token_count} -> {compressed_total_token_count}") # Log the token compression for debugging later
+                    prompt_token_count = compressed_total_token_count
 
                 # 5. Make LLM API call
                 logger.debug("Making LLM API call")
@@ -376,7 +390,10 @@ Here are the XML tools available with examples:
                         tool_choice=tool_choice if processor_config.native_tool_calling else None,
                         stream=stream,
                         enable_thinking=enable_thinking,
-                        reasoning_effort=reasoning_effort
+                        reasoning_effort=reasoning_effort,
+                        account_id=account_id,
+                        account_tier=account_tier,
+                        prompt_tokens=prompt_token_count
                     )
                     logger.debug("Successfully received raw LLM API response stream/object")
 
@@ -393,6 +410,7 @@ Here are the XML tools available with examples:
                         config=processor_config,
                         prompt_messages=prepared_messages,
                         llm_model=llm_model,
+                        cancellation_token=cancellation_token,
                     )
 
                     return response_generator
@@ -405,6 +423,7 @@ Here are the XML tools available with examples:
                         config=processor_config,
                         prompt_messages=prepared_messages,
                         llm_model=llm_model,
+                        cancellation_token=cancellation_token,
                     )
                     return response_generator # Return the generator
 
@@ -424,6 +443,10 @@ Here are the XML tools available with examples:
                 # Reset auto_continue for this iteration
                 auto_continue = False
 
+                if cancellation_token and cancellation_token.cancelled:
+                    logger.info(f"Thread {thread_id} cancelled ({cancellation_token.reason}), not continuing")
+                    return
+
                 # Run the thread once, passing the potentially modified system prompt
                 # Pass temp_msg only on the first iteration
                 try:
@@ -439,16 +462,24 @@ Here are the XML tools available with examples:
                     try:
                         async for chunk in response_gen:
                             # Check if this is a finish reason chunk with tool_calls or xml_tool_limit_reached
-                            if chunk.get('type') == 'finish':
-                                if chunk.get('finish_reason') == 'tool_calls':
+                            # (the processor yields it as a status message with status_type "finish")
+                            finish_reason = None
+                            if chunk.get('type') == 'status':
+                                status_content = ensure_dict(chunk.get('content'))
+                                if status_content.get('status_type') == 'finish':
+                                    finish_reason = status_content.get('finish_reason')
+                            if finish_reason:
+                                if finish_reason == 'tool_calls':
                                     # Only auto-continue if enabled (max > 0)
                                     if native_max_auto_continues > 0:
                                         logger.info(f"Detected finish_reason='tool_calls', auto-continuing ({auto_continue_count + 1}/{native_max_auto_continues})")
                                         auto_continue = True
                                         auto_continue_count += 1
-                                        # Don't yield the finish chunk to avoid confusing the client
+                                        # Don't yield the finish chunk to avoid confusing the client.
+                                        # The tool results are already in the in-memory message cache,
+                                        # so the next turn is assembled without reloading the thread.
                                         continue
-                                elif chunk.get('finish_reason') == 'xml_tool_limit_reached':
+                                elif finish_reason == 'xml_tool_limit_reached':
                                     # Don't auto-continue if XML tool limit was reached
                                     logger.info(f"Detected finish_reason='xml_tool_limit_reached', stopping auto-continue")
                                     auto_continue = False
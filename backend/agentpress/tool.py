@@ -238,3 +238,24 @@ def custom_schema(schema: Dict[str, Any]):
             schema=schema
         ))
     return decorator
+
+def read_only_tool(max_concurrency: Optional[int] = None, idempotent: bool = False):
+    """
+    Decorator marking a tool method as read-only.
+    
+    Read-only tools don't change the sandbox or the state other tools depend on,
+    so the "auto" execution strategy may run them concurrently with each other.
+    Methods without this marker are treated as mutating.
+    
+    Args:
+        max_concurrency: Maximum number of concurrent calls of this tool (None = no limit)
+        idempotent: Whether a native tool call may be started speculatively once its
+            required arguments have streamed, and cancelled if the final arguments differ
+    """
+    def decorator(func):
+        logger.debug(f"Marking function {func.__name__} as read-only (max_concurrency={max_concurrency}, idempotent={idempotent})")
+        func.tool_read_only = True
+        func.tool_max_concurrency = max_concurrency
+        func.tool_idempotent = idempotent
+        return func
+    return decorator
@@ -0,0 +1,97 @@
+"""
+Dependency-aware scheduling of tool calls.
+
+Used by the ResponseProcessor for the "auto" tool execution strategy. Each call
+is classified by the @read_only_tool marker on its tool method:
+- Read-only calls run concurrently, capped per tool by their max_concurrency
+- Mutating calls run one at a time per sandbox, after every earlier call on that sandbox
+- Read-only calls wait for earlier mutating calls on the same sandbox
+- Terminating tools (ask, complete) wait for every earlier call
+
+Tools are grouped by the project (and so sandbox) they are bound to; tools that
+are not bound to a project share a single group.
+"""
+
+import asyncio
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from agentpress.tool import ToolResult
+from agentpress.tool_registry import ToolRegistry
+
+# Tools that end the agent's turn, nothing runs alongside them
+TERMINATING_TOOLS = {'ask', 'complete'}
+
+
+class ToolScheduler:
+    """Schedules tool calls as tasks, ordering them by their dependencies."""
+
+    def __init__(self, tool_registry: ToolRegistry, execute_tool: Callable[[Dict[str, Any]], Awaitable[ToolResult]]):
+        """
+        Args:
+            tool_registry: Registry used to look up tool methods
+            execute_tool: Coroutine function that executes a single tool call
+        """
+        self.tool_registry = tool_registry
+        self.execute_tool = execute_tool
+        self._last_mutation: Dict[Optional[str], asyncio.Task] = {}
+        self._reads_since_mutation: Dict[Optional[str], List[asyncio.Task]] = defaultdict(list)
+        self._pending: List[asyncio.Task] = []
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def classify(self, function_name: str) -> Tuple[bool, Optional[int], Optional[str]]:
+        """Return (read_only, max_concurrency, project_id) for a tool function."""
+        tool_fn = self.tool_registry.get_available_functions().get(function_name)
+        read_only = getattr(tool_fn, 'tool_read_only', False) and function_name not in TERMINATING_TOOLS
+        max_concurrency = getattr(tool_fn, 'tool_max_concurrency', None)
+        project_id = getattr(getattr(tool_fn, '__self__', None), 'project_id', None)
+        return read_only, max_concurrency, project_id
+
+    def schedule(self, tool_call: Dict[str, Any]) -> asyncio.Task:
+        """Start a tool call as a task that runs once its dependencies are done."""
+        function_name = tool_call.get('function_name', 'unknown')
+        read_only, max_concurrency, project_id = self.classify(function_name)
+
+        self._pending = [task for task in self._pending if not task.done()]
+        last_mutation = self._last_mutation.get(project_id)
+        if last_mutation is not None and last_mutation.done():
+            last_mutation = None
+
+        if function_name in TERMINATING_TOOLS:
+            dependencies = list(self._pending)
+        elif read_only:
+            dependencies = [last_mutation] if last_mutation else []
+        else:
+            dependencies = [task for task in self._reads_since_mutation[project_id] if not task.done()]
+            if last_mutation:
+                dependencies.append(last_mutation)
+
+        semaphore = None
+        if read_only and max_concurrency:
+            semaphore = self._semaphores.setdefault(function_name, asyncio.Semaphore(max_concurrency))
+
+        task = asyncio.create_task(self._run(tool_call, dependencies, semaphore))
+        if read_only:
+            self._reads_since_mutation[project_id].append(task)
+        else:
+            self._last_mutation[project_id] = task
+            self._reads_since_mutation[project_id] = []
+        self._pending.append(task)
+        return task
+
+    async def _run(self, tool_call: Dict[str, Any], dependencies: List[asyncio.Task], semaphore: Optional[asyncio.Semaphore]) -> ToolResult:
+        if dependencies:
+            await asyncio.wait(dependencies)
+        if semaphore is None:
+            return await self.execute_tool(tool_call)
+        async with semaphore:
+            return await self.execute_tool(tool_call)
+
+    def cancel_all(self) -> None:
+        """Cancel every scheduled tool call that has not finished."""
+        for task in self._pending:
+            if not task.done():
+                task.cancel()
+        self._pending = []
+        self._last_mutation.clear()
+        self._reads_since_mutation.clear()
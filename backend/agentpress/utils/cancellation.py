@@ -0,0 +1,64 @@
+"""
+Cancellation of agent runs.
+
+A CancellationToken is created per agent run and passed down through
+run_agent -> ThreadManager.run_thread -> ResponseProcessor. Components register
+callbacks on it (cancelling their LLM stream consumer or tool tasks) so a stop
+request interrupts in-flight work immediately instead of being noticed at the
+next yielded response.
+"""
+
+import asyncio
+from typing import Callable, List, Optional
+
+from utils.logger import logger
+
+
+class CancellationToken:
+    """Signals that an agent run should stop.
+
+    Attributes:
+        reason (str): Why the run was cancelled, None until cancelled
+    """
+
+    def __init__(self):
+        self.reason: Optional[str] = None
+        self._event = asyncio.Event()
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        """Cancel the run and invoke every registered callback once."""
+        if self.cancelled:
+            return
+        self.reason = reason
+        self._event.set()
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Error in cancellation callback: {e}")
+
+    def add_callback(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Register a callback for cancellation, called right away if already cancelled.
+
+        Returns:
+            Callable[[], None]: Function that unregisters the callback
+        """
+        if self.cancelled:
+            callback()
+            return lambda: None
+        self._callbacks.append(callback)
+
+        def remove():
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+        return remove
+
+    async def wait(self) -> None:
+        """Wait until the run is cancelled."""
+        await self._event.wait()
@@ -0,0 +1,122 @@
+"""
+Incremental parsing of streamed JSON objects.
+
+Native tool call arguments arrive as JSON text split across many stream chunks.
+Instead of re-parsing the whole accumulated string on every chunk, the parser
+scans each chunk once and only keeps the text of the top-level field being
+read, so parsing is O(n) over the whole stream. Top-level fields are decoded as soon as their value is final, which
+lets callers act on a tool call before its arguments have fully arrived.
+"""
+
+import json
+from typing import Any, Dict, List, Optional
+
+
+class IncrementalJSONParser:
+    """Incremental scanner for a single streamed JSON object.
+
+    Attributes:
+        fields (Dict[str, Any]): Top-level fields whose values are final
+        complete (bool): Whether the top-level object has been closed
+        error (bool): Whether a field value could not be decoded
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self.complete = False
+        self.error = False
+        self._chunks: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._expect_key = True
+        self._key: Optional[str] = None
+        self._in_key = False
+        self._in_value = False
+        # Text of the top-level key or value being read, collected across chunks
+        self._capture: Optional[List[str]] = None
+        self._capture_start = 0
+
+    @property
+    def text(self) -> str:
+        """All JSON text fed so far."""
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+
+    def feed(self, chunk: str) -> bool:
+        """Add a chunk of JSON text and return whether the object is complete."""
+        if self.complete or not chunk:
+            return self.complete
+
+        self._chunks.append(chunk)
+        for pos, char in enumerate(chunk):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._in_key:
+                        self._in_key = False
+                        self._key = json.loads(self._end_capture(chunk, pos + 1))
+                    elif self._depth == 1:
+                        # A string value is final as soon as its closing quote arrives
+                        self._finish_field(chunk, pos + 1)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._expect_key:
+                    self._in_key = True
+                    self._begin_capture(pos)
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1:
+                    # Nested object or array value closed
+                    self._finish_field(chunk, pos + 1)
+                elif self._depth == 0:
+                    self._finish_field(chunk, pos)
+                    self.complete = True
+                    return True
+            elif self._depth == 1:
+                if char == ":":
+                    self._expect_key = False
+                    self._in_value = True
+                    self._begin_capture(pos + 1)
+                elif char == ",":
+                    self._finish_field(chunk, pos)
+
+        if self._capture is not None:
+            self._capture.append(chunk[self._capture_start:])
+            self._capture_start = 0
+        return False
+
+    def _begin_capture(self, start: int) -> None:
+        self._capture = []
+        self._capture_start = start
+
+    def _end_capture(self, chunk: str, end: int) -> str:
+        self._capture.append(chunk[self._capture_start:end])
+        captured = "".join(self._capture)
+        self._capture = None
+        return captured
+
+    def _finish_field(self, chunk: str, end: int) -> None:
+        if self._in_value:
+            value_text = self._end_capture(chunk, end)
+            if self._key is not None:
+                try:
+                    self.fields[self._key] = json.loads(value_text)
+                except json.JSONDecodeError:
+                    self.error = True
+        self._key = None
+        self._in_value = False
+        self._expect_key = True
+
+    def has_final_fields(self, names) -> bool:
+        """Whether every named top-level field has its final value."""
+        return all(name in self.fields for name in names)
@@ -19,6 +19,14 @@ from agent import api as agent_api
 from sandbox import api as sandbox_api
 from services import billing as billing_api
 from services import transcription as transcription_api
+from services.llm_router import llm_router, get_published_router_stats
+from services.llm_rate_limiter import admission_stats
+from services.run_lease import get_lease_stats, get_published_lease_stats
+from services.run_scheduler import get_scheduler_stats
+from services.run_affinity import get_affinity_stats
+from sandbox import sandbox_pool
+from mcp_local.session_pool import session_pool
+from services import http_client
 
 # Load environment variables (these will be available through config)
 load_dotenv()
@@ -59,14 +67,24 @@ async def lifespan(app: FastAPI):
             # Continue without Redis - the application will handle Redis failures gracefully
         
         # Start background tasks
-        # asyncio.create_task(agent_api.restore_running_agent_runs())
+        orphan_reaper = asyncio.create_task(agent_api.run_orphan_reaper())
+        pool_refill = asyncio.create_task(sandbox_pool.run_refill_loop())
         
         yield
         
+        orphan_reaper.cancel()
+        pool_refill.cancel()
+        
         # Clean up agent resources
         logger.info("Cleaning up agent resources")
         await agent_api.cleanup()
         
+        # Close pooled MCP sessions
+        try:
+            await session_pool.close_all()
+        except Exception as e:
+            logger.error(f"Error closing MCP sessions: {e}")
+        
         # Clean up Redis connection
         try:
             logger.info("Closing Redis connection")
@@ -75,6 +93,12 @@ async def lifespan(app: FastAPI):
         except Exception as e:
             logger.error(f"Error closing Redis connection: {e}")
         
+        # Close the shared outbound HTTP client
+        try:
+            await http_client.close()
+        except Exception as e:
+            logger.error(f"Error closing HTTP client: {e}")
+        
         # Clean up database connection
         logger.info("Disconnecting from database")
         await db.disconnect()
@@ -149,6 +173,57 @@ async def health_check():
         "instance_id": instance_id
     }
 
+@app.get("/api/health/llm")
+async def llm_health_check():
+    """Latency, time to first token and circuit breaker state per LLM deployment."""
+    try:
+        processes = await get_published_router_stats()
+    except Exception as e:
+        logger.warning(f"Failed to read published LLM router stats: {e}")
+        processes = {}
+    return {
+        "instance_id": instance_id,
+        "deployments": llm_router.get_router_stats(),
+        "hedging": llm_router.get_hedge_stats(),
+        "admission": admission_stats,
+        "processes": processes
+    }
+
+@app.get("/api/health/runs")
+async def runs_health_check():
+    """Agent run lease renewals, renewal latency, reaped orphans and scheduler queues."""
+    try:
+        processes = await get_published_lease_stats()
+    except Exception as e:
+        logger.warning(f"Failed to read published run lease stats: {e}")
+        processes = {}
+    try:
+        scheduler = await get_scheduler_stats()
+    except Exception as e:
+        logger.warning(f"Failed to read agent run scheduler stats: {e}")
+        scheduler = {}
+    try:
+        affinity = await get_affinity_stats()
+    except Exception as e:
+        logger.warning(f"Failed to read agent run affinity stats: {e}")
+        affinity = {}
+    return {
+        "instance_id": instance_id,
+        "leases": get_lease_stats(),
+        "processes": processes,
+        "scheduler": scheduler,
+        "affinity": affinity
+    }
+
+@app.get("/api/health/sandbox-pool")
+async def sandbox_pool_health_check():
+    """Ready warm sandboxes, target pool size, claims, misses and average creation time."""
+    try:
+        return await sandbox_pool.get_pool_stats()
+    except Exception as e:
+        logger.warning(f"Failed to read sandbox pool stats: {e}")
+        return {"enabled": config.SANDBOX_POOL_ENABLED}
+
 if __name__ == "__main__":
     import uvicorn
     
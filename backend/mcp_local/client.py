@@ -5,11 +5,17 @@ This module handles:
 1. Connecting to MCP servers via Smithery
 2. Converting MCP tools to OpenAPI format for LLMs
 3. Executing MCP tool calls
+
+Sessions are not opened per call: all traffic goes through the process-wide
+pool in mcp_local.session_pool, so runs in the same worker reuse warm sessions.
+Tool lists are cached in Redis (mcp_local.tool_catalog), so a run whose servers
+are all cached registers its MCP tools without any MCP network calls.
 """
 
 import asyncio
 import json
 import base64
+import time
 from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass
 
@@ -42,12 +48,60 @@ except ImportError:
         ToolResult = Any
 
 from utils.logger import logger
+from mcp_local.session_pool import session_pool
+from mcp_local import tool_catalog
 import os
 
 # Get Smithery API key from environment
 SMITHERY_API_KEY = os.getenv("SMITHERY_API_KEY")
 SMITHERY_SERVER_BASE_URL = "https://server.smithery.ai"
 
+# Per-server timeout (seconds) for connecting and listing tools in connect_all
+MCP_CONNECT_TIMEOUT = 20
+
+
+def build_server_url(qualified_name: str, config: Dict[str, Any]) -> str:
+    """Build the Smithery streamable HTTP URL for an MCP server and its config"""
+    config_json = json.dumps(config)
+    config_b64 = base64.b64encode(config_json.encode()).decode()
+    return f"{SMITHERY_SERVER_BASE_URL}/{qualified_name}/mcp?config={config_b64}&api_key={SMITHERY_API_KEY}"
+
+
+def format_tool_result(result: Any) -> Dict[str, Any]:
+    """Convert an MCP CallToolResult into {"content": str, "isError": bool}"""
+    if hasattr(result, 'content'):
+        # Handle content which might be a list of TextContent objects
+        content = result.content
+        if isinstance(content, list):
+            # Extract text from TextContent objects
+            text_parts = []
+            for item in content:
+                if hasattr(item, 'text'):
+                    text_parts.append(item.text)
+                elif hasattr(item, 'content'):
+                    text_parts.append(str(item.content))
+                else:
+                    text_parts.append(str(item))
+            content_str = "\n".join(text_parts)
+        elif hasattr(content, 'text'):
+            # Single TextContent object
+            content_str = content.text
+        elif hasattr(content, 'content'):
+            content_str = str(content.content)
+        else:
+            content_str = str(content)
+        
+        is_error = getattr(result, 'isError', False)
+    else:
+        content_str = str(result)
+        is_error = False
+    
+    return {
+        "content": content_str,
+        "isError": is_error
+    }
+
+
 @dataclass
 class MCPConnection:
     """Represents a connection to an MCP server"""
@@ -95,33 +149,30 @@ class MCPManager:
             )
         
         try:
-            # Encode config in base64
-            config_json = json.dumps(mcp_config["config"])
-            config_b64 = base64.b64encode(config_json.encode()).decode()
-            
-            # Create server URL
-            url = f"{SMITHERY_SERVER_BASE_URL}/{qualified_name}/mcp?config={config_b64}&api_key={SMITHERY_API_KEY}"
-            
-            # Test connection and get available tools
-            async with streamablehttp_client(url) as (read_stream, write_stream, _):
-                async with ClientSession(read_stream, write_stream) as session:
-                    # Initialize the connection
-                    await session.initialize()
-                    logger.info(f"MCP session initialized for {qualified_name}")
-                    
-                    # List available tools
-                    tools_result = await session.list_tools()
-            tools = tools_result.tools if hasattr(tools_result, 'tools') else tools_result
+            config = mcp_config["config"]
+            cached = await tool_catalog.get_cached_tools(qualified_name, config)
+            if cached:
+                tools, cached_at = cached
+                logger.info(f"Using cached tool list for {qualified_name}")
+                if time.time() - cached_at > tool_catalog.MCP_TOOL_CACHE_REFRESH_AFTER:
+                    tool_catalog.schedule_refresh(
+                        qualified_name,
+                        config,
+                        lambda: self._list_tools(qualified_name, config)
+                    )
+            else:
+                tools = await self._list_tools(qualified_name, config)
+                await tool_catalog.store_tools(qualified_name, config, tools)
             
             logger.info(f"Available tools from {qualified_name}: {[t.name for t in tools]}")
             
-            # Create connection object (without persistent session)
+            # Create connection object (the session itself lives in the pool)
             connection = MCPConnection(
                 qualified_name=qualified_name,
                 name=mcp_config["name"],
                 config=mcp_config["config"],
                 enabled_tools=mcp_config.get("enabledTools", []),
-                session=None,  # No persistent session
+                session=None,
                 tools=tools
             )
             
@@ -132,14 +183,30 @@ class MCPManager:
             logger.error(f"Failed to connect to MCP server {qualified_name}: {str(e)}")
             raise
             
+    async def _list_tools(self, qualified_name: str, config: Dict[str, Any]) -> List[Tool]:
+        """List the tools of an MCP server over a pooled session (opened on first use)"""
+        url = build_server_url(qualified_name, config)
+        tools_result = await session_pool.run(
+            qualified_name,
+            config,
+            url,
+            lambda session: session.list_tools(),
+            retry=True
+        )
+        return tools_result.tools if hasattr(tools_result, 'tools') else tools_result
+            
     async def connect_all(self, mcp_configs: List[Dict[str, Any]]) -> None:
-        """Connect to all MCP servers in the configuration"""
-        for config in mcp_configs:
+        """Connect to all MCP servers in the configuration concurrently"""
+        async def connect(config: Dict[str, Any]) -> None:
             try:
-                await self.connect_server(config)
+                await asyncio.wait_for(self.connect_server(config), MCP_CONNECT_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.error(f"Timed out connecting to {config['qualifiedName']} after {MCP_CONNECT_TIMEOUT}s")
             except Exception as e:
                 logger.error(f"Failed to connect to {config['qualifiedName']}: {str(e)}")
                 # Continue with other servers even if one fails
+        
+        await asyncio.gather(*(connect(config) for config in mcp_configs))
                 
     def get_all_tools_openapi(self) -> List[Dict[str, Any]]:
         """
@@ -211,52 +278,16 @@ class MCPManager:
             raise ValueError("SMITHERY_API_KEY environment variable is not set")
         
         try:
-            # Create fresh connection for this tool call
-            config_json = json.dumps(conn.config)
-            config_b64 = base64.b64encode(config_json.encode()).decode()
-            url = f"{SMITHERY_SERVER_BASE_URL}/{qualified_name}/mcp?config={config_b64}&api_key={SMITHERY_API_KEY}"
+            url = build_server_url(qualified_name, conn.config)
             
-            # Use the documented pattern with proper context management
-            async with streamablehttp_client(url) as (read_stream, write_stream, _):
-                async with ClientSession(read_stream, write_stream) as session:
-                    # Initialize the connection
-                    await session.initialize()
-                    
-                    # Call the tool
-                    result = await session.call_tool(original_tool_name, arguments)
-            
-                    # Convert result to dict - handle MCP response properly
-                    if hasattr(result, 'content'):
-                        # Handle content which might be a list of TextContent objects
-                        content = result.content
-                        if isinstance(content, list):
-                            # Extract text from TextContent objects
-                            text_parts = []
-                            for item in content:
-                                if hasattr(item, 'text'):
-                                    text_parts.append(item.text)
-                                elif hasattr(item, 'content'):
-                                    text_parts.append(str(item.content))
-                                else:
-                                    text_parts.append(str(item))
-                            content_str = "\n".join(text_parts)
-                        elif hasattr(content, 'text'):
-                            # Single TextContent object
-                            content_str = content.text
-                        elif hasattr(content, 'content'):
-                            content_str = str(content.content)
-                        else:
-                            content_str = str(content)
-                        
-                        is_error = getattr(result, 'isError', False)
-                    else:
-                        content_str = str(result)
-                        is_error = False
-                        
-                return {
-                        "content": content_str,
-                        "isError": is_error
-                }
+            # Call the tool over a pooled session for this server
+            result = await session_pool.run(
+                qualified_name,
+                conn.config,
+                url,
+                lambda session: session.call_tool(original_tool_name, arguments)
+            )
+            return format_tool_result(result)
                 
         except Exception as e:
             logger.error(f"Error executing MCP tool {tool_name}: {str(e)}")
@@ -266,7 +297,11 @@ class MCPManager:
             }
             
     async def disconnect_all(self):
-        """Disconnect all MCP servers (clear stored configurations)"""
+        """Disconnect all MCP servers (clear stored configurations)
+        
+        Pooled sessions stay open for reuse by later runs and are closed by the
+        pool's idle eviction.
+        """
         for qualified_name in list(self.connections.keys()):
             try:
                 del self.connections[qualified_name]
@@ -0,0 +1,260 @@
+"""
+Persistent MCP session pool
+
+This module keeps long-lived MCP client sessions so tool calls do not pay a
+full HTTP + MCP handshake every time:
+1. One session per (qualified_name, config hash), shared by every run in the worker process
+2. Health checks (ping) before reusing a session that has been quiet for a while
+3. Idle eviction of sessions that have not been used recently
+4. Reconnect-on-failure for stale sessions (retrying only side-effect free operations)
+5. A per-server cap on concurrent calls
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from mcp import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
+from mcp.shared.exceptions import McpError
+
+from utils.logger import logger
+
+# Sessions unused for this long (seconds) are closed by the reaper
+MCP_SESSION_IDLE_TIMEOUT = 300
+
+# Sessions quiet for this long (seconds) are pinged before being reused
+MCP_SESSION_HEALTH_CHECK_INTERVAL = 60
+
+# Timeout (seconds) for opening a session and for health check pings
+MCP_SESSION_CONNECT_TIMEOUT = 30
+MCP_SESSION_PING_TIMEOUT = 5
+
+# Maximum number of in-flight calls per pooled session
+MCP_MAX_CONCURRENT_CALLS_PER_SERVER = 4
+
+T = TypeVar("T")
+PoolKey = Tuple[str, str]
+
+
+def config_hash(config: Dict[str, Any]) -> str:
+    """Stable hash of an MCP server config, used to key pooled sessions and cached catalogs"""
+    config_json = json.dumps(config or {}, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(config_json.encode()).hexdigest()[:16]
+
+
+class PooledSession:
+    """A single MCP session kept open by a background task.
+
+    The streamable HTTP transport and ClientSession are async context managers
+    that must be entered and exited in the same task, so a dedicated task owns
+    them for the lifetime of the session.
+    """
+
+    def __init__(self, key: PoolKey, url: str):
+        self.key = key
+        self.url = url
+        self.session: Optional[ClientSession] = None
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.last_checked = self.created_at
+        self.in_use = 0
+        self.broken = False
+        self._ready = asyncio.Event()
+        self._close_requested = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._error: Optional[BaseException] = None
+
+    async def start(self, timeout: float = MCP_SESSION_CONNECT_TIMEOUT) -> None:
+        self._task = asyncio.create_task(self._run(), name=f"mcp-session-{self.key[0]}")
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            await self.close()
+            raise TimeoutError(f"Timed out connecting to MCP server {self.key[0]} after {timeout}s")
+        except asyncio.CancelledError:
+            # The caller gave up (e.g. a per-server connect timeout), don't leave the task behind
+            self.broken = True
+            self._close_requested.set()
+            self._task.cancel()
+            raise
+        if self.session is None:
+            await self.close()
+            raise self._error or ConnectionError(f"Failed to open MCP session for {self.key[0]}")
+
+    async def _run(self) -> None:
+        try:
+            async with streamablehttp_client(self.url) as (read_stream, write_stream, _):
+                async with ClientSession(read_stream, write_stream) as session:
+                    await session.initialize()
+                    self.session = session
+                    self._ready.set()
+                    logger.info(f"Opened pooled MCP session for {self.key[0]}")
+                    await self._close_requested.wait()
+        except asyncio.CancelledError:
+            pass
+        except BaseException as e:
+            self._error = e
+            if self.session is not None:
+                logger.warning(f"Pooled MCP session for {self.key[0]} terminated: {e}")
+        finally:
+            self.session = None
+            self.broken = True
+            self._ready.set()
+
+    @property
+    def is_alive(self) -> bool:
+        return (
+            not self.broken
+            and self.session is not None
+            and self._task is not None
+            and not self._task.done()
+        )
+
+    async def ping(self) -> bool:
+        if not self.is_alive:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), MCP_SESSION_PING_TIMEOUT)
+            self.last_checked = time.monotonic()
+            return True
+        except Exception as e:
+            logger.warning(f"Health check failed for pooled MCP session {self.key[0]}: {e}")
+            return False
+
+    async def close(self) -> None:
+        self.broken = True
+        self._close_requested.set()
+        if self._task and not self._task.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(self._task), MCP_SESSION_PING_TIMEOUT)
+            except (asyncio.TimeoutError, Exception):
+                self._task.cancel()
+
+
+class MCPSessionPool:
+    """Pool of persistent MCP sessions keyed by (qualified_name, config hash)"""
+
+    def __init__(self):
+        self._sessions: Dict[PoolKey, PooledSession] = {}
+        self._connect_locks: Dict[PoolKey, asyncio.Lock] = {}
+        self._semaphores: Dict[PoolKey, asyncio.Semaphore] = {}
+        self._reaper_task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {"connects": 0, "reuses": 0, "reconnects": 0, "health_check_failures": 0, "evictions": 0}
+
+    def _bind_loop(self) -> None:
+        # Sessions, locks and semaphores belong to one event loop; start over if the loop changed
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            if self._loop is not None:
+                logger.info("Event loop changed, discarding pooled MCP sessions")
+            self._loop = loop
+            self._sessions = {}
+            self._connect_locks = {}
+            self._semaphores = {}
+            self._reaper_task = None
+        if self._reaper_task is None or self._reaper_task.done():
+            self._reaper_task = asyncio.create_task(self._reap_idle_sessions(), name="mcp-session-reaper")
+
+    async def _get_session(self, key: PoolKey, url: str) -> Tuple[PooledSession, bool]:
+        """Return a healthy session for the key and whether it was newly opened"""
+        lock = self._connect_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            pooled = self._sessions.get(key)
+            if pooled is not None:
+                healthy = pooled.is_alive
+                if healthy and time.monotonic() - pooled.last_checked > MCP_SESSION_HEALTH_CHECK_INTERVAL:
+                    healthy = await pooled.ping()
+                    if not healthy:
+                        self.stats["health_check_failures"] += 1
+                if healthy:
+                    self.stats["reuses"] += 1
+                    return pooled, False
+                await self._discard(key, pooled)
+
+            pooled = PooledSession(key, url)
+            await pooled.start()
+            self._sessions[key] = pooled
+            self.stats["connects"] += 1
+            return pooled, True
+
+    async def _discard(self, key: PoolKey, pooled: PooledSession) -> None:
+        if self._sessions.get(key) is pooled:
+            del self._sessions[key]
+        await pooled.close()
+
+    async def run(
+        self,
+        qualified_name: str,
+        config: Dict[str, Any],
+        url: str,
+        operation: Callable[[ClientSession], Awaitable[T]],
+        retry: bool = False,
+    ) -> T:
+        """Run an operation on a pooled session for the given server.
+
+        Calls are limited to MCP_MAX_CONCURRENT_CALLS_PER_SERVER in flight per
+        server. Reused sessions that fail their health check are replaced before
+        the operation is sent. If the operation itself fails, the session is
+        discarded; it is retried once on a new session only with retry=True, as
+        the server may already have acted on the request (set it for side-effect
+        free operations like list_tools, never for call_tool). Protocol errors
+        returned by the server are raised as-is.
+        """
+        self._bind_loop()
+        key = (qualified_name, config_hash(config))
+        semaphore = self._semaphores.setdefault(key, asyncio.Semaphore(MCP_MAX_CONCURRENT_CALLS_PER_SERVER))
+
+        async with semaphore:
+            pooled, fresh = await self._get_session(key, url)
+            for attempt in range(2):
+                current = pooled
+                current.in_use += 1
+                try:
+                    result = await operation(current.session)
+                    current.last_used = time.monotonic()
+                    current.last_checked = current.last_used
+                    return result
+                except McpError:
+                    current.last_used = time.monotonic()
+                    raise
+                except Exception as e:
+                    # Only a reused session may be stale; a fresh session failing is a real error
+                    if not retry or fresh or attempt > 0:
+                        await self._discard(key, current)
+                        raise
+                    logger.warning(f"Pooled MCP session for {qualified_name} failed ({e}), reconnecting")
+                    await self._discard(key, current)
+                    self.stats["reconnects"] += 1
+                    pooled, fresh = await self._get_session(key, url)
+                finally:
+                    current.in_use = max(0, current.in_use - 1)
+
+    async def _reap_idle_sessions(self) -> None:
+        try:
+            while True:
+                await asyncio.sleep(min(30, MCP_SESSION_IDLE_TIMEOUT))
+                now = time.monotonic()
+                for key, pooled in list(self._sessions.items()):
+                    if pooled.in_use == 0 and (not pooled.is_alive or now - pooled.last_used > MCP_SESSION_IDLE_TIMEOUT):
+                        logger.info(f"Evicting idle MCP session for {key[0]}")
+                        self.stats["evictions"] += 1
+                        await self._discard(key, pooled)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"MCP session reaper stopped: {e}")
+
+    async def close_all(self) -> None:
+        """Close every pooled session (used on worker and API shutdown)"""
+        if self._reaper_task and not self._reaper_task.done():
+            self._reaper_task.cancel()
+        for key, pooled in list(self._sessions.items()):
+            await self._discard(key, pooled)
+
+
+# Process-wide pool shared by every MCPManager in this worker
+session_pool = MCPSessionPool()
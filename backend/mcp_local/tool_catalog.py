@@ -0,0 +1,83 @@
+"""
+Redis-backed cache of MCP server tool catalogs
+
+Tool lists are cached per (qualified_name, config hash) so agent runs can
+register MCP tools without contacting the server. Entries older than
+MCP_TOOL_CACHE_REFRESH_AFTER are still served, and refreshed in the background.
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from mcp.types import Tool
+
+from mcp_local.session_pool import config_hash
+from services import redis
+from utils.logger import logger
+
+# Cached catalogs expire after this many seconds
+MCP_TOOL_CACHE_TTL = 3600 * 6
+
+# Catalogs older than this (seconds) are refreshed in the background when read
+MCP_TOOL_CACHE_REFRESH_AFTER = 600
+
+# Keys currently being refreshed by this process, and the tasks doing it
+_refreshing: Set[str] = set()
+_refresh_tasks: Set[asyncio.Task] = set()
+
+
+def catalog_key(qualified_name: str, config: Dict[str, Any]) -> str:
+    return f"mcp_tools:{qualified_name}:{config_hash(config)}"
+
+
+async def get_cached_tools(qualified_name: str, config: Dict[str, Any]) -> Optional[Tuple[List[Tool], float]]:
+    """Return the cached tools and the time they were cached, or None on a miss"""
+    try:
+        raw = await redis.get(catalog_key(qualified_name, config))
+        if not raw:
+            return None
+        data = json.loads(raw)
+        tools = [Tool.model_validate(tool) for tool in data["tools"]]
+        return tools, data.get("cached_at", 0)
+    except Exception as e:
+        logger.warning(f"Failed to read cached MCP tools for {qualified_name}: {e}")
+        return None
+
+
+async def store_tools(qualified_name: str, config: Dict[str, Any], tools: List[Tool]) -> None:
+    try:
+        payload = json.dumps({
+            "cached_at": time.time(),
+            "tools": [tool.model_dump(mode="json", exclude_none=True) for tool in tools]
+        })
+        await redis.set(catalog_key(qualified_name, config), payload, ex=MCP_TOOL_CACHE_TTL)
+    except Exception as e:
+        logger.warning(f"Failed to cache MCP tools for {qualified_name}: {e}")
+
+
+def schedule_refresh(
+    qualified_name: str,
+    config: Dict[str, Any],
+    fetch_tools: Callable[[], Awaitable[List[Tool]]],
+) -> None:
+    """Refresh a cached catalog in the background (at most one refresh per key at a time)"""
+    key = catalog_key(qualified_name, config)
+    if key in _refreshing:
+        return
+    _refreshing.add(key)
+
+    async def refresh():
+        try:
+            tools = await fetch_tools()
+            await store_tools(qualified_name, config, tools)
+            logger.info(f"Refreshed cached MCP tools for {qualified_name}")
+        except Exception as e:
+            logger.warning(f"Background refresh of MCP tools for {qualified_name} failed: {e}")
+        finally:
+            _refreshing.discard(key)
+
+    task = asyncio.create_task(refresh())
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
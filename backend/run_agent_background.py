@@ -5,21 +5,33 @@ import traceback
 from datetime import datetime, timezone
 from typing import Optional
 from services import redis
+from services import run_registry
+from services import run_lease
+from services import run_scheduler
+from services import run_affinity
 from agent.run import run_agent
 from utils.logger import logger
+from utils.config import config
 import dramatiq
 import uuid
 from agentpress.thread_manager import ThreadManager
+from agentpress.utils.cancellation import CancellationToken
 from services.supabase import DBConnection
 from services import redis
 from dramatiq.brokers.rabbitmq import RabbitmqBroker
+from dramatiq.asyncio import get_event_loop_thread
 import os
 from services.langfuse import langfuse
+from mcp_local.session_pool import session_pool
+from services import http_client
 
 rabbitmq_host = os.getenv('RABBITMQ_HOST', 'rabbitmq')
 rabbitmq_port = int(os.getenv('RABBITMQ_PORT', 5672))
 rabbitmq_broker = RabbitmqBroker(host=rabbitmq_host, port=rabbitmq_port, middleware=[dramatiq.middleware.AsyncIO()])
 dramatiq.set_broker(rabbitmq_broker)
+# Shard queues of project affinity routing, consumed by the workers started with --queues
+for shard_queue in run_affinity.get_shard_queues():
+    rabbitmq_broker.declare_queue(shard_queue)
 
 _initialized = False
 db = DBConnection()
@@ -42,6 +54,56 @@ async def initialize():
     logger.info(f"Initialized agent API with instance ID: {instance_id}")
 
 
+class AffinityShardHeartbeat(dramatiq.Middleware):
+    """Reports the affinity shard queues consumed by this worker as alive."""
+
+    def after_worker_boot(self, broker, worker):
+        shards = run_affinity.get_worker_shards(getattr(worker, 'consumer_whitelist', None))
+        if shards:
+            asyncio.run_coroutine_threadsafe(_run_shard_heartbeat(shards), get_event_loop_thread().loop)
+
+
+async def _run_shard_heartbeat(shards):
+    await initialize()
+    await run_affinity.run_heartbeat(shards)
+
+
+rabbitmq_broker.add_middleware(AffinityShardHeartbeat())
+
+# Seconds the worker waits for pooled connections to close on shutdown
+WORKER_CLEANUP_TIMEOUT = 10
+
+
+class WorkerCleanup(dramatiq.Middleware):
+    """Closes the worker's pooled connections once it has stopped processing runs.
+
+    Added after AsyncIO, so its after_worker_shutdown runs while the event loop is still up.
+    """
+
+    def after_worker_shutdown(self, broker, worker):
+        event_loop_thread = get_event_loop_thread()
+        if event_loop_thread is None:
+            return
+        future = asyncio.run_coroutine_threadsafe(_close_worker_resources(), event_loop_thread.loop)
+        try:
+            future.result(timeout=WORKER_CLEANUP_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Failed to close worker resources on shutdown: {e}")
+
+
+async def _close_worker_resources():
+    await session_pool.close_all()
+    await http_client.close()
+
+
+rabbitmq_broker.add_middleware(WorkerCleanup())
+
+
+async def send_agent_run(**kwargs):
+    """Send a run to the worker queue of its project, see services/run_affinity.py."""
+    await run_affinity.send(run_agent_background, **kwargs)
+
+
 @dramatiq.actor
 async def run_agent_background(
     agent_run_id: str,
@@ -71,39 +133,58 @@ async def run_agent_background(
     start_time = datetime.now(timezone.utc)
     total_responses = 0
     pubsub = None
-    stop_checker = None
-    stop_signal_received = False
+    stop_listener = None
+    lease_heartbeat = None
+    cancellation_token = CancellationToken()
+    lease_holder = run_lease.new_holder()
 
     # Define Redis keys and channels
     response_list_key = f"agent_run:{agent_run_id}:responses"
     response_channel = f"agent_run:{agent_run_id}:new_response"
     instance_control_channel = f"agent_run:{agent_run_id}:control:{instance_id}"
     global_control_channel = f"agent_run:{agent_run_id}:control"
-    instance_active_key = f"active_run:{instance_id}:{agent_run_id}"
 
-    async def check_for_stop_signal():
-        nonlocal stop_signal_received
-        if not pubsub: return
+    async def listen_for_stop_signal():
+        """Cancel the run as soon as a STOP control message arrives."""
         try:
-            while not stop_signal_received:
-                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=0.5)
-                if message and message.get("type") == "message":
-                    data = message.get("data")
-                    if isinstance(data, bytes): data = data.decode('utf-8')
-                    if data == "STOP":
-                        logger.info(f"Received STOP signal for agent run {agent_run_id} (Instance: {instance_id})")
-                        stop_signal_received = True
-                        break
-                # Periodically refresh the active run key TTL
-                if total_responses % 50 == 0: # Refresh every 50 responses or so
-                    try: await redis.expire(instance_active_key, redis.REDIS_KEY_TTL)
-                    except Exception as ttl_err: logger.warning(f"Failed to refresh TTL for {instance_active_key}: {ttl_err}")
-                await asyncio.sleep(0.1) # Short sleep to prevent tight loop
+            # listen() blocks on the connection until a message is published, no polling
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                data = message.get("data")
+                if isinstance(data, bytes): data = data.decode('utf-8')
+                if data == "STOP":
+                    logger.info(f"Received STOP signal for agent run {agent_run_id} (Instance: {instance_id})")
+                    cancellation_token.cancel("stop signal")
+                    break
         except asyncio.CancelledError:
-            logger.info(f"Stop signal checker cancelled for {agent_run_id} (Instance: {instance_id})")
+            logger.info(f"Stop signal listener cancelled for {agent_run_id} (Instance: {instance_id})")
         except Exception as e:
-            logger.error(f"Error in stop signal checker for {agent_run_id}: {e}", exc_info=True)
-            stop_signal_received = True # Stop the run if the checker fails
+            logger.error(f"Error in stop signal listener for {agent_run_id}: {e}", exc_info=True)
+            cancellation_token.cancel("stop signal listener failed") # Stop the run if the listener fails
+
+    async def renew_lease():
+        """Renew the run's lease and registration until the run ends."""
+        while True:
+            await asyncio.sleep(config.RUN_LEASE_HEARTBEAT_INTERVAL)
+            try:
+                if not await run_lease.renew(agent_run_id, lease_holder):
+                    # The lease expired and the run was reaped, stop doing its work
+                    logger.error(f"Agent run {agent_run_id} lost its lease, stopping (Instance: {instance_id})")
+                    cancellation_token.cancel("lease lost")
+                    return
+                await run_registry.heartbeat(instance_id, agent_run_id)
+            except Exception as e:
+                logger.warning(f"Failed to renew lease of agent run {agent_run_id}: {e}")
+            await run_lease.publish_stats()
+
+    # Take over the run's lease; a lease held by another worker means this is a duplicate delivery
+    try:
+        if not await run_lease.acquire(agent_run_id, lease_holder):
+            logger.warning(f"Agent run {agent_run_id} is leased by another worker, skipping duplicate delivery")
+            return
+    except Exception as e:
+        logger.warning(f"Failed to acquire lease of agent run {agent_run_id}, running without one: {e}")
 
     trace = langfuse.trace(name="agent_run", id=agent_run_id, session_id=thread_id, metadata={"project_id": project_id, "instance_id": instance_id})
     try:
@@ -111,10 +192,11 @@ async def run_agent_background(
         pubsub = await redis.create_pubsub()
         await pubsub.subscribe(instance_control_channel, global_control_channel)
         logger.debug(f"Subscribed to control channels: {instance_control_channel}, {global_control_channel}")
-        stop_checker = asyncio.create_task(check_for_stop_signal())
+        stop_listener = asyncio.create_task(listen_for_stop_signal())
 
-        # Ensure active run key exists and has TTL
-        await redis.set(instance_active_key, "running", ex=redis.REDIS_KEY_TTL)
+        # Ensure the run is registered to this instance
+        await run_registry.register(instance_id, agent_run_id)
+        lease_heartbeat = asyncio.create_task(renew_lease())
 
 
         # Initialize agent generator
@@ -126,34 +208,46 @@ async def run_agent_background(
             agent_config=agent_config,
             trace=trace,
             is_agent_builder=is_agent_builder,
-            target_agent_id=target_agent_id
+            target_agent_id=target_agent_id,
+            cancellation_token=cancellation_token
         )
 
         final_status = "running"
         error_message = None
 
-        async for response in agent_gen:
-            if stop_signal_received:
-                logger.info(f"Agent run {agent_run_id} stopped by signal.")
-                final_status = "stopped"
-                trace.span(name="agent_run_stopped").end(status_message="agent_run_stopped", level="WARNING")
-                break
-
-            # Store response in Redis list and publish notification
-            response_json = json.dumps(response)
-            asyncio.create_task(redis.rpush(response_list_key, response_json))
-            asyncio.create_task(redis.publish(response_channel, "new"))
-            total_responses += 1
-
-            # Check for agent-signaled completion or error
-            if response.get('type') == 'status':
-                 status_val = response.get('status')
-                 if status_val in ['completed', 'failed', 'stopped']:
-                     logger.info(f"Agent run {agent_run_id} finished via status message: {status_val}")
-                     final_status = status_val
-                     if status_val == 'failed' or status_val == 'stopped':
-                         error_message = response.get('message', f"Run ended with status: {status_val}")
-                     break
+        async def consume_responses():
+            nonlocal total_responses, final_status, error_message
+            async for response in agent_gen:
+                # Store response in Redis list and publish notification
+                response_json = json.dumps(response)
+                asyncio.create_task(redis.rpush(response_list_key, response_json))
+                asyncio.create_task(redis.publish(response_channel, "new"))
+                total_responses += 1
+
+                # Check for agent-signaled completion or error
+                if response.get('type') == 'status':
+                     status_val = response.get('status')
+                     if status_val in ['completed', 'failed', 'stopped']:
+                         logger.info(f"Agent run {agent_run_id} finished via status message: {status_val}")
+                         final_status = status_val
+                         if status_val == 'failed' or status_val == 'stopped':
+                             error_message = response.get('message', f"Run ended with status: {status_val}")
+                         break
+
+        # Responses are consumed in their own task so a stop signal can cancel
+        # it wherever it is waiting (LLM stream, tool execution, database write)
+        consumer = asyncio.create_task(consume_responses())
+        remove_cancel_callback = cancellation_token.add_callback(consumer.cancel)
+        try:
+            await consumer
+        except asyncio.CancelledError:
+            if not cancellation_token.cancelled:
+                raise # The worker itself is being cancelled
+            logger.info(f"Agent run {agent_run_id} stopped by signal.")
+            final_status = "stopped"
+            trace.span(name="agent_run_stopped").end(status_message="agent_run_stopped", level="WARNING")
+        finally:
+            remove_cancel_callback()
 
         # If loop finished without explicit completion/error/stop signal, mark as completed
         if final_status == "running":
@@ -217,12 +311,18 @@ async def run_agent_background(
             logger.warning(f"Failed to publish ERROR signal: {str(e)}")
 
     finally:
-        # Cleanup stop checker task
-        if stop_checker and not stop_checker.done():
-            stop_checker.cancel()
-            try: await stop_checker
+        # Cleanup stop signal listener task
+        if stop_listener and not stop_listener.done():
+            stop_listener.cancel()
+            try: await stop_listener
+            except asyncio.CancelledError: pass
+            except Exception as e: logger.warning(f"Error during stop_listener cancellation: {e}")
+
+        # Stop renewing the lease
+        if lease_heartbeat and not lease_heartbeat.done():
+            lease_heartbeat.cancel()
+            try: await lease_heartbeat
             except asyncio.CancelledError: pass
-            except Exception as e: logger.warning(f"Error during stop_checker cancellation: {e}")
 
         # Close pubsub connection
         if pubsub:
@@ -236,23 +336,33 @@ async def run_agent_background(
         # Set TTL on the response list in Redis
         await _cleanup_redis_response_list(agent_run_id)
 
-        # Remove the instance-specific active run key
-        await _cleanup_redis_instance_key(agent_run_id)
+        # Remove the run from the run registry
+        await _cleanup_run_registration(agent_run_id)
+
+        # Release the lease so the run is not reaped as an orphan
+        try:
+            await run_lease.release(agent_run_id, lease_holder)
+        except Exception as e:
+            logger.warning(f"Failed to release lease of agent run {agent_run_id}: {str(e)}")
+
+        # Free the run's scheduler slot and shard load, and send the next queued runs
+        try:
+            await run_affinity.release(agent_run_id)
+            if await run_scheduler.release(agent_run_id):
+                await run_scheduler.dispatch(send_agent_run)
+        except Exception as e:
+            logger.warning(f"Failed to release agent run {agent_run_id} from the scheduler: {str(e)}")
 
         logger.info(f"Agent run background task fully completed for: {agent_run_id} (Instance: {instance_id}) with final status: {final_status}")
 
-async def _cleanup_redis_instance_key(agent_run_id: str):
-    """Clean up the instance-specific Redis key for an agent run."""
-    if not instance_id:
-        logger.warning("Instance ID not set, cannot clean up instance key.")
-        return
-    key = f"active_run:{instance_id}:{agent_run_id}"
-    logger.debug(f"Cleaning up Redis instance key: {key}")
+async def _cleanup_run_registration(agent_run_id: str):
+    """Remove an agent run from the run registry."""
+    logger.debug(f"Removing agent run {agent_run_id} from the run registry")
     try:
-        await redis.delete(key)
-        logger.debug(f"Successfully cleaned up Redis key: {key}")
+        await run_registry.unregister(agent_run_id)
+        logger.debug(f"Successfully removed agent run {agent_run_id} from the run registry")
     except Exception as e:
-        logger.warning(f"Failed to clean up Redis key {key}: {str(e)}")
+        logger.warning(f"Failed to remove agent run {agent_run_id} from the run registry: {str(e)}")
 
 # TTL for Redis response lists (24 hours)
 REDIS_RESPONSE_LIST_TTL = 3600 * 24
@@ -1,20 +1,36 @@
+import asyncio
+import hashlib
 import os
+import time
 import urllib.parse
-from typing import Optional
+import zlib
+from typing import AsyncIterator, Dict, Optional, Tuple
 
 from fastapi import FastAPI, UploadFile, File, HTTPException, APIRouter, Form, Depends, Request
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 
 from sandbox.sandbox import get_or_start_sandbox, delete_sandbox
 from utils.logger import logger
-from utils.auth_utils import get_optional_user_id
+from utils.auth_utils import get_optional_user_id, is_account_member
 from services.supabase import DBConnection
 
 # Initialize shared resources
 router = APIRouter(tags=["sandbox"])
 db = None
 
+# Owner project of a sandbox: sandbox_id -> (expires at, project_id / account_id / is_public)
+SANDBOX_PROJECT_CACHE_TTL = 30
+SANDBOX_PROJECT_CACHE_MAX_SIZE = 10000
+_sandbox_projects: Dict[str, Tuple[float, dict]] = {}
+
+# File downloads are relayed in chunks of this size
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+# Smaller files are not worth compressing
+GZIP_MIN_SIZE = 1024
+# Suffix of the ETag of the gzip-encoded representation of a file
+GZIP_ETAG_SUFFIX = "-gz"
+
 def initialize(_db: DBConnection):
     """Initialize the sandbox API with resources from the main API."""
     global db
@@ -65,6 +81,36 @@ def normalize_path(path: str) -> str:
         logger.error(f"Error normalizing path '{path}': {str(e)}")
         return path  # Return original path if decoding fails
 
+async def get_sandbox_project(client, sandbox_id: str) -> Optional[dict]:
+    """
+    Look up the project that owns a sandbox, cached for SANDBOX_PROJECT_CACHE_TTL seconds.
+    
+    Args:
+        client: The Supabase client
+        sandbox_id: The sandbox ID to look up
+        
+    Returns:
+        Optional[dict]: project_id, account_id and is_public of the project, None if
+        no project owns the sandbox (not cached, the sandbox may be about to be saved)
+    """
+    now = time.monotonic()
+    cached = _sandbox_projects.get(sandbox_id)
+    if cached and now < cached[0]:
+        return cached[1]
+    
+    project_result = await client.table('projects').select('project_id, account_id, is_public').eq('sandbox_id', sandbox_id).limit(1).execute()
+    if not project_result.data:
+        return None
+    
+    if len(_sandbox_projects) >= SANDBOX_PROJECT_CACHE_MAX_SIZE:
+        _sandbox_projects.clear()
+    _sandbox_projects[sandbox_id] = (now + SANDBOX_PROJECT_CACHE_TTL, project_result.data[0])
+    return project_result.data[0]
+
+def invalidate_sandbox_project(sandbox_id: str) -> None:
+    """Forget the cached project of a sandbox."""
+    _sandbox_projects.pop(sandbox_id, None)
+
 async def verify_sandbox_access(client, sandbox_id: str, user_id: Optional[str] = None):
     """
     Verify that a user has access to a specific sandbox based on account membership.
@@ -75,18 +121,16 @@ async def verify_sandbox_access(client, sandbox_id: str, user_id: Optional[str]
         user_id: The user ID to check permissions for. Can be None for public resource access.
         
     Returns:
-        dict: Project data containing sandbox information
+        dict: project_id, account_id and is_public of the project that owns the sandbox
         
     Raises:
         HTTPException: If the user doesn't have access to the sandbox or sandbox doesn't exist
     """
     # Find the project that owns this sandbox
-    project_result = await client.table('projects').select('*').filter('sandbox->>id', 'eq', sandbox_id).execute()
+    project_data = await get_sandbox_project(client, sandbox_id)
     
-    if not project_result.data or len(project_result.data) == 0:
+    if not project_data:
         raise HTTPException(status_code=404, detail="Sandbox not found")
-    
-    project_data = project_result.data[0]
 
     if project_data.get('is_public'):
         return project_data
@@ -98,10 +142,8 @@ async def verify_sandbox_access(client, sandbox_id: str, user_id: Optional[str]
     account_id = project_data.get('account_id')
     
     # Verify account membership
-    if account_id:
-        account_user_result = await client.schema('basejump').from_('account_user').select('account_role').eq('user_id', user_id).eq('account_id', account_id).execute()
-        if account_user_result.data and len(account_user_result.data) > 0:
-            return project_data
+    if account_id and await is_account_member(client, user_id, account_id):
+        return project_data
     
     raise HTTPException(status_code=403, detail="Not authorized to access this sandbox")
 
@@ -119,22 +161,14 @@ async def get_sandbox_by_id_safely(client, sandbox_id: str):
     Raises:
         HTTPException: If the sandbox doesn't exist or can't be retrieved
     """
-    # Find the project that owns this sandbox
-    project_result = await client.table('projects').select('project_id').filter('sandbox->>id', 'eq', sandbox_id).execute()
-    
-    if not project_result.data or len(project_result.data) == 0:
+    # Find the project that owns this sandbox (usually cached by verify_sandbox_access)
+    if not await get_sandbox_project(client, sandbox_id):
         logger.error(f"No project found for sandbox ID: {sandbox_id}")
         raise HTTPException(status_code=404, detail="Sandbox not found - no project owns this sandbox ID")
     
-    # project_id = project_result.data[0]['project_id']
-    # logger.debug(f"Found project {project_id} for sandbox {sandbox_id}")
-    
     try:
         # Get the sandbox
         sandbox = await get_or_start_sandbox(sandbox_id)
-        # Extract just the sandbox object from the tuple (sandbox, sandbox_id, sandbox_pass)
-        # sandbox = sandbox_tuple[0]
-            
         return sandbox
     except Exception as e:
         logger.error(f"Error retrieving sandbox {sandbox_id}: {str(e)}")
@@ -219,6 +253,82 @@ async def list_files(
         logger.error(f"Error listing files in sandbox {sandbox_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _file_etag(path: str, file_info) -> str:
+    """Strong ETag of a sandbox file from its path, size and modification time."""
+    digest = hashlib.md5(f"{path}:{file_info.size}:{file_info.mod_time}".encode()).hexdigest()
+    return f'"{digest}"'
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match / If-Range header matches the ETag of a file, in any encoding."""
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate.replace(GZIP_ETAG_SUFFIX, '') == etag:
+            return True
+    return False
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single-range Range header into inclusive (start, end), None to ignore it.
+
+    Raises:
+        HTTPException: 416 if the range is not satisfiable
+    """
+    if not header.startswith('bytes=') or ',' in header:
+        return None
+    start_str, _, end_str = header[len('bytes='):].strip().partition('-')
+    try:
+        if not start_str:
+            # Suffix range: the last N bytes
+            length = int(end_str)
+            if length <= 0:
+                raise ValueError
+            return max(0, size - length), size - 1
+        start = int(start_str)
+        end = min(int(end_str), size - 1) if end_str else size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+def _open_download(sandbox, path: str, byte_range: Optional[Tuple[int, int]]):
+    """Start downloading a file from the sandbox without reading its body."""
+    headers = {"Range": f"bytes={byte_range[0]}-{byte_range[1]}"} if byte_range else None
+    response = sandbox.toolbox_api.download_file_without_preload_content(sandbox.instance.id, path=path, _headers=headers)
+    if response.status not in (200, 206):
+        body = response.data[:500]
+        response.release_conn()
+        raise Exception(f"HTTP {response.status}: {body.decode('utf-8', errors='replace')}")
+    return response
+
+async def _stream_download(response, skip: int, length: Optional[int], compress: bool) -> AsyncIterator[bytes]:
+    """Relay a download in chunks, skipping and limiting bytes for ranges and gzipping if asked."""
+    chunks = response.stream(DOWNLOAD_CHUNK_SIZE)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    try:
+        while length is None or length > 0:
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                break
+            if skip:
+                dropped = min(skip, len(chunk))
+                chunk, skip = chunk[dropped:], skip - dropped
+            if length is not None:
+                chunk, length = chunk[:length], length - len(chunk[:length])
+            if compressor:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+        if compressor:
+            yield compressor.flush()
+    finally:
+        response.release_conn()
+
 @router.get("/sandboxes/{sandbox_id}/files/content")
 async def read_file(
     sandbox_id: str, 
@@ -226,7 +336,12 @@ async def read_file(
     request: Request = None,
     user_id: Optional[str] = Depends(get_optional_user_id)
 ):
-    """Read a file from the sandbox"""
+    """Read a file from the sandbox.
+
+    The file is streamed and supports single byte ranges (Range, If-Range),
+    revalidation with ETag / If-None-Match from the file's size and modification
+    time, and gzip when the client accepts it.
+    """
     # Normalize the path to handle UTF-8 encoding correctly
     original_path = path
     path = normalize_path(path)
@@ -244,9 +359,44 @@ async def read_file(
         # Get sandbox using the safer method
         sandbox = await get_sandbox_by_id_safely(client, sandbox_id)
         
-        # Read file directly - don't check existence first with a separate call
+        # File metadata is enough to answer revalidation requests, without the file body
         try:
-            content = sandbox.fs.download_file(path)
+            file_info = await asyncio.to_thread(sandbox.fs.get_file_info, path)
+        except Exception as info_err:
+            logger.error(f"Error getting info of file {path} in sandbox {sandbox_id}: {str(info_err)}")
+            raise HTTPException(status_code=404, detail=f"Failed to download file: {str(info_err)}")
+        if file_info.is_dir:
+            raise HTTPException(status_code=400, detail=f"Path is a directory: {path}")
+        
+        size = file_info.size
+        etag = _file_etag(path, file_info)
+        byte_range = None
+        range_header = request.headers.get('range') if request else None
+        if range_header and (not request.headers.get('if-range') or _etag_matches(request.headers.get('if-range'), etag)):
+            byte_range = _parse_range(range_header, size)
+        accept_encoding = request.headers.get('accept-encoding', '') if request else ''
+        compress = byte_range is None and size >= GZIP_MIN_SIZE and 'gzip' in accept_encoding
+        
+        headers = {
+            "ETag": f'{etag[:-1]}{GZIP_ETAG_SUFFIX}"' if compress else etag,
+            "Cache-Control": "private, no-cache",
+            "Vary": "Accept-Encoding",
+            "Accept-Ranges": "bytes",
+        }
+        if request and _etag_matches(request.headers.get('if-none-match'), etag):
+            logger.debug(f"File {path} in sandbox {sandbox_id} not modified")
+            return Response(status_code=304, headers=headers)
+        
+        # Ensure proper encoding by explicitly using UTF-8 for the filename in Content-Disposition header
+        # This applies RFC 5987 encoding for the filename to support non-ASCII characters
+        filename = os.path.basename(path)
+        encoded_filename = filename.encode('utf-8').decode('latin-1')
+        headers["Content-Disposition"] = f"attachment; filename*=UTF-8''{encoded_filename}"
+        
+        if size == 0:
+            return Response(content=b"", media_type="application/octet-stream", headers=headers)
+        try:
+            download = await asyncio.to_thread(_open_download, sandbox, path, byte_range)
         except Exception as download_err:
             logger.error(f"Error downloading file {path} from sandbox {sandbox_id}: {str(download_err)}")
             raise HTTPException(
@@ -254,19 +404,29 @@ async def read_file(
                 detail=f"Failed to download file: {str(download_err)}"
             )
         
-        # Return a Response object with the content directly
-        filename = os.path.basename(path)
-        logger.info(f"Successfully read file {filename} from sandbox {sandbox_id}")
-        
-        # Ensure proper encoding by explicitly using UTF-8 for the filename in Content-Disposition header
-        # This applies RFC 5987 encoding for the filename to support non-ASCII characters
-        encoded_filename = filename.encode('utf-8').decode('latin-1')
-        content_disposition = f"attachment; filename*=UTF-8''{encoded_filename}"
+        status_code = 200
+        skip, length = 0, None
+        if byte_range:
+            start, end = byte_range
+            status_code = 206
+            length = end - start + 1
+            # The sandbox may ignore the Range header and send the whole file
+            skip = start if download.status == 200 else 0
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        if compress:
+            headers["Content-Encoding"] = "gzip"
+        else:
+            # Cap the body at the declared length, the file may grow while it is downloaded (e.g. logs)
+            if length is None:
+                length = size
+            headers["Content-Length"] = str(length)
         
-        return Response(
-            content=content,
+        logger.info(f"Streaming file {filename} from sandbox {sandbox_id} ({status_code}, gzip={compress})")
+        return StreamingResponse(
+            _stream_download(download, skip, length, compress),
+            status_code=status_code,
             media_type="application/octet-stream",
-            headers={"Content-Disposition": content_disposition}
+            headers=headers
         )
     except HTTPException:
         # Re-raise HTTP exceptions without wrapping
@@ -321,6 +481,7 @@ async def delete_sandbox_route(
     try:
         # Delete the sandbox using the sandbox module function
         await delete_sandbox(sandbox_id)
+        invalidate_sandbox_project(sandbox_id)
         
         return {"status": "success", "deleted": True, "sandbox_id": sandbox_id}
     except Exception as e:
@@ -361,8 +522,7 @@ async def ensure_project_sandbox_active(
         
         # Verify account membership
         if account_id:
-            account_user_result = await client.schema('basejump').from_('account_user').select('account_role').eq('user_id', user_id).eq('account_id', account_id).execute()
-            if not (account_user_result.data and len(account_user_result.data) > 0):
+            if not await is_account_member(client, user_id, account_id):
                 logger.error(f"User {user_id} not authorized to access project {project_id}")
                 raise HTTPException(status_code=403, detail="Not authorized to access this project")
     
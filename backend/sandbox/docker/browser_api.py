@@ -6,6 +6,8 @@ import asyncio
 import json
 import logging
 import base64
+import time
+from collections import defaultdict, deque
 from dataclasses import dataclass, field
 from datetime import datetime
 import os
@@ -16,6 +18,190 @@ import pytesseract
 from PIL import Image
 import io
 
+#######################################################
+# Page settle configuration
+#######################################################
+
+# Upper bound (ms) each action may spend waiting for the page to settle.
+# The settle detector returns as soon as the page is stable, so these are
+# only hit on pages that keep mutating or polling the network.
+SETTLE_BUDGETS_MS = {
+    "navigate_to": 10000,
+    "search_google": 8000,
+    "go_back": 8000,
+    "open_tab": 10000,
+    "click_element": 5000,
+    "click_coordinates": 5000,
+    "send_keys": 3000,
+    "select_dropdown_option": 2000,
+    "drag_drop": 2000,
+    "switch_tab": 2000,
+    "close_tab": 2000,
+    "input_text": 1500,
+    "get_dropdown_options": 1500,
+    "open_dropdown": 1500,
+    "scroll_down": 1000,
+    "scroll_up": 1000,
+    "scroll_to_text": 1000,
+    "fetch_page": 8000,
+}
+DEFAULT_SETTLE_BUDGET_MS = 3000
+
+# How long the DOM must be free of mutations to count as quiet
+SETTLE_QUIET_MS = 150
+
+# Number of settle measurements kept per action for the stats endpoint
+SETTLE_STATS_WINDOW = 200
+
+# Resource types that hold connections open and never count as pending work
+SETTLE_IGNORED_RESOURCE_TYPES = {"websocket", "eventsource", "media"}
+
+# Resolves once the DOM has been mutation- and scroll-free for quietMs and no finite CSS/Web
+# animations are running, or once timeoutMs elapses. Waits for two animation
+# frames first so layout triggered by the action has been flushed.
+SETTLE_JS = """
+async ({quietMs, timeoutMs}) => {
+    const start = performance.now();
+    const nextFrame = () => new Promise(resolve => {
+        requestAnimationFrame(() => resolve());
+        // rAF is throttled in background tabs, never block on it
+        setTimeout(resolve, 50);
+    });
+    await nextFrame();
+    await nextFrame();
+
+    const runningAnimations = () => {
+        if (!document.getAnimations) return 0;
+        return document.getAnimations().filter(a => {
+            if (a.playState !== 'running') return false;
+            const timing = a.effect && a.effect.getComputedTiming ? a.effect.getComputedTiming() : null;
+            return !timing || timing.endTime !== Infinity;
+        }).length;
+    };
+
+    return await new Promise(resolve => {
+        let lastMutation = performance.now();
+        const observer = new MutationObserver(() => { lastMutation = performance.now(); });
+        observer.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+        // Smooth scrolling does not mutate the DOM, treat scroll events as activity too
+        const onScroll = () => { lastMutation = performance.now(); };
+        window.addEventListener('scroll', onScroll, {capture: true, passive: true});
+        const check = () => {
+            const now = performance.now();
+            const domQuiet = now - lastMutation >= quietMs;
+            const animations = runningAnimations();
+            if ((domQuiet && animations === 0) || now - start >= timeoutMs) {
+                observer.disconnect();
+                window.removeEventListener('scroll', onScroll, {capture: true});
+                resolve({quiet: domQuiet && animations === 0, animations: animations, elapsed: now - start});
+            } else {
+                setTimeout(check, Math.min(50, quietMs));
+            }
+        };
+        setTimeout(check, Math.min(50, quietMs));
+    });
+}
+"""
+
+#######################################################
+# Page pool configuration
+#######################################################
+
+# Maximum number of pool tabs loading pages at the same time
+PAGE_POOL_SIZE = 5
+
+# Maximum number of URLs accepted by a single fetch_pages call
+PAGE_POOL_MAX_URLS = 20
+
+# Navigation timeout (ms) for a single pool page
+PAGE_POOL_NAVIGATION_TIMEOUT_MS = 30000
+
+PAGE_TEXT_JS = "() => document.body ? document.body.innerText : ''"
+
+# Converts the visible page body to lightweight markdown (headings, paragraphs,
+# lists, links, code, quotes and tables). Navigation and footer chrome is skipped.
+PAGE_MARKDOWN_JS = """
+() => {
+    const SKIP = new Set(['SCRIPT', 'STYLE', 'NOSCRIPT', 'SVG', 'IFRAME', 'CANVAS', 'TEMPLATE', 'HEAD', 'NAV', 'FOOTER']);
+    const BLOCK = new Set(['ADDRESS', 'ARTICLE', 'ASIDE', 'BLOCKQUOTE', 'DETAILS', 'DIV', 'DL', 'FIELDSET', 'FIGURE',
+        'FORM', 'H1', 'H2', 'H3', 'H4', 'H5', 'H6', 'HEADER', 'HR', 'LI', 'MAIN', 'OL', 'P', 'PRE', 'SECTION',
+        'TABLE', 'UL']);
+    const lines = [];
+    const isHidden = el => el.hidden || el.getAttribute('aria-hidden') === 'true';
+    const hasBlockChild = el => Array.from(el.children).some(c => BLOCK.has(c.tagName));
+
+    const inline = node => {
+        let out = '';
+        for (const child of node.childNodes) {
+            if (child.nodeType === Node.TEXT_NODE) {
+                out += child.textContent.replace(/\\s+/g, ' ');
+            } else if (child.nodeType === Node.ELEMENT_NODE && !SKIP.has(child.tagName) && !isHidden(child)) {
+                const text = inline(child);
+                const trimmed = text.trim();
+                if (child.tagName === 'A' && child.href && trimmed) out += `[${trimmed}](${child.href})`;
+                else if ((child.tagName === 'STRONG' || child.tagName === 'B') && trimmed) out += `**${trimmed}**`;
+                else if ((child.tagName === 'EM' || child.tagName === 'I') && trimmed) out += `*${trimmed}*`;
+                else if (child.tagName === 'CODE' && trimmed) out += '`' + trimmed + '`';
+                else if (child.tagName === 'BR') out += '\\n';
+                else out += text;
+            }
+        }
+        return out;
+    };
+
+    const emit = text => {
+        const trimmed = text.trim();
+        if (trimmed) lines.push(trimmed);
+    };
+
+    const walk = (el, listDepth) => {
+        if (SKIP.has(el.tagName) || isHidden(el)) return;
+        const tag = el.tagName;
+        if (/^H[1-6]$/.test(tag)) {
+            emit('#'.repeat(Number(tag[1])) + ' ' + inline(el).trim());
+        } else if (tag === 'PRE') {
+            emit('```\\n' + el.innerText + '\\n```');
+        } else if (tag === 'BLOCKQUOTE') {
+            emit(inline(el).trim().split('\\n').map(l => '> ' + l).join('\\n'));
+        } else if (tag === 'UL' || tag === 'OL') {
+            Array.from(el.children).forEach((li, i) => {
+                if (li.tagName !== 'LI' || isHidden(li)) return;
+                const marker = tag === 'OL' ? `${i + 1}.` : '-';
+                const nested = Array.from(li.children).filter(c => c.tagName === 'UL' || c.tagName === 'OL');
+                const clone = li.cloneNode(true);
+                clone.querySelectorAll('ul, ol').forEach(n => n.remove());
+                emit('  '.repeat(listDepth) + marker + ' ' + inline(clone).trim());
+                nested.forEach(n => walk(n, listDepth + 1));
+            });
+        } else if (tag === 'TABLE') {
+            const rows = Array.from(el.querySelectorAll('tr')).map(tr =>
+                '| ' + Array.from(tr.children).map(cell => inline(cell).trim().replace(/\\|/g, '\\\\|')).join(' | ') + ' |');
+            if (rows.length) {
+                const columns = (rows[0].match(/ \\| /g) || []).length + 1;
+                rows.splice(1, 0, '|' + ' --- |'.repeat(columns));
+                emit(rows.join('\\n'));
+            }
+        } else if (tag === 'HR') {
+            emit('---');
+        } else if (BLOCK.has(tag) || tag === 'BODY') {
+            if (hasBlockChild(el)) {
+                for (const child of el.childNodes) {
+                    if (child.nodeType === Node.ELEMENT_NODE) walk(child, listDepth);
+                    else if (child.nodeType === Node.TEXT_NODE) emit(child.textContent.replace(/\\s+/g, ' '));
+                }
+            } else {
+                emit(inline(el));
+            }
+        } else {
+            emit(inline(el));
+        }
+    };
+
+    if (document.body) walk(document.body, 0);
+    return lines.join('\\n\\n');
+}
+"""
+
 #######################################################
 # Action model definitions
 #######################################################
@@ -75,6 +261,11 @@ class DoneAction(BaseModel):
     success: bool = True
     text: str = ""
 
+class FetchPagesAction(BaseModel):
+    urls: List[str]
+    format: str = "markdown"  # "markdown" or "text"
+    include_screenshots: bool = False
+
 #######################################################
 # DOM Structure Models
 #######################################################
@@ -270,10 +461,30 @@ class BrowserActionResult(BaseModel):
     interactive_elements: Optional[List[Dict[str, Any]]] = None  # Simplified list of interactive elements
     viewport_width: Optional[int] = None
     viewport_height: Optional[int] = None
+    settle_time_ms: Optional[int] = None  # Time spent waiting for the page to settle after the action
+    settled: Optional[bool] = None  # False when the settle budget ran out before the page was stable
     
     class Config:
         arbitrary_types_allowed = True
 
+class PageFetchResult(BaseModel):
+    url: str
+    success: bool = True
+    error: str = ""
+    final_url: Optional[str] = None
+    title: Optional[str] = None
+    content: Optional[str] = None
+    screenshot_base64: Optional[str] = None
+    settle_time_ms: Optional[int] = None
+    elapsed_ms: int = 0
+
+class FetchPagesResult(BaseModel):
+    success: bool = True
+    message: str = ""
+    error: str = ""
+    results: List[PageFetchResult] = []
+    elapsed_ms: int = 0
+
 #######################################################
 # Browser Automation Implementation 
 #######################################################
@@ -288,6 +499,16 @@ class BrowserAutomation:
         self.include_attributes = ["id", "href", "src", "alt", "aria-label", "placeholder", "name", "role", "title", "value"]
         self.screenshot_dir = os.path.join(os.getcwd(), "screenshots")
         os.makedirs(self.screenshot_dir, exist_ok=True)
+        # In-flight request counters per page, maintained from Playwright network events
+        self.pending_requests: Dict[int, int] = defaultdict(int)
+        # Recent settle measurements per action, used to tune SETTLE_BUDGETS_MS
+        self.settle_stats: Dict[str, deque] = defaultdict(lambda: deque(maxlen=SETTLE_STATS_WINDOW))
+        # Background tabs used for parallel fetches, kept separate from the agent's tabs
+        self.page_pool_context = None
+        self.idle_pool_pages: List[Page] = []
+        self.page_pool_semaphore = asyncio.Semaphore(PAGE_POOL_SIZE)
+        # Concurrent fetches must not each create their own pool context
+        self.page_pool_lock = asyncio.Lock()
         
         # Register routes
         self.router.on_startup.append(self.startup)
@@ -312,6 +533,7 @@ class BrowserAutomation:
         
         # Content actions
         self.router.post("/automation/extract_content")(self.extract_content)
+        self.router.post("/automation/fetch_pages")(self.fetch_pages)
         self.router.post("/automation/save_pdf")(self.save_pdf)
         
         # Scroll actions
@@ -325,6 +547,9 @@ class BrowserAutomation:
         
         # Drag and drop
         self.router.post("/automation/drag_drop")(self.drag_drop)
+        
+        # Diagnostics
+        self.router.get("/automation/settle_stats")(self.get_settle_stats)
 
     async def startup(self):
         """Initialize the browser instance on startup"""
@@ -358,7 +583,7 @@ class BrowserAutomation:
                 print(f"Error finding existing page, creating new one. ( {page_error})")
                 page = await self.browser.new_page(viewport={'width': 1024, 'height': 768})
                 print("New page created successfully")
-                self.pages.append(page)
+                self.register_page(page)
                 self.current_page_index = 0
                 # Navigate directly to google.com instead of about:blank
                 await page.goto("https://www.google.com", wait_until="domcontentloaded", timeout=30000)
@@ -372,6 +597,13 @@ class BrowserAutomation:
             
     async def shutdown(self):
         """Clean up browser instance on shutdown"""
+        if self.page_pool_context:
+            try:
+                await self.page_pool_context.close()
+            except Exception as e:
+                print(f"Error closing page pool context: {e}")
+            self.page_pool_context = None
+            self.idle_pool_pages = []
         if self.browser:
             await self.browser.close()
     
@@ -381,6 +613,167 @@ class BrowserAutomation:
             raise HTTPException(status_code=500, detail="No browser pages available")
         return self.pages[self.current_page_index]
     
+    def register_page(self, page: Page) -> None:
+        """Add a page to the tab list and start tracking its in-flight requests"""
+        self.track_page_requests(page)
+        self.pages.append(page)
+    
+    def track_page_requests(self, page: Page) -> None:
+        """Keep a pending request counter for the page from its network events"""
+        key = id(page)
+        
+        def on_request(request):
+            if request.resource_type not in SETTLE_IGNORED_RESOURCE_TYPES:
+                self.pending_requests[key] += 1
+        
+        def on_request_done(request):
+            if request.resource_type not in SETTLE_IGNORED_RESOURCE_TYPES:
+                self.pending_requests[key] = max(0, self.pending_requests[key] - 1)
+        
+        page.on("request", on_request)
+        page.on("requestfinished", on_request_done)
+        page.on("requestfailed", on_request_done)
+        page.on("close", lambda _: self.pending_requests.pop(key, None))
+    
+    async def wait_for_page_settle(self, action_name: str, page: Optional[Page] = None) -> Dict[str, Any]:
+        """Wait until the page is stable after an action, bounded by the action's budget.
+        
+        The page counts as settled when the DOM has been free of mutations for
+        SETTLE_QUIET_MS, no finite animations are running and there are no
+        pending network requests. Returns as soon as that holds, so fast pages
+        pay only a few frames instead of a fixed sleep.
+        
+        Returns a dict with the measured settle time, whether the page actually
+        settled and the requests still pending when the wait ended.
+        """
+        action_key = action_name.split("(")[0]
+        budget_ms = SETTLE_BUDGETS_MS.get(action_key, DEFAULT_SETTLE_BUDGET_MS)
+        if page is None:
+            page = await self.get_current_page()
+        
+        start = time.monotonic()
+        deadline = start + budget_ms / 1000
+        settled = False
+        
+        while True:
+            remaining_ms = int((deadline - time.monotonic()) * 1000)
+            if remaining_ms <= 0:
+                break
+            try:
+                dom_state = await page.evaluate(SETTLE_JS, {"quietMs": SETTLE_QUIET_MS, "timeoutMs": remaining_ms})
+            except Exception as e:
+                if page.is_closed():
+                    print(f"Page closed during {action_name}, not waiting for it to settle")
+                    break
+                # The execution context is destroyed when the action triggered a navigation
+                print(f"Settle check interrupted during {action_name}, waiting for load: {e}")
+                try:
+                    await page.wait_for_load_state("domcontentloaded", timeout=max(1, int((deadline - time.monotonic()) * 1000)))
+                except Exception:
+                    pass
+                # Don't spin if the check keeps failing on a loaded page (e.g. a crashed target)
+                await asyncio.sleep(0.05)
+                continue
+            
+            if dom_state.get("quiet") and self.pending_requests.get(id(page), 0) == 0:
+                settled = True
+                break
+            
+            if self.pending_requests.get(id(page), 0) > 0:
+                await asyncio.sleep(0.05)
+        
+        settle_ms = int((time.monotonic() - start) * 1000)
+        pending = self.pending_requests.get(id(page), 0)
+        self.settle_stats[action_key].append((settle_ms, settled))
+        print(f"Page settle after {action_name}: {settle_ms}ms (settled={settled}, pending_requests={pending}, budget={budget_ms}ms)")
+        return {"settle_time_ms": settle_ms, "settled": settled, "pending_requests": pending}
+    
+    async def acquire_pool_page(self) -> Page:
+        """Take an idle pool tab or open a new one in the pool context"""
+        while self.idle_pool_pages:
+            page = self.idle_pool_pages.pop()
+            if not page.is_closed():
+                return page
+        async with self.page_pool_lock:
+            if self.page_pool_context is None:
+                self.page_pool_context = await self.browser.new_context(viewport={'width': 1024, 'height': 768})
+        page = await self.page_pool_context.new_page()
+        self.track_page_requests(page)
+        return page
+    
+    async def release_pool_page(self, page: Page) -> None:
+        """Return a pool tab for reuse, blanking it so it stops loading in the background"""
+        if page.is_closed():
+            return
+        try:
+            await page.goto("about:blank", timeout=5000)
+            self.idle_pool_pages.append(page)
+        except Exception as e:
+            print(f"Discarding pool page after reset failure: {e}")
+            try:
+                await page.close()
+            except Exception:
+                pass
+    
+    async def fetch_page(self, url: str, output_format: str, include_screenshot: bool) -> PageFetchResult:
+        """Load a single URL in a pool tab and extract its content"""
+        start = time.monotonic()
+        async with self.page_pool_semaphore:
+            page = None
+            try:
+                page = await self.acquire_pool_page()
+                await page.goto(url, wait_until="domcontentloaded", timeout=PAGE_POOL_NAVIGATION_TIMEOUT_MS)
+                settle = await self.wait_for_page_settle(f"fetch_page({url})", page)
+                
+                try:
+                    title = await page.title()
+                except Exception:
+                    title = ""
+                content = await page.evaluate(PAGE_MARKDOWN_JS if output_format == "markdown" else PAGE_TEXT_JS)
+                
+                screenshot = None
+                if include_screenshot:
+                    screenshot_bytes = await page.screenshot(type='jpeg', quality=60, full_page=False)
+                    screenshot = base64.b64encode(screenshot_bytes).decode('utf-8')
+                
+                return PageFetchResult(
+                    url=url,
+                    final_url=page.url,
+                    title=title,
+                    content=content,
+                    screenshot_base64=screenshot,
+                    settle_time_ms=settle["settle_time_ms"],
+                    elapsed_ms=int((time.monotonic() - start) * 1000)
+                )
+            except Exception as e:
+                print(f"Error fetching {url} in page pool: {e}")
+                return PageFetchResult(
+                    url=url,
+                    success=False,
+                    error=str(e),
+                    elapsed_ms=int((time.monotonic() - start) * 1000)
+                )
+            finally:
+                if page is not None:
+                    await self.release_pool_page(page)
+    
+    async def get_settle_stats(self):
+        """Report measured settle times per action for tuning the settle budgets"""
+        stats = {}
+        for action_key, samples in self.settle_stats.items():
+            if not samples:
+                continue
+            times = sorted(sample[0] for sample in samples)
+            stats[action_key] = {
+                "samples": len(times),
+                "budget_ms": SETTLE_BUDGETS_MS.get(action_key, DEFAULT_SETTLE_BUDGET_MS),
+                "p50_ms": times[len(times) // 2],
+                "p95_ms": times[min(len(times) - 1, int(len(times) * 0.95))],
+                "max_ms": times[-1],
+                "budget_exhausted": sum(1 for sample in samples if not sample[1]),
+            }
+        return stats
+    
     async def get_selector_map(self) -> Dict[int, DOMElementNode]:
         """Get a map of selectable elements on the page"""
         page = await self.get_current_page()
@@ -619,15 +1012,7 @@ class BrowserAutomation:
         try:
             page = await self.get_current_page()
             
-            # Wait for network to be idle and DOM to be stable
-            try:
-                await page.wait_for_load_state("networkidle", timeout=60000)  # Increased timeout to 60s
-            except Exception as e:
-                print(f"Warning: Network idle timeout, proceeding anyway: {e}")
-            
-            # Wait for any animations to complete
-            # await page.wait_for_timeout(1000)  # Wait 1 second for animations
-            
+            # The caller has already waited for the page to settle
             # Take screenshot with increased timeout and better options
             screenshot_bytes = await page.screenshot(
                 type='jpeg',
@@ -686,8 +1071,8 @@ class BrowserAutomation:
         Returns a tuple of (dom_state, screenshot, elements, metadata)
         """
         try:
-            # Wait a moment for any potential async processes to settle
-            await asyncio.sleep(0.5)
+            # Wait until the page is stable instead of sleeping a fixed amount
+            settle = await self.wait_for_page_settle(action_name)
             
             # Get updated state
             dom_state = await self.get_current_dom_state()
@@ -700,7 +1085,10 @@ class BrowserAutomation:
             
             # Collect additional metadata
             page = await self.get_current_page()
-            metadata = {}
+            metadata = {
+                'settle_time_ms': settle['settle_time_ms'],
+                'settled': settle['settled'],
+            }
             
             # Get element count
             metadata['element_count'] = len(dom_state.selector_map)
@@ -778,7 +1166,9 @@ class BrowserAutomation:
             element_count=metadata.get('element_count', 0),
             interactive_elements=metadata.get('interactive_elements', []),
             viewport_width=metadata.get('viewport_width', 0),
-            viewport_height=metadata.get('viewport_height', 0)
+            viewport_height=metadata.get('viewport_height', 0),
+            settle_time_ms=metadata.get('settle_time_ms'),
+            settled=metadata.get('settled')
         )
 
     # Basic Navigation Actions
@@ -788,7 +1178,6 @@ class BrowserAutomation:
         try:
             page = await self.get_current_page()
             await page.goto(action.url, wait_until="domcontentloaded")
-            await page.wait_for_load_state("networkidle", timeout=10000)
             
             # Get updated state after action
             dom_state, screenshot, elements, metadata = await self.get_updated_browser_state(f"navigate_to({action.url})")
@@ -955,9 +1344,6 @@ class BrowserAutomation:
             # Perform the click at the specified coordinates
             await page.mouse.click(action.x, action.y)
             
-            # Give time for any navigation or DOM updates to occur
-            await page.wait_for_load_state("networkidle", timeout=5000)
-            
             # Get updated state after action
             dom_state, screenshot, elements, metadata = await self.get_updated_browser_state(f"click_coordinates({action.x}, {action.y})")
             
@@ -1071,14 +1457,7 @@ class BrowserAutomation:
                  print(error_message)
 
 
-            # Wait for potential page changes/network activity
-            try:
-                await page.wait_for_load_state("networkidle", timeout=5000)
-            except Exception as wait_error:
-                print(f"Timeout or error waiting for network idle after click: {wait_error}")
-                await asyncio.sleep(1) # Fallback wait
-
-            # Get updated state after action
+            # Get updated state after action (waits for the page to settle)
             dom_state, screenshot, elements, metadata = await self.get_updated_browser_state(f"click_element({action.index})")
 
             return self.build_action_result(
@@ -1149,7 +1528,7 @@ class BrowserAutomation:
             element = selector_map[action.index]
             
             # Use CSS selector or XPath to locate and type into the element
-            await page.wait_for_timeout(500)  # Small delay before typing
+            # (page.fill waits for the element to be actionable)
             
             # Demo implementation - would use proper selectors in production
             if element.attributes.get("id"):
@@ -1268,16 +1647,16 @@ class BrowserAutomation:
             print(f"Attempting to open new tab with URL: {action.url}")
             # Create new page in same browser instance
             new_page = await self.browser.new_page()
+            # Registered before navigating so the navigation's requests are tracked
+            self.register_page(new_page)
             print(f"New page created successfully")
             
             # Navigate to the URL
             await new_page.goto(action.url, wait_until="domcontentloaded")
-            await new_page.wait_for_load_state("networkidle", timeout=10000)
             print(f"Navigated to URL in new tab: {action.url}")
             
-            # Add to page list and make it current
-            self.pages.append(new_page)
-            self.current_page_index = len(self.pages) - 1
+            # Make it current
+            self.current_page_index = self.pages.index(new_page)
             print(f"New tab added as index {self.current_page_index}")
             
             # Get updated state after action
@@ -1409,6 +1788,38 @@ class BrowserAutomation:
                 content=None
             )
     
+    async def fetch_pages(self, action: FetchPagesAction = Body(...)):
+        """Load several URLs concurrently in pool tabs and extract text or markdown from each.
+        
+        Pool tabs are separate from the agent's tabs, so the current page and tab
+        list are left untouched. Screenshots are only captured when requested.
+        """
+        start = time.monotonic()
+        urls = [url.strip() for url in action.urls if url and url.strip()]
+        if not urls:
+            return FetchPagesResult(success=False, message="No URLs provided", error="No URLs provided")
+        if len(urls) > PAGE_POOL_MAX_URLS:
+            error = f"Too many URLs: {len(urls)} (maximum is {PAGE_POOL_MAX_URLS})"
+            return FetchPagesResult(success=False, message=error, error=error)
+        if action.format not in ("markdown", "text"):
+            error = f"Unsupported format '{action.format}', expected 'markdown' or 'text'"
+            return FetchPagesResult(success=False, message=error, error=error)
+        
+        results = await asyncio.gather(
+            *[self.fetch_page(url, action.format, action.include_screenshots) for url in urls]
+        )
+        
+        succeeded = sum(1 for result in results if result.success)
+        elapsed_ms = int((time.monotonic() - start) * 1000)
+        print(f"Fetched {succeeded}/{len(urls)} pages in {elapsed_ms}ms")
+        return FetchPagesResult(
+            success=succeeded > 0,
+            message=f"Fetched {succeeded} of {len(urls)} pages",
+            error="" if succeeded > 0 else "All page fetches failed",
+            results=list(results),
+            elapsed_ms=elapsed_ms
+        )
+    
     async def save_pdf(self):
         """Save the current page as a PDF"""
         try:
@@ -1458,8 +1869,6 @@ class BrowserAutomation:
                 await page.evaluate("window.scrollBy(0, window.innerHeight);")
                 amount_str = "one page"
             
-            await page.wait_for_timeout(500)  # Wait for scroll to complete
-            
             # Get updated state after action
             dom_state, screenshot, elements, metadata = await self.get_updated_browser_state(f"scroll_down({amount_str})")
             
@@ -1496,8 +1905,6 @@ class BrowserAutomation:
                 await page.evaluate("window.scrollBy(0, -window.innerHeight);")
                 amount_str = "one page"
             
-            await page.wait_for_timeout(500)  # Wait for scroll to complete
-            
             # Get updated state after action
             dom_state, screenshot, elements, metadata = await self.get_updated_browser_state(f"scroll_up({amount_str})")
             
@@ -1538,7 +1945,6 @@ class BrowserAutomation:
                 try:
                     if await locator.count() > 0 and await locator.first.is_visible():
                         await locator.first.scroll_into_view_if_needed()
-                        await asyncio.sleep(0.5)  # Wait for scroll to complete
                         found = True
                         break
                 except Exception:
@@ -1610,7 +2016,7 @@ class BrowserAutomation:
                     # For other dropdown types, try to get options using a more generic approach
                     # Example for custom dropdowns - would need refinement in real implementation
                     await page.click(f"#{element.attributes.get('id')}") if element.attributes.get('id') else None
-                    await page.wait_for_timeout(500)
+                    await self.wait_for_page_settle(f"open_dropdown({index})", page)
                     
                     options_js = """
                     Array.from(document.querySelectorAll('.dropdown-item, [role="option"], li'))
@@ -1697,13 +2103,11 @@ class BrowserAutomation:
                 else:
                     await page.click(f"//{element.tag_name}[{index}]")
                 
-                await page.wait_for_timeout(500)
+                await self.wait_for_page_settle(f"open_dropdown({index})", page)
                 
                 # Then try to click the option
                 await page.click(f"text={option_text}")
             
-            await page.wait_for_timeout(500)
-            
             # Get updated state after action
             dom_state, screenshot, elements, metadata = await self.get_updated_browser_state(f"select_dropdown_option({index}, '{option_text}')")
             
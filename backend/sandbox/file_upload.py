@@ -0,0 +1,155 @@
+"""
+Uploading user files into a sandbox.
+
+Files are uploaded concurrently (UPLOAD_CONCURRENCY at a time) and verified with
+a single listing of the target directory once all uploads are done:
+- Several small files are packed into one tar archive, uploaded once and
+  extracted in the sandbox
+- Large files are read from the UploadFile in CHUNK_SIZE chunks, uploaded as
+  parts and joined in the sandbox, so a file is never held in memory whole
+- Other files are uploaded with a single upload_file call
+"""
+
+import asyncio
+import io
+import shlex
+import tarfile
+import time
+import uuid
+from typing import List, Tuple
+
+from daytona_sdk import Sandbox
+from fastapi import UploadFile
+
+from utils.logger import logger
+
+UPLOAD_CONCURRENCY = 4
+CHUNK_SIZE = 8 * 1024 * 1024
+# Small files are packed into one archive when there are at least this many
+TAR_MIN_FILES = 3
+TAR_MAX_FILE_SIZE = 1024 * 1024
+
+
+def safe_filename(filename: str) -> str:
+    return filename.replace('/', '_').replace('\\', '_')
+
+
+async def _exec(sandbox: Sandbox, command: str) -> None:
+    response = await asyncio.to_thread(sandbox.process.exec, command, timeout=120)
+    if response.exit_code != 0:
+        raise RuntimeError(f"Command failed with exit code {response.exit_code}: {response.result}")
+
+
+async def _upload_chunked(sandbox: Sandbox, file: UploadFile, target_path: str, first_chunk: bytes) -> None:
+    """Upload a file part by part into a temporary directory and join the parts in place."""
+    parts_dir = f"/tmp/upload-{uuid.uuid4().hex}"
+    await asyncio.to_thread(sandbox.fs.create_folder, parts_dir, "755")
+    try:
+        chunk, part = first_chunk, 0
+        while chunk:
+            await asyncio.to_thread(sandbox.fs.upload_file, f"{parts_dir}/{part:06d}", chunk)
+            part += 1
+            chunk = await file.read(CHUNK_SIZE)
+        await _exec(sandbox, f"cat {parts_dir}/* > {shlex.quote(target_path)}")
+        logger.debug(f"Uploaded {target_path} in {part} parts")
+    finally:
+        # A failed cleanup must not hide the upload error
+        try:
+            await _exec(sandbox, f"rm -rf {parts_dir}")
+        except Exception as e:
+            logger.warning(f"Failed to remove upload parts {parts_dir} in sandbox {sandbox.id}: {str(e)}")
+
+
+async def _upload_file(sandbox: Sandbox, file: UploadFile, target_path: str) -> None:
+    chunk = await file.read(CHUNK_SIZE)
+    if len(chunk) < CHUNK_SIZE:
+        await asyncio.to_thread(sandbox.fs.upload_file, target_path, chunk)
+        return
+    await _upload_chunked(sandbox, file, target_path, chunk)
+
+
+async def _upload_archive(sandbox: Sandbox, files: List[Tuple[UploadFile, str]], target_dir: str) -> None:
+    """Upload small files as one tar archive and extract it into target_dir."""
+    buffer = io.BytesIO()
+    now = time.time()
+    with tarfile.open(fileobj=buffer, mode="w") as archive:
+        for file, name in files:
+            content = await file.read()
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            info.mtime = now
+            info.mode = 0o644
+            archive.addfile(info, io.BytesIO(content))
+    archive_path = f"/tmp/upload-{uuid.uuid4().hex}.tar"
+    await asyncio.to_thread(sandbox.fs.upload_file, archive_path, buffer.getvalue())
+    await _exec(sandbox, f"tar -xf {archive_path} -C {shlex.quote(target_dir)} && rm -f {archive_path}")
+    logger.debug(f"Uploaded {len(files)} files to {target_dir} as one archive")
+
+
+async def upload_files(sandbox: Sandbox, files: List[UploadFile], target_dir: str = "/workspace") -> Tuple[List[str], List[str]]:
+    """Upload files into target_dir of the sandbox and verify they arrived.
+
+    Every file is closed once handled.
+
+    Returns:
+        Tuple[List[str], List[str]]: Sandbox paths of the uploaded files and the
+        names of the files that failed to upload
+    """
+    named = [(file, safe_filename(file.filename)) for file in files if file.filename]
+    small = [(file, name) for file, name in named if file.size is not None and file.size <= TAR_MAX_FILE_SIZE]
+    if len(small) < TAR_MIN_FILES:
+        small = []
+    uploaded: List[str] = []
+    failed: List[str] = []
+    semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+
+    async def upload_one(file: UploadFile, name: str) -> None:
+        target_path = f"{target_dir}/{name}"
+        async with semaphore:
+            try:
+                logger.info(f"Uploading {name} to {target_path} in sandbox {sandbox.id}")
+                await _upload_file(sandbox, file, target_path)
+                uploaded.append(name)
+            except Exception as e:
+                logger.error(f"Error uploading {name} to sandbox {sandbox.id}: {str(e)}", exc_info=True)
+                failed.append(name)
+            finally:
+                await file.close()
+
+    async def upload_small() -> None:
+        async with semaphore:
+            try:
+                await _upload_archive(sandbox, small, target_dir)
+                uploaded.extend(name for _, name in small)
+            except Exception as e:
+                logger.error(f"Error uploading {len(small)} files to sandbox {sandbox.id} as an archive: {str(e)}", exc_info=True)
+                failed.extend(name for _, name in small)
+            finally:
+                for file, _ in small:
+                    await file.close()
+
+    small_files = {id(file) for file, _ in small}
+    tasks = [upload_one(file, name) for file, name in named if id(file) not in small_files]
+    if small:
+        tasks.append(upload_small())
+    await asyncio.gather(*tasks)
+
+    if uploaded:
+        try:
+            listed = {f.name for f in await asyncio.to_thread(sandbox.fs.list_files, target_dir)}
+        except Exception as e:
+            logger.error(f"Error verifying uploads in {target_dir} of sandbox {sandbox.id}: {str(e)}", exc_info=True)
+            listed = set()
+        missing = [name for name in uploaded if name not in listed]
+        if missing:
+            logger.error(f"Verification failed for {missing}: not found in {target_dir} after upload")
+            failed.extend(missing)
+        # Report in the order the files were attached
+        verified = set(uploaded) & listed
+        uploaded = [name for name in dict.fromkeys(name for _, name in named) if name in verified]
+
+    for file in files:
+        if not file.filename:
+            await file.close()
+    logger.info(f"Uploaded {len(uploaded)} files to sandbox {sandbox.id}, {len(failed)} failed")
+    return [f"{target_dir}/{name}" for name in uploaded], failed
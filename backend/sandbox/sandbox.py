@@ -30,6 +30,9 @@ else:
     logger.warning("No Daytona target found in environment variables")
 
 daytona = Daytona(daytona_config)
+
+# Written when a pooled sandbox's VNC password is rotated, read when supervisord (re)starts
+VNC_PASSWORD_FILE = "/root/.vnc/rotated_password"
 logger.debug("Daytona client initialized")
 
 async def get_or_start_sandbox(sandbox_id: str):
@@ -70,9 +73,13 @@ def start_supervisord_session(sandbox: Sandbox):
         logger.info(f"Creating session {session_id} for supervisord")
         sandbox.process.create_session(session_id)
         
-        # Execute supervisord command
+        # Execute supervisord command, with the VNC password rotated after creation
+        # (see sandbox_pool.rotate_vnc_password) taking precedence over the env var
         sandbox.process.execute_session_command(session_id, SessionExecuteRequest(
-            command="exec /usr/bin/supervisord -n -c /etc/supervisor/conf.d/supervisord.conf",
+            command=(
+                f"if [ -f {VNC_PASSWORD_FILE} ]; then export VNC_PASSWORD=$(cat {VNC_PASSWORD_FILE}); fi; "
+                "exec /usr/bin/supervisord -n -c /etc/supervisor/conf.d/supervisord.conf"
+            ),
             var_async=True
         ))
         logger.info(f"Supervisord started in session {session_id}")
@@ -80,14 +87,16 @@ def start_supervisord_session(sandbox: Sandbox):
         logger.error(f"Error starting supervisord session: {str(e)}")
         raise e
 
-def create_sandbox(password: str, project_id: str = None):
-    """Create a new sandbox with all required services configured and running."""
+def create_sandbox(password: str, project_id: str = None, labels: dict = None, auto_stop_interval: int = None):
+    """Create a new sandbox with all required services configured and running.
+
+    Labels default to the project_id; auto_stop_interval (minutes) defaults to Daytona's.
+    """
     
     logger.debug("Creating new Daytona sandbox environment")
     logger.debug("Configuring sandbox with browser-use image and environment variables")
     
-    labels = None
-    if project_id:
+    if project_id and not labels:
         logger.debug(f"Using sandbox_id as label: {project_id}")
         labels = {'id': project_id}
         
@@ -112,7 +121,8 @@ def create_sandbox(password: str, project_id: str = None):
             "cpu": 2,
             "memory": 4,
             "disk": 5,
-        }
+        },
+        auto_stop_interval=auto_stop_interval
     )
     
     # Create the sandbox
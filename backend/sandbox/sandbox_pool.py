@@ -0,0 +1,295 @@
+"""
+Warm pool of pre-created sandboxes for new projects.
+
+Creating a sandbox (Daytona create with the browser image and supervisord
+startup) takes long enough that doing it on the initiate request path delays
+the first response. With SANDBOX_POOL_ENABLED, a background task keeps started
+sandboxes ready per image and initiate claims one:
+- The claim is an atomic pop from Redis, so a sandbox goes to exactly one project
+- The claimed sandbox is relabeled with the project_id, gets the normal
+  auto-stop interval back and its VNC password rotated
+- The pool is refilled asynchronously after every claim
+
+The pool's target size follows the observed initiate rate: enough sandboxes to
+cover the claims expected while replacements are being created (Little's law),
+between SANDBOX_POOL_MIN_SIZE and SANDBOX_POOL_MAX_SIZE.
+
+Redis layout:
+- sandbox_pool:{image}: sorted set of ready sandbox ids by creation time
+- sandbox_pool:claims:{image}: sorted set of recent claims by time, for the rate
+- sandbox_pool:images: set of images that have a pool, to drain outdated ones
+- sandbox_pool:stats: hash of pool counters and the average creation time
+"""
+
+import asyncio
+import math
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+from daytona_api_client.models.workspace_state import WorkspaceState
+from daytona_sdk import Sandbox
+
+from sandbox.sandbox import create_sandbox, daytona, VNC_PASSWORD_FILE
+from services import redis
+from utils.config import config, Configuration
+from utils.logger import logger
+
+IMAGES_KEY = "sandbox_pool:images"
+STATS_KEY = "sandbox_pool:stats"
+REFILL_LOCK_KEY = "sandbox_pool:refill_lock"
+REFILL_LOCK_TTL = 600
+REFILL_INTERVAL = 15
+# Window over which the initiate rate is measured
+CLAIM_RATE_WINDOW = 900
+# Sandboxes created in parallel by one refill
+CREATE_CONCURRENCY = 3
+# Assumed creation time until one has been measured
+DEFAULT_CREATE_SECONDS = 60.0
+# Pooled sandboxes auto-stop after this many idle minutes (as a safety net if
+# the pool loses track of them) and are replaced before then
+POOL_AUTO_STOP_INTERVAL = 60
+MAX_POOLED_AGE = 45 * 60
+# Daytona's default auto-stop interval, restored on claim
+CLAIMED_AUTO_STOP_INTERVAL = 15
+CLAIM_ATTEMPTS = 3
+
+# Pops the oldest sandbox that is still fresh enough to hand out.
+# KEYS: pool. ARGV: minimum creation time
+CLAIM_SCRIPT = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], ARGV[1], '+inf', 'LIMIT', 0, 1)
+if #ids == 0 then
+    return false
+end
+redis.call('ZREM', KEYS[1], ids[1])
+return ids[1]
+"""
+
+# KEYS: lock. ARGV: token
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_scripts: Dict[str, object] = {}
+_refill_requested: Optional[asyncio.Event] = None
+
+
+def _pool_key(image: str) -> str:
+    return f"sandbox_pool:{image}"
+
+
+def _claims_key(image: str) -> str:
+    return f"sandbox_pool:claims:{image}"
+
+
+async def _get_script(name: str, source: str):
+    if name not in _scripts:
+        redis_client = await redis.get_client()
+        _scripts[name] = redis_client.register_script(source)
+    return _scripts[name]
+
+
+def rotate_vnc_password(sandbox: Sandbox, password: str) -> None:
+    """Replace the VNC password of a running sandbox.
+
+    The password is also written to VNC_PASSWORD_FILE so it survives supervisord
+    restarts, and x11vnc is killed so supervisord restarts it with the new password.
+    """
+    command = (
+        f"mkdir -p /root/.vnc && printf '%s' '{password}' > {VNC_PASSWORD_FILE} && chmod 600 {VNC_PASSWORD_FILE} "
+        f"&& echo '{password}' | vncpasswd -f > /root/.vnc/passwd && chmod 600 /root/.vnc/passwd "
+        "&& (pkill -f 'x11vnc -display' || true)"
+    )
+    response = sandbox.process.exec(command, timeout=30)
+    if response.exit_code != 0:
+        raise RuntimeError(f"Failed to rotate VNC password of sandbox {sandbox.id}: {response.result}")
+
+
+def _prepare_claimed(sandbox_id: str, project_id: str, password: str) -> Optional[Sandbox]:
+    sandbox = daytona.get_current_sandbox(sandbox_id)
+    if sandbox.instance.state != WorkspaceState.STARTED:
+        logger.warning(f"Pooled sandbox {sandbox_id} is {sandbox.instance.state}, discarding it")
+        daytona.remove(sandbox)
+        return None
+    sandbox.set_labels({'id': project_id})
+    sandbox.set_autostop_interval(CLAIMED_AUTO_STOP_INTERVAL)
+    rotate_vnc_password(sandbox, password)
+    return sandbox
+
+
+async def claim(project_id: str) -> Optional[Tuple[Sandbox, str]]:
+    """Take a warm sandbox for a new project.
+
+    Returns:
+        Optional[Tuple[Sandbox, str]]: The sandbox and its new VNC password, None when
+        the pool is disabled or empty and the caller should create a sandbox itself
+    """
+    if not config.SANDBOX_POOL_ENABLED:
+        return None
+    image = Configuration.SANDBOX_IMAGE_NAME
+    try:
+        redis_client = await redis.get_client()
+        now = time.time()
+        await redis_client.zadd(_claims_key(image), {f"{now}:{uuid.uuid4().hex[:8]}": now})
+        script = await _get_script("claim", CLAIM_SCRIPT)
+        for _ in range(CLAIM_ATTEMPTS):
+            sandbox_id = await script(keys=[_pool_key(image)], args=[now - MAX_POOLED_AGE])
+            if not sandbox_id:
+                await _incr_stat("misses")
+                logger.info(f"Sandbox pool for {image} is empty, project {project_id} gets a new sandbox")
+                return None
+            password = str(uuid.uuid4())
+            try:
+                sandbox = await asyncio.to_thread(_prepare_claimed, sandbox_id, project_id, password)
+            except Exception as e:
+                logger.error(f"Failed to prepare pooled sandbox {sandbox_id} for project {project_id}: {e}")
+                await _discard(sandbox_id)
+                continue
+            if sandbox:
+                await _incr_stat("claims")
+                logger.info(f"Claimed pooled sandbox {sandbox_id} for project {project_id}")
+                return sandbox, password
+        return None
+    except Exception as e:
+        logger.error(f"Error claiming a pooled sandbox for project {project_id}: {e}")
+        return None
+    finally:
+        request_refill()
+
+
+def request_refill() -> None:
+    """Wake the refill task of this process."""
+    if _refill_requested is not None:
+        _refill_requested.set()
+
+
+async def _incr_stat(name: str, amount: int = 1) -> None:
+    try:
+        redis_client = await redis.get_client()
+        await redis_client.hincrby(STATS_KEY, name, amount)
+    except Exception as e:
+        logger.debug(f"Failed to record sandbox pool stat {name}: {e}")
+
+
+async def _discard(sandbox_id: str) -> None:
+    try:
+        sandbox = await asyncio.to_thread(daytona.get_current_sandbox, sandbox_id)
+        await asyncio.to_thread(daytona.remove, sandbox)
+    except Exception as e:
+        logger.warning(f"Failed to remove pooled sandbox {sandbox_id}: {e}")
+    await _incr_stat("discarded")
+
+
+async def get_target_size(image: str) -> int:
+    """Pool size that covers the claims expected while the pool is being refilled."""
+    redis_client = await redis.get_client()
+    now = time.time()
+    await redis_client.zremrangebyscore(_claims_key(image), "-inf", now - CLAIM_RATE_WINDOW)
+    claims = await redis_client.zcard(_claims_key(image))
+    create_seconds = float(await redis_client.hget(STATS_KEY, "create_seconds") or DEFAULT_CREATE_SECONDS)
+    expected = math.ceil(claims / CLAIM_RATE_WINDOW * create_seconds * 2)
+    return max(config.SANDBOX_POOL_MIN_SIZE, min(config.SANDBOX_POOL_MAX_SIZE, expected))
+
+
+async def _create_pooled(image: str) -> None:
+    start = time.monotonic()
+    sandbox = await asyncio.to_thread(
+        create_sandbox,
+        str(uuid.uuid4()),
+        labels={'pool': 'warm'},
+        auto_stop_interval=POOL_AUTO_STOP_INTERVAL
+    )
+    elapsed = time.monotonic() - start
+    redis_client = await redis.get_client()
+    await redis_client.zadd(_pool_key(image), {sandbox.id: time.time()})
+    previous = float(await redis_client.hget(STATS_KEY, "create_seconds") or elapsed)
+    await redis_client.hset(STATS_KEY, "create_seconds", round(0.8 * previous + 0.2 * elapsed, 2))
+    await _incr_stat("created")
+    logger.info(f"Added sandbox {sandbox.id} to the pool for {image} in {elapsed:.1f}s")
+
+
+async def _drain(image: str, max_created: float) -> int:
+    """Remove and delete pooled sandboxes created before max_created."""
+    redis_client = await redis.get_client()
+    drained = 0
+    for sandbox_id in await redis_client.zrangebyscore(_pool_key(image), "-inf", max_created):
+        # Only the process whose ZREM succeeds deletes the sandbox, a claim may have taken it
+        if await redis_client.zrem(_pool_key(image), sandbox_id):
+            await _discard(sandbox_id)
+            drained += 1
+    return drained
+
+
+async def refill() -> int:
+    """Drain stale and outdated sandboxes and top the pool up to its target size.
+
+    Only one process refills at a time. Returns the number of sandboxes created.
+    """
+    image = Configuration.SANDBOX_IMAGE_NAME
+    redis_client = await redis.get_client()
+    token = uuid.uuid4().hex
+    if not await redis_client.set(REFILL_LOCK_KEY, token, nx=True, ex=REFILL_LOCK_TTL):
+        return 0
+    try:
+        await redis_client.sadd(IMAGES_KEY, image)
+        for pooled_image in await redis_client.smembers(IMAGES_KEY):
+            if pooled_image != image:
+                drained = await _drain(pooled_image, float("inf"))
+                logger.info(f"Drained {drained} sandboxes from the pool of outdated image {pooled_image}")
+                await redis_client.srem(IMAGES_KEY, pooled_image)
+        await _drain(image, time.time() - MAX_POOLED_AGE)
+
+        deficit = await get_target_size(image) - await redis_client.zcard(_pool_key(image))
+        if deficit <= 0:
+            return 0
+        semaphore = asyncio.Semaphore(CREATE_CONCURRENCY)
+
+        async def create_one() -> bool:
+            async with semaphore:
+                try:
+                    await _create_pooled(image)
+                    return True
+                except Exception as e:
+                    logger.error(f"Failed to create a sandbox for the pool: {e}")
+                    return False
+
+        results = await asyncio.gather(*(create_one() for _ in range(deficit)))
+        return sum(results)
+    finally:
+        script = await _get_script("release_lock", RELEASE_LOCK_SCRIPT)
+        await script(keys=[REFILL_LOCK_KEY], args=[token])
+
+
+async def run_refill_loop() -> None:
+    """Keep the pool filled for the lifetime of the API process."""
+    global _refill_requested
+    if not config.SANDBOX_POOL_ENABLED:
+        return
+    _refill_requested = asyncio.Event()
+    logger.info(f"Starting sandbox pool refill ({config.SANDBOX_POOL_MIN_SIZE}-{config.SANDBOX_POOL_MAX_SIZE} sandboxes)")
+    while True:
+        try:
+            await refill()
+        except Exception as e:
+            logger.error(f"Error refilling the sandbox pool: {e}")
+        try:
+            await asyncio.wait_for(_refill_requested.wait(), timeout=REFILL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _refill_requested.clear()
+
+
+async def get_pool_stats() -> Dict[str, Any]:
+    """Ready sandboxes, target size and counters of the pool for the current image."""
+    image = Configuration.SANDBOX_IMAGE_NAME
+    stats: Dict[str, Any] = {"enabled": config.SANDBOX_POOL_ENABLED, "image": image}
+    if not config.SANDBOX_POOL_ENABLED:
+        return stats
+    redis_client = await redis.get_client()
+    stats["ready"] = await redis_client.zcard(_pool_key(image))
+    stats["target_size"] = await get_target_size(image)
+    stats.update({name: float(value) for name, value in (await redis_client.hgetall(STATS_KEY)).items()})
+    return stats
@@ -1,13 +1,39 @@
 
-from typing import Optional
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
 
 from agentpress.thread_manager import ThreadManager
 from agentpress.tool import Tool
+from daytona_api_client.models.workspace_state import WorkspaceState
 from daytona_sdk import Sandbox
 from sandbox.sandbox import get_or_start_sandbox
 from utils.logger import logger
 from utils.files_utils import clean_path
 
+# Sandbox handles per project, kept warm for the next runs of the project on this
+# worker (see services/run_affinity.py). Shorter than Daytona's default 15 minute
+# auto-stop interval; a cached sandbox that was stopped or deleted anyway is
+# looked up and started again.
+PROJECT_SANDBOX_CACHE_TTL = 300
+# The state of a cached sandbox is checked on reuse, at most this often (seconds),
+# so the tools of one run share a check
+PROJECT_SANDBOX_CHECK_INTERVAL = 10
+
+# project_id -> (cached at, state checked at, sandbox id, sandbox password, sandbox)
+_project_sandboxes: Dict[str, Tuple[float, float, str, Optional[str], Sandbox]] = {}
+_project_locks: Dict[str, asyncio.Lock] = {}
+
+
+async def _is_started(sandbox: Sandbox) -> bool:
+    try:
+        info = await asyncio.to_thread(sandbox.info)
+    except Exception as e:
+        logger.debug(f"Failed to check state of cached sandbox {sandbox.id}: {str(e)}")
+        return False
+    return info.state == WorkspaceState.STARTED
+
+
 class SandboxToolsBase(Tool):
     """Base class for all sandbox tools that provides project-based sandbox access."""
     
@@ -26,45 +52,55 @@ class SandboxToolsBase(Tool):
     async def _ensure_sandbox(self) -> Sandbox:
         """Ensure we have a valid sandbox instance, retrieving it from the project if needed."""
         if self._sandbox is None:
+            lock = _project_locks.setdefault(self.project_id, asyncio.Lock())
             try:
-                # Get database client
-                client = await self.thread_manager.db.client
-                
-                # Get project data
-                project = await client.table('projects').select('*').eq('project_id', self.project_id).execute()
-                if not project.data or len(project.data) == 0:
-                    raise ValueError(f"Project {self.project_id} not found")
-                
-                project_data = project.data[0]
-                sandbox_info = project_data.get('sandbox', {})
-                
-                if not sandbox_info.get('id'):
-                    raise ValueError(f"No sandbox found for project {self.project_id}")
-                
-                # Store sandbox info
-                self._sandbox_id = sandbox_info['id']
-                self._sandbox_pass = sandbox_info.get('pass')
-                
-                # Get or start the sandbox
-                self._sandbox = await get_or_start_sandbox(self._sandbox_id)
-                
-                # # Log URLs if not already printed
-                # if not SandboxToolsBase._urls_printed:
-                #     vnc_link = self._sandbox.get_preview_link(6080)
-                #     website_link = self._sandbox.get_preview_link(8080)
+                # The tools of a run, and consecutive runs of the project on this
+                # worker, share one lookup of the project's sandbox
+                async with lock:
+                    cached = _project_sandboxes.pop(self.project_id, None)
+                    now = time.monotonic()
+                    if cached and now - cached[0] < PROJECT_SANDBOX_CACHE_TTL:
+                        cached_at, checked_at, sandbox_id, sandbox_pass, sandbox = cached
+                        recently_checked = now - checked_at < PROJECT_SANDBOX_CHECK_INTERVAL
+                        if recently_checked or await _is_started(sandbox):
+                            _project_sandboxes[self.project_id] = (cached_at, checked_at if recently_checked else now, sandbox_id, sandbox_pass, sandbox)
+                            self._sandbox_id, self._sandbox_pass, self._sandbox = sandbox_id, sandbox_pass, sandbox
+                            return self._sandbox
+                        logger.info(f"Cached sandbox {sandbox_id} of project {self.project_id} is not running, starting it again")
+
+                    # Get database client
+                    client = await self.thread_manager.db.client
+                    
+                    # Get project data
+                    project = await client.table('projects').select('*').eq('project_id', self.project_id).execute()
+                    if not project.data or len(project.data) == 0:
+                        raise ValueError(f"Project {self.project_id} not found")
+                    
+                    project_data = project.data[0]
+                    sandbox_info = project_data.get('sandbox', {})
+                    
+                    if not sandbox_info.get('id'):
+                        raise ValueError(f"No sandbox found for project {self.project_id}")
                     
-                #     vnc_url = vnc_link.url if hasattr(vnc_link, 'url') else str(vnc_link)
-                #     website_url = website_link.url if hasattr(website_link, 'url') else str(website_link)
+                    # Store sandbox info
+                    self._sandbox_id = sandbox_info['id']
+                    self._sandbox_pass = sandbox_info.get('pass')
                     
-                #     print("\033[95m***")
-                #     print(f"VNC URL: {vnc_url}")
-                #     print(f"Website URL: {website_url}")
-                #     print("***\033[0m")
-                #     SandboxToolsBase._urls_printed = True
+                    # Get or start the sandbox
+                    self._sandbox = await get_or_start_sandbox(self._sandbox_id)
+                    now = time.monotonic()
+                    for project_id, (cached_at, *_) in list(_project_sandboxes.items()):
+                        if now - cached_at >= PROJECT_SANDBOX_CACHE_TTL:
+                            del _project_sandboxes[project_id]
+                    _project_sandboxes[self.project_id] = (now, now, self._sandbox_id, self._sandbox_pass, self._sandbox)
                 
             except Exception as e:
                 logger.error(f"Error retrieving sandbox for project {self.project_id}: {str(e)}", exc_info=True)
                 raise e
+            finally:
+                # Drop the lock once no lookup holds it, a waiter it misses at worst repeats one lookup
+                if not lock.locked() and _project_locks.get(self.project_id) is lock:
+                    del _project_locks[self.project_id]
         
         return self._sandbox
 
@@ -199,6 +199,21 @@ async def calculate_monthly_usage(client, user_id: str) -> float:
     
     return total_seconds / 60  # Convert to minutes
 
+def get_subscription_tier_name(subscription: Optional[Dict]) -> str:
+    """Get the tier name of a subscription, 'free' if there is none or its price is unknown."""
+    if not subscription:
+        return 'free'
+    
+    price_id = None
+    if subscription.get('items') and subscription['items'].get('data') and len(subscription['items']['data']) > 0:
+        price_id = subscription['items']['data'][0]['price']['id']
+    else:
+        price_id = subscription.get('price_id', config.STRIPE_FREE_TIER_ID)
+    
+    # Get tier info for this price_id
+    tier_info = SUBSCRIPTION_TIERS.get(price_id)
+    return tier_info['name'] if tier_info else 'free'
+
 async def get_allowed_models_for_user(client, user_id: str):
     """
     Get the list of models allowed for a user based on their subscription tier.
@@ -208,19 +223,7 @@ async def get_allowed_models_for_user(client, user_id: str):
     """
 
     subscription = await get_user_subscription(user_id)
-    tier_name = 'free'
-    
-    if subscription:
-        price_id = None
-        if subscription.get('items') and subscription['items'].get('data') and len(subscription['items']['data']) > 0:
-            price_id = subscription['items']['data'][0]['price']['id']
-        else:
-            price_id = subscription.get('price_id', config.STRIPE_FREE_TIER_ID)
-        
-        # Get tier info for this price_id
-        tier_info = SUBSCRIPTION_TIERS.get(price_id)
-        if tier_info:
-            tier_name = tier_info['name']
+    tier_name = get_subscription_tier_name(subscription)
     
     # Return allowed models for this tier
     return MODEL_ACCESS_TIERS.get(tier_name, MODEL_ACCESS_TIERS['free'])  # Default to free tier if unknown
@@ -0,0 +1,41 @@
+"""
+Shared outbound HTTP client.
+
+A single keep-alive httpx.AsyncClient per process, so tools calling external
+APIs (RapidAPI data providers, Firecrawl, ...) reuse TCP/TLS connections
+instead of opening a new client per request. Callers pass their own timeouts
+per request when they need something other than the default.
+"""
+
+import asyncio
+from typing import Optional
+
+import httpx
+
+DEFAULT_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get the shared HTTP client, creating it if necessary."""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    # Connections belong to the event loop that opened them
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            timeout=DEFAULT_TIMEOUT,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+        _client_loop = loop
+    return _client
+
+
+async def close():
+    """Close the shared HTTP client."""
+    global _client, _client_loop
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+    _client_loop = None
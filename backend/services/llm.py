@@ -6,6 +6,8 @@ This module provides a unified interface for making API calls to different LLM p
 - Streaming responses
 - Tool calls and function calling
 - Retry logic with exponential backoff
+- Failover across equivalent provider deployments (see services/llm_router.py)
+- Admission control per provider and account (see services/llm_rate_limiter.py)
 - Model-specific configurations
 - Comprehensive error handling and logging
 """
@@ -13,11 +15,14 @@ This module provides a unified interface for making API calls to different LLM p
 from typing import Union, Dict, Any, Optional, AsyncGenerator, List
 import os
 import json
+import time
 import asyncio
 from openai import OpenAIError
 import litellm
 from utils.logger import logger
 from utils.config import config
+from services.llm_router import llm_router, is_failover_error
+from services import llm_rate_limiter
 
 # litellm.set_verbose=True
 litellm.modify_params=True
@@ -236,6 +241,13 @@ def prepare_params(
 
     return params
 
+def estimate_prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Rough prompt token estimate (4 characters per token) for admission control."""
+    try:
+        return len(json.dumps(messages, default=str)) // 4
+    except (TypeError, ValueError):
+        return 0
+
 async def make_llm_api_call(
     messages: List[Dict[str, Any]],
     model_name: str,
@@ -250,7 +262,10 @@ async def make_llm_api_call(
     top_p: Optional[float] = None,
     model_id: Optional[str] = None,
     enable_thinking: Optional[bool] = False,
-    reasoning_effort: Optional[str] = 'low'
+    reasoning_effort: Optional[str] = 'low',
+    account_id: Optional[str] = None,
+    account_tier: Optional[str] = None,
+    prompt_tokens: Optional[int] = None
 ) -> Union[Dict[str, Any], AsyncGenerator]:
     """
     Make an API call to a language model using LiteLLM.
@@ -270,6 +285,9 @@ async def make_llm_api_call(
         model_id: Optional ARN for Bedrock inference profiles
         enable_thinking: Whether to enable thinking
         reasoning_effort: Level of reasoning effort
+        account_id: Account the call is made for, charged to its tier's rate limits
+        account_tier: Subscription tier name of the account
+        prompt_tokens: Prompt token count if already known, estimated otherwise
 
     Returns:
         Union[Dict[str, Any], AsyncGenerator]: API response or stream
@@ -280,43 +298,108 @@ async def make_llm_api_call(
     """
     # debug <timestamp>.json messages
     logger.info(f"Making LLM API call to model: {model_name} (Thinking: {enable_thinking}, Effort: {reasoning_effort})")
-    logger.info(f"📡 API Call: Using model {model_name}")
-    params = prepare_params(
-        messages=messages,
-        model_name=model_name,
-        temperature=temperature,
-        max_tokens=max_tokens,
-        response_format=response_format,
-        tools=tools,
-        tool_choice=tool_choice,
-        api_key=api_key,
-        api_base=api_base,
-        stream=stream,
-        top_p=top_p,
-        model_id=model_id,
-        enable_thinking=enable_thinking,
-        reasoning_effort=reasoning_effort
-    )
+    # Explicit credentials or a Bedrock inference profile pin the call to the given model
+    if api_key or api_base or model_id:
+        deployments = [model_name]
+    else:
+        deployments = llm_router.order_deployments(model_name, stream=stream)
+    max_attempts = max(MAX_RETRIES, len(deployments))
+
+    if prompt_tokens is None:
+        prompt_tokens = estimate_prompt_tokens(messages)
+    account_charged = False
+
+    async def admit_completion(deployment: str):
+        nonlocal account_charged
+        # Charge the estimated prompt tokens before the call; the account is
+        # charged once, failover and hedged attempts only charge their provider
+        charge_account = not account_charged
+        account_charged = True
+        await llm_rate_limiter.acquire(
+            deployment,
+            prompt_tokens=prompt_tokens,
+            account_id=account_id if charge_account else None,
+            account_tier=account_tier
+        )
+
+    async def start_completion(deployment: str):
+        logger.info(f"📡 API Call: Using model {deployment}")
+        params = prepare_params(
+            messages=messages,
+            model_name=deployment,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            response_format=response_format,
+            tools=tools,
+            tool_choice=tool_choice,
+            api_key=api_key,
+            api_base=api_base,
+            stream=stream,
+            top_p=top_p,
+            model_id=model_id,
+            enable_thinking=enable_thinking,
+            reasoning_effort=reasoning_effort
+        )
+        # logger.debug(f"API request parameters: {json.dumps(params, indent=2)}")
+        return await litellm.acompletion(**params)
+
     last_error = None
-    for attempt in range(MAX_RETRIES):
+    # Only failover errors move the call to the next deployment, other errors retry the same one
+    deployment_index = 0
+    for attempt in range(max_attempts):
+        deployment = deployments[deployment_index % len(deployments)]
         try:
-            logger.debug(f"Attempt {attempt + 1}/{MAX_RETRIES}")
-            # logger.debug(f"API request parameters: {json.dumps(params, indent=2)}")
-
-            response = await litellm.acompletion(**params)
-            logger.debug(f"Successfully received API response from {model_name}")
+            logger.debug(f"Attempt {attempt + 1}/{max_attempts}")
+
+            if stream:
+                # Streams are returned once their first chunk arrives; the first
+                # attempt may be hedged with an alternate deployment
+                hedge_deployment = llm_router.get_hedge_deployment(deployments, deployment) if attempt == 0 else None
+                response = await llm_router.open_stream(
+                    deployment,
+                    start_completion,
+                    hedge_deployment=hedge_deployment,
+                    admit=admit_completion
+                )
+                logger.debug(f"Successfully started API stream for {model_name}")
+                return response
+
+            # Waiting for admission is not part of the deployment's latency
+            await admit_completion(deployment)
+            llm_router.record_start(deployment)
+            start = time.monotonic()
+            try:
+                response = await start_completion(deployment)
+            except asyncio.CancelledError:
+                llm_router.record_abort(deployment)
+                raise
+            except Exception as e:
+                if is_failover_error(e):
+                    llm_router.record_failure(deployment, e)
+                else:
+                    llm_router.record_abort(deployment)
+                raise
+            logger.debug(f"Successfully received API response from {deployment}")
             logger.debug(f"Response: {response}")
+            llm_router.record_success(deployment, latency=time.monotonic() - start)
             return response
 
         except (litellm.exceptions.RateLimitError, OpenAIError, json.JSONDecodeError) as e:
             last_error = e
-            await handle_error(e, attempt, MAX_RETRIES)
+            # Outcomes are already recorded in the router
+            if is_failover_error(e):
+                if len(deployments) > 1:
+                    # Another deployment can serve the call right away
+                    logger.warning(f"Error from {deployment} on attempt {attempt + 1}/{max_attempts}, failing over: {str(e)}")
+                    deployment_index += 1
+                    continue
+            await handle_error(e, attempt, max_attempts)
 
         except Exception as e:
             logger.error(f"Unexpected error during API call: {str(e)}", exc_info=True)
             raise LLMError(f"API call failed: {str(e)}")
 
-    error_msg = f"Failed to make API call after {MAX_RETRIES} attempts"
+    error_msg = f"Failed to make API call after {max_attempts} attempts"
     if last_error:
         error_msg += f". Last error: {str(last_error)}"
     logger.error(error_msg, exc_info=True)
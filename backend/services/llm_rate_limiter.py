@@ -0,0 +1,168 @@
+"""
+Distributed admission control for LLM calls.
+
+Token buckets in Redis limit requests per minute and prompt tokens per minute,
+shared by every API and worker process:
+- Per provider (anthropic, openai, openrouter, bedrock, ...), see LLM_PROVIDER_RATE_LIMITS
+- Per account, sized by subscription tier, see LLM_ACCOUNT_TIER_RATE_LIMITS
+
+All buckets of a call are checked and charged atomically by a Lua script. A call
+that does not fit waits for the buckets to refill, up to LLM_RATE_LIMIT_MAX_WAIT
+seconds, after which it is let through rather than failed. If Redis is
+unavailable calls are admitted without limits.
+"""
+
+import asyncio
+import random
+import time
+from typing import List, Optional, Tuple
+
+from services import redis
+from utils.config import config, EnvMode
+from utils.constants import LLM_ACCOUNT_TIER_RATE_LIMITS, LLM_PROVIDER_RATE_LIMITS
+from utils.logger import logger
+
+# Buckets are sized for one minute of traffic
+BUCKET_WINDOW_SECONDS = 60
+# Bounds of a single wait between admission attempts
+MIN_POLL_SECONDS = 0.05
+MAX_POLL_SECONDS = 2.0
+
+# Checks every bucket and charges them all, or none. Returns the seconds to wait
+# (as a string, Lua numbers are truncated to integers) or "0" when admitted.
+# KEYS: bucket keys. ARGV: now, then capacity, refill rate per second and cost per bucket.
+TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local levels = {}
+local wait = 0
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[i * 3 - 1])
+    local rate = tonumber(ARGV[i * 3])
+    local cost = tonumber(ARGV[i * 3 + 1])
+    local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    levels[i] = tokens
+    -- A call costing more than the bucket holds is admitted once the bucket is full
+    local needed = math.min(cost, capacity)
+    if tokens < needed then
+        wait = math.max(wait, (needed - tokens) / rate)
+    end
+end
+if wait > 0 then
+    return tostring(wait)
+end
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[i * 3 - 1])
+    local rate = tonumber(ARGV[i * 3])
+    local cost = tonumber(ARGV[i * 3 + 1])
+    redis.call('HSET', KEYS[i], 'tokens', levels[i] - cost, 'ts', now)
+    redis.call('EXPIRE', KEYS[i], math.ceil(capacity / rate) + 60)
+end
+return "0"
+"""
+
+# Stats of this process, for monitoring the cost of queueing
+admission_stats = {"admitted": 0, "queued": 0, "timed_out": 0, "errors": 0, "wait_seconds": 0.0}
+
+_script = None
+
+
+def get_provider(model_name: str) -> str:
+    """Provider key of a model name, e.g. "anthropic" for "anthropic/claude-3-7-sonnet-latest"."""
+    return model_name.split("/", 1)[0] if "/" in model_name else "openai"
+
+
+def _get_buckets(provider: str, account_id: Optional[str], account_tier: Optional[str], prompt_tokens: int) -> List[Tuple[str, float, float, float]]:
+    """(key, capacity, refill rate per second, cost) of every bucket a call is charged to."""
+    buckets = []
+    limits = [(f"llm_rate:provider:{provider}", LLM_PROVIDER_RATE_LIMITS.get(provider))]
+    if account_id and config.ENV_MODE != EnvMode.LOCAL:
+        tier_limits = LLM_ACCOUNT_TIER_RATE_LIMITS.get(account_tier or 'free', LLM_ACCOUNT_TIER_RATE_LIMITS['free'])
+        limits.append((f"llm_rate:account:{account_id}", tier_limits))
+
+    for key_prefix, bucket_limits in limits:
+        if not bucket_limits:
+            continue
+        if bucket_limits.get('rpm'):
+            rpm = bucket_limits['rpm']
+            buckets.append((f"{key_prefix}:rpm", rpm, rpm / BUCKET_WINDOW_SECONDS, 1))
+        if bucket_limits.get('tpm') and prompt_tokens:
+            tpm = bucket_limits['tpm']
+            buckets.append((f"{key_prefix}:tpm", tpm, tpm / BUCKET_WINDOW_SECONDS, prompt_tokens))
+    return buckets
+
+
+async def _get_script():
+    global _script
+    if _script is None:
+        redis_client = await redis.get_client()
+        _script = redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+    return _script
+
+
+async def acquire(
+    model_name: str,
+    prompt_tokens: int = 0,
+    account_id: Optional[str] = None,
+    account_tier: Optional[str] = None,
+    max_wait: Optional[float] = None
+) -> float:
+    """Wait until a call fits the provider and account buckets, then charge it.
+
+    Args:
+        model_name: Model (deployment) the call goes to
+        prompt_tokens: Estimated prompt tokens charged to the tokens/min buckets
+        account_id: Account making the call, None for system calls
+        account_tier: Subscription tier name of the account
+        max_wait: Seconds to wait at most, defaults to LLM_RATE_LIMIT_MAX_WAIT
+
+    Returns:
+        float: Seconds spent waiting for admission
+    """
+    if not config.LLM_RATE_LIMIT_ENABLED:
+        return 0.0
+
+    provider = get_provider(model_name)
+    buckets = _get_buckets(provider, account_id, account_tier, prompt_tokens)
+    if not buckets:
+        return 0.0
+
+    max_wait = config.LLM_RATE_LIMIT_MAX_WAIT if max_wait is None else max_wait
+    keys = [bucket[0] for bucket in buckets]
+    start = time.monotonic()
+    queued = False
+    while True:
+        try:
+            script = await _get_script()
+            args = [time.time()]
+            for _, capacity, rate, cost in buckets:
+                args += [capacity, rate, cost]
+            wait = float(await script(keys=keys, args=args))
+        except Exception as e:
+            admission_stats["errors"] += 1
+            logger.warning(f"LLM admission check failed, admitting call to {provider}: {e}")
+            return time.monotonic() - start
+
+        waited = time.monotonic() - start
+        if wait <= 0:
+            admission_stats["admitted"] += 1
+            admission_stats["wait_seconds"] += waited
+            if queued:
+                logger.info(f"LLM call to {provider} admitted after {waited:.2f}s (account {account_id})")
+            return waited
+
+        if waited + wait > max_wait:
+            admission_stats["timed_out"] += 1
+            admission_stats["wait_seconds"] += waited
+            logger.warning(f"LLM call to {provider} not admitted within {max_wait}s (account {account_id}), proceeding")
+            return waited
+
+        if not queued:
+            queued = True
+            admission_stats["queued"] += 1
+            logger.info(f"LLM call to {provider} queued for {wait:.2f}s by rate limits (account {account_id})")
+        # Jitter spreads out waiters so they do not retry in lockstep
+        await asyncio.sleep(min(MAX_POLL_SECONDS, max(MIN_POLL_SECONDS, wait)) * (1 + random.random() / 4))
+
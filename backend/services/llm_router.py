@@ -0,0 +1,489 @@
+"""
+Routing of LLM calls across equivalent provider deployments.
+
+A logical model (e.g. "anthropic/claude-3-7-sonnet-latest") can be served by
+several deployments (Anthropic direct, Bedrock, OpenRouter), see
+MODEL_DEPLOYMENTS. The router keeps rolling latency, time-to-first-token and
+error statistics per deployment and orders the deployments of a call by health:
+- Deployments with an open circuit breaker go last
+- Otherwise the lowest error-weighted p95 latency (TTFT for streams) goes first,
+  with the configured preference order breaking ties; deployments without enough
+  samples rank with the preferred deployment, so traffic stays on it until an
+  alternate is measurably faster
+
+A circuit opens after consecutive failures (or a rate limit), stays open for a
+cooldown, then lets a single probe request through before closing again.
+Statistics are kept per process and published to Redis for monitoring.
+
+Streams are opened by waiting for their first chunk. With hedging enabled, if
+the first chunk takes longer than a percentile of the deployment's historical
+TTFT, a second request goes to an alternate deployment; the first stream to
+produce a chunk is used and the other request is cancelled.
+"""
+
+import asyncio
+import json
+import os
+import socket
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import litellm
+
+from services import redis
+from utils.config import config
+from utils.constants import MODEL_DEPLOYMENTS
+from utils.logger import logger
+
+# Rolling window of samples kept per deployment
+STATS_WINDOW = 100
+# Samples needed before latency is used for ordering
+MIN_SAMPLES = 5
+# Latency differences below this are treated as ties (ms)
+LATENCY_BUCKET_MS = 250
+# Weight of the error rate in the deployment score
+ERROR_RATE_PENALTY = 10
+
+# Circuit breaker
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_OPEN_SECONDS = 30
+CIRCUIT_MAX_OPEN_SECONDS = 300
+
+# Errors that indicate an unhealthy deployment rather than a bad request
+FAILOVER_STATUS_CODES = {408, 429, 500, 502, 503, 504, 529}
+FAILOVER_EXCEPTIONS = (
+    litellm.exceptions.RateLimitError,
+    litellm.exceptions.InternalServerError,
+    litellm.exceptions.ServiceUnavailableError,
+    litellm.exceptions.APIConnectionError,
+    litellm.exceptions.Timeout,
+)
+
+# Marks a stream that ended before producing any chunk
+_NO_CHUNK = object()
+
+# Monitoring snapshot
+STATS_REDIS_KEY = "llm_router_stats"
+STATS_PUBLISH_INTERVAL = 30
+STATS_REDIS_TTL = 3600
+
+# Credentials a provider prefix needs before the router sends traffic to it
+PROVIDER_CREDENTIALS = {
+    "anthropic": ("ANTHROPIC_API_KEY",),
+    "openai": ("OPENAI_API_KEY",),
+    "openrouter": ("OPENROUTER_API_KEY",),
+    "bedrock": ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"),
+}
+
+
+def _percentile(values: List[float], percentile: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percentile))]
+
+
+def is_failover_error(error: Exception) -> bool:
+    """Whether an error should move the call to another deployment."""
+    if isinstance(error, FAILOVER_EXCEPTIONS):
+        return True
+    return getattr(error, 'status_code', None) in FAILOVER_STATUS_CODES
+
+
+async def _close_stream(response: Any):
+    """Best-effort close of an abandoned stream."""
+    close = getattr(response, 'aclose', None) or getattr(getattr(response, 'completion_stream', None), 'aclose', None)
+    if close:
+        try:
+            await close()
+        except Exception as e:
+            logger.debug(f"Error closing abandoned LLM stream: {e}")
+
+
+async def _cancel_stream_task(task: asyncio.Task):
+    """Cancel a _start_stream task, closing its stream if it already started."""
+    task.cancel()
+    try:
+        started = await task
+    except BaseException:
+        return
+    await _close_stream(started.response)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        value = headers.get('retry-after')
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class _StartedStream:
+    """A stream whose first chunk has arrived."""
+    deployment: str
+    response: Any
+    iterator: AsyncIterator
+    first_chunk: Any
+
+
+class DeploymentStats:
+    """Rolling health statistics and circuit breaker of one deployment."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: deque = deque(maxlen=STATS_WINDOW)
+        self.ttfts: deque = deque(maxlen=STATS_WINDOW)
+        self.outcomes: deque = deque(maxlen=STATS_WINDOW)
+        self.requests = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.consecutive_failures = 0
+        self.circuit_state = "closed"
+        self.open_until = 0.0
+        self.open_count = 0
+        self.probe_in_flight = False
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+    def is_available(self, now: Optional[float] = None) -> bool:
+        """Whether the circuit lets a request through (a single probe when half-open)."""
+        now = now or time.monotonic()
+        if self.circuit_state == "open" and now >= self.open_until:
+            self.circuit_state = "half_open"
+            self.probe_in_flight = False
+            logger.info(f"LLM deployment {self.name} circuit half-open, probing")
+        if self.circuit_state == "half_open":
+            return not self.probe_in_flight
+        return self.circuit_state == "closed"
+
+    def score(self, stream: bool) -> Optional[float]:
+        """Error-weighted p95 latency in ms, None until enough samples are collected."""
+        samples = self.ttfts if stream and self.ttfts else self.latencies
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return _percentile(list(samples), 0.95) * 1000 * (1 + ERROR_RATE_PENALTY * self.error_rate)
+
+    def record_start(self):
+        self.requests += 1
+        if self.circuit_state == "half_open":
+            self.probe_in_flight = True
+
+    def record_abort(self):
+        """End a request that says nothing about the deployment's health (cancelled,
+        or rejected as a bad request), freeing the half-open probe slot."""
+        self.probe_in_flight = False
+
+    def record_success(self, latency: Optional[float] = None, ttft: Optional[float] = None):
+        if latency is not None:
+            self.latencies.append(latency)
+        if ttft is not None:
+            self.ttfts.append(ttft)
+        self.outcomes.append(1)
+        self.consecutive_failures = 0
+        if self.circuit_state != "closed":
+            logger.info(f"LLM deployment {self.name} circuit closed")
+        self.circuit_state = "closed"
+        self.open_count = 0
+        self.probe_in_flight = False
+
+    def record_failure(self, error: Exception):
+        self.outcomes.append(0)
+        self.failures += 1
+        self.consecutive_failures += 1
+        rate_limited = isinstance(error, litellm.exceptions.RateLimitError) or getattr(error, 'status_code', None) == 429
+        if rate_limited:
+            self.rate_limited += 1
+
+        if rate_limited or self.circuit_state == "half_open" or self.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD:
+            # Back off exponentially on repeated openings, honouring Retry-After
+            self.open_count += 1
+            open_seconds = min(CIRCUIT_MAX_OPEN_SECONDS, CIRCUIT_OPEN_SECONDS * 2 ** (self.open_count - 1))
+            retry_after = _retry_after(error)
+            if retry_after is not None:
+                open_seconds = min(CIRCUIT_MAX_OPEN_SECONDS, retry_after)
+            self.circuit_state = "open"
+            self.open_until = time.monotonic() + open_seconds
+            self.probe_in_flight = False
+            logger.warning(f"LLM deployment {self.name} circuit open for {open_seconds:.0f}s after {type(error).__name__}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        def to_ms(value: Optional[float]) -> Optional[int]:
+            return int(value * 1000) if value is not None else None
+
+        latencies, ttfts = list(self.latencies), list(self.ttfts)
+        self.is_available()
+        return {
+            "circuit_state": self.circuit_state,
+            "requests": self.requests,
+            "failures": self.failures,
+            "rate_limited": self.rate_limited,
+            "error_rate": round(self.error_rate, 3),
+            "consecutive_failures": self.consecutive_failures,
+            "latency_p50_ms": to_ms(_percentile(latencies, 0.5)),
+            "latency_p95_ms": to_ms(_percentile(latencies, 0.95)),
+            "ttft_p50_ms": to_ms(_percentile(ttfts, 0.5)),
+            "ttft_p95_ms": to_ms(_percentile(ttfts, 0.95)),
+        }
+
+
+class LLMRouter:
+    """Picks the healthiest deployment for a logical model and tracks call outcomes."""
+
+    def __init__(self):
+        self.stats: Dict[str, DeploymentStats] = {}
+        self.process_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.hedge_stats = {"requests": 0, "hedged": 0, "primary_wins": 0, "hedge_wins": 0, "failed": 0}
+        self._last_publish = 0.0
+
+    def get_stats(self, deployment: str) -> DeploymentStats:
+        if deployment not in self.stats:
+            self.stats[deployment] = DeploymentStats(deployment)
+        return self.stats[deployment]
+
+    def get_deployments(self, model_name: str) -> List[str]:
+        """Deployments of a model whose provider credentials are configured, in preference order."""
+        deployments = [model_name]
+        if not config.LLM_ROUTER_ENABLED:
+            return deployments
+        for deployment in MODEL_DEPLOYMENTS.get(model_name, []):
+            provider = deployment.split("/", 1)[0]
+            credentials = PROVIDER_CREDENTIALS.get(provider)
+            if deployment not in deployments and credentials and all(getattr(config, key, None) for key in credentials):
+                deployments.append(deployment)
+        return deployments
+
+    def order_deployments(self, model_name: str, stream: bool = False) -> List[str]:
+        """Deployments ordered by health; unavailable ones are kept last as a fallback."""
+        deployments = self.get_deployments(model_name)
+        if len(deployments) == 1:
+            return deployments
+
+        now = time.monotonic()
+        available = {deployment: self.get_stats(deployment).is_available(now) for deployment in deployments}
+        buckets = {}
+        for deployment in deployments:
+            score = self.get_stats(deployment).score(stream)
+            buckets[deployment] = int(score // LATENCY_BUCKET_MS) if score is not None else None
+        # Unmeasured deployments are no better than the preferred available one, so
+        # an alternate only goes first once it is measurably faster
+        preferred = next((deployment for deployment in deployments if available[deployment]), None)
+        baseline = buckets.get(preferred) or 0
+
+        def sort_key(item):
+            index, deployment = item
+            if not available[deployment]:
+                return (1, self.get_stats(deployment).open_until, index)
+            bucket = buckets[deployment]
+            return (0, baseline if bucket is None else bucket, index)
+
+        ordered = [deployment for _, deployment in sorted(enumerate(deployments), key=sort_key)]
+        if ordered[0] != model_name:
+            logger.info(f"LLM router selected {ordered[0]} for {model_name}")
+        return ordered
+
+    def record_start(self, deployment: str):
+        self.get_stats(deployment).record_start()
+
+    def record_abort(self, deployment: str):
+        self.get_stats(deployment).record_abort()
+
+    def record_success(self, deployment: str, latency: Optional[float] = None, ttft: Optional[float] = None):
+        self.get_stats(deployment).record_success(latency=latency, ttft=ttft)
+        self._schedule_publish()
+
+    def record_failure(self, deployment: str, error: Exception):
+        self.get_stats(deployment).record_failure(error)
+        self._schedule_publish()
+
+    def get_hedge_deployment(self, deployments: List[str], deployment: str) -> Optional[str]:
+        """Alternate deployment for hedging a stream, None if hedging does not apply."""
+        if not config.LLM_HEDGING_ENABLED:
+            return None
+        for candidate in deployments:
+            if candidate != deployment and self.get_stats(candidate).is_available():
+                return candidate
+        return None
+
+    def get_hedge_delay(self, deployment: str) -> float:
+        """Seconds to wait for a first chunk before hedging, from the deployment's TTFT percentile."""
+        ttfts = list(self.get_stats(deployment).ttfts)
+        if len(ttfts) < MIN_SAMPLES:
+            delay_ms = config.LLM_HEDGE_DEFAULT_DELAY_MS
+        else:
+            delay_ms = _percentile(ttfts, config.LLM_HEDGE_TTFT_PERCENTILE / 100) * 1000
+        return max(delay_ms, config.LLM_HEDGE_MIN_DELAY_MS) / 1000
+
+    async def open_stream(
+        self,
+        deployment: str,
+        call: Callable[[str], Awaitable[Any]],
+        hedge_deployment: Optional[str] = None,
+        admit: Optional[Callable[[str], Awaitable[Any]]] = None
+    ) -> AsyncGenerator:
+        """Start a stream and wait for its first chunk, optionally hedged.
+
+        Args:
+            deployment: Deployment to call first
+            call: Coroutine function starting the streaming completion for a deployment
+            hedge_deployment: Alternate deployment to race when the first chunk is late
+            admit: Coroutine function waiting for admission to a deployment (rate
+                limits); time spent in it is not counted as the deployment's TTFT
+                and does not start the hedge timer
+
+        Returns:
+            AsyncGenerator: The winning stream, starting with its first chunk
+        """
+        if admit:
+            await admit(deployment)
+        if not hedge_deployment:
+            return self._relay(await self._start_stream(deployment, call))
+
+        self.hedge_stats["requests"] += 1
+        primary = asyncio.create_task(self._start_stream(deployment, call))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.get_hedge_delay(deployment))
+        except asyncio.CancelledError:
+            # The caller was cancelled, don't leave the request running
+            await _cancel_stream_task(primary)
+            raise
+        if done:
+            return self._relay(primary.result())
+
+        self.hedge_stats["hedged"] += 1
+        logger.info(f"No first chunk from {deployment} yet, hedging with {hedge_deployment}")
+        hedge = asyncio.create_task(self._start_stream(hedge_deployment, call, admit))
+        pending = {primary, hedge}
+        winner = None
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        continue
+                    if winner is None:
+                        winner = task
+                    else:
+                        # Both produced a first chunk at once, drop the second
+                        await _close_stream(task.result().response)
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if winner is None:
+            self.hedge_stats["failed"] += 1
+            raise primary.exception()
+
+        self.hedge_stats["primary_wins" if winner is primary else "hedge_wins"] += 1
+        logger.info(f"Hedged stream won by {winner.result().deployment}")
+        return self._relay(winner.result())
+
+    async def _start_stream(
+        self,
+        deployment: str,
+        call: Callable[[str], Awaitable[Any]],
+        admit: Optional[Callable[[str], Awaitable[Any]]] = None
+    ) -> "_StartedStream":
+        if admit:
+            await admit(deployment)
+        self.record_start(deployment)
+        start = time.monotonic()
+        response = None
+        try:
+            response = await call(deployment)
+            iterator = response.__aiter__()
+            try:
+                first_chunk = await iterator.__anext__()
+            except StopAsyncIteration:
+                first_chunk = _NO_CHUNK
+        except asyncio.CancelledError:
+            self.record_abort(deployment)
+            await _close_stream(response)
+            raise
+        except Exception as e:
+            if is_failover_error(e):
+                self.record_failure(deployment, e)
+            else:
+                self.record_abort(deployment)
+            raise
+        self.record_success(deployment, ttft=time.monotonic() - start)
+        return _StartedStream(deployment, response, iterator, first_chunk)
+
+    async def _relay(self, started: "_StartedStream") -> AsyncGenerator:
+        """Yield a started stream's chunks, recording mid-stream failures."""
+        if started.first_chunk is _NO_CHUNK:
+            return
+        try:
+            yield started.first_chunk
+            while True:
+                try:
+                    chunk = await started.iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+                yield chunk
+        except (GeneratorExit, asyncio.CancelledError):
+            # The consumer stopped (e.g. the run was cancelled), release the provider connection
+            await _close_stream(started.response)
+            raise
+        except Exception as e:
+            if is_failover_error(e):
+                self.record_failure(started.deployment, e)
+            raise
+
+    def get_hedge_stats(self) -> Dict[str, Any]:
+        """Hedged stream counters; hedge_rate is the share of eligible streams that fired a second request."""
+        stats = dict(self.hedge_stats)
+        stats["hedge_rate"] = round(stats["hedged"] / stats["requests"], 3) if stats["requests"] else 0.0
+        return stats
+
+    def get_router_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Health statistics and circuit breaker state per deployment."""
+        return {name: stats.snapshot() for name, stats in self.stats.items()}
+
+    def _schedule_publish(self):
+        now = time.monotonic()
+        if now - self._last_publish < STATS_PUBLISH_INTERVAL:
+            return
+        self._last_publish = now
+        try:
+            asyncio.get_running_loop().create_task(self.publish_stats())
+        except RuntimeError:
+            pass
+
+    async def publish_stats(self):
+        """Publish this process's statistics to Redis, one hash field per process."""
+        try:
+            redis_client = await redis.get_client()
+            snapshot = {
+                "updated_at": time.time(),
+                "deployments": self.get_router_stats(),
+                "hedging": self.get_hedge_stats()
+            }
+            await redis_client.hset(STATS_REDIS_KEY, self.process_id, json.dumps(snapshot))
+            await redis_client.expire(STATS_REDIS_KEY, STATS_REDIS_TTL)
+        except Exception as e:
+            logger.debug(f"Failed to publish LLM router stats: {e}")
+
+
+async def get_published_router_stats(max_age: int = STATS_REDIS_TTL) -> Dict[str, Any]:
+    """Router statistics published by all processes within max_age seconds."""
+    redis_client = await redis.get_client()
+    published = await redis_client.hgetall(STATS_REDIS_KEY)
+    now = time.time()
+    result = {}
+    for process_id, value in published.items():
+        snapshot = json.loads(value)
+        if now - snapshot.get("updated_at", 0) <= max_age:
+            result[process_id] = snapshot
+    return result
+
+
+llm_router = LLMRouter()
@@ -0,0 +1,178 @@
+"""
+Project affinity routing of agent runs to worker queues.
+
+With AGENT_RUN_AFFINITY_SHARDS > 0, runs are sent to one of N shard queues
+(agent_runs_shard_{n}) chosen by consistent hashing of the project_id, so
+consecutive runs of a project reach the same workers and find the project's
+sandbox handle and compiled prompts already warm in their process caches.
+Workers pick shards with dramatiq's --queues option, e.g.
+
+    python -m dramatiq --queues default agent_runs_shard_0 run_agent_background
+
+Runs fall back to the default queue, which every worker consumes, when the
+project's shard has no live worker or already has AGENT_RUN_AFFINITY_MAX_LOAD
+runs in flight.
+
+Redis layout:
+- run_affinity:shards: hash of shard queue -> last heartbeat of its workers
+- run_affinity:load: hash of shard queue -> runs routed and not finished
+- run_affinity:runs: hash of agent_run_id -> shard queue
+"""
+
+import asyncio
+import bisect
+import hashlib
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from services import redis
+from utils.config import config
+from utils.logger import logger
+
+SHARD_QUEUE_PREFIX = "agent_runs_shard_"
+# Points per shard on the hash ring, for an even spread of projects
+RING_POINTS_PER_SHARD = 64
+
+SHARDS_KEY = "run_affinity:shards"
+LOAD_KEY = "run_affinity:load"
+RUNS_KEY = "run_affinity:runs"
+HEARTBEAT_INTERVAL = 10
+# A shard whose workers have not reported for this long is considered down
+HEARTBEAT_TIMEOUT = 30
+
+# KEYS: load, runs. ARGV: agent_run_id
+RELEASE_SCRIPT = """
+local shard = redis.call('HGET', KEYS[2], ARGV[1])
+if not shard then
+    return false
+end
+redis.call('HDEL', KEYS[2], ARGV[1])
+if redis.call('HINCRBY', KEYS[1], shard, -1) <= 0 then
+    redis.call('HDEL', KEYS[1], shard)
+end
+return shard
+"""
+
+# Stats of this process
+affinity_stats = {"routed": 0, "fallback_down": 0, "fallback_load": 0, "errors": 0}
+
+_ring: List[tuple] = []
+_ring_shards = 0
+_release_script = None
+
+
+def get_shard_queues() -> List[str]:
+    """Names of the shard queues, empty when affinity routing is disabled."""
+    return [f"{SHARD_QUEUE_PREFIX}{n}" for n in range(config.AGENT_RUN_AFFINITY_SHARDS)]
+
+
+def get_worker_shards(queues: Optional[Iterable[str]]) -> List[str]:
+    """Shard queues among the queues a worker consumes."""
+    return [queue for queue in (queues or []) if queue.startswith(SHARD_QUEUE_PREFIX)]
+
+
+def _hash(value: str) -> int:
+    return int(hashlib.md5(value.encode()).hexdigest()[:16], 16)
+
+
+def get_shard(project_id: str) -> Optional[str]:
+    """Shard queue of a project on the consistent hash ring."""
+    global _ring, _ring_shards
+    if config.AGENT_RUN_AFFINITY_SHARDS <= 0:
+        return None
+    if _ring_shards != config.AGENT_RUN_AFFINITY_SHARDS:
+        _ring = sorted(
+            (_hash(f"{queue}#{point}"), queue)
+            for queue in get_shard_queues()
+            for point in range(RING_POINTS_PER_SHARD)
+        )
+        _ring_shards = config.AGENT_RUN_AFFINITY_SHARDS
+    index = bisect.bisect(_ring, (_hash(project_id), "")) % len(_ring)
+    return _ring[index][1]
+
+
+async def choose_queue(project_id: str) -> Optional[str]:
+    """Shard queue to send a project's run to, None for the default queue."""
+    shard = get_shard(project_id)
+    if not shard:
+        return None
+    redis_client = await redis.get_client()
+    last_heartbeat = await redis_client.hget(SHARDS_KEY, shard)
+    if not last_heartbeat or time.time() - float(last_heartbeat) > HEARTBEAT_TIMEOUT:
+        affinity_stats["fallback_down"] += 1
+        logger.debug(f"Shard {shard} of project {project_id} has no live worker, using the default queue")
+        return None
+    load = int(await redis_client.hget(LOAD_KEY, shard) or 0)
+    if load >= config.AGENT_RUN_AFFINITY_MAX_LOAD:
+        affinity_stats["fallback_load"] += 1
+        logger.debug(f"Shard {shard} of project {project_id} is at {load} runs, using the default queue")
+        return None
+    return shard
+
+
+async def send(actor, **kwargs) -> None:
+    """Send a run to its project's shard queue, or to the actor's queue as a fallback."""
+    agent_run_id = kwargs["agent_run_id"]
+    try:
+        queue = await choose_queue(kwargs["project_id"])
+    except Exception as e:
+        affinity_stats["errors"] += 1
+        logger.warning(f"Failed to route agent run {agent_run_id}, using the default queue: {e}")
+        queue = None
+
+    if not queue:
+        actor.send(**kwargs)
+        return
+
+    # Count the run against the shard before it can finish and release it
+    try:
+        redis_client = await redis.get_client()
+        await redis_client.hset(RUNS_KEY, agent_run_id, queue)
+        await redis_client.hincrby(LOAD_KEY, queue, 1)
+    except Exception as e:
+        logger.warning(f"Failed to record shard load of agent run {agent_run_id}: {e}")
+    actor.broker.enqueue(actor.message(**kwargs).copy(queue_name=queue))
+    affinity_stats["routed"] += 1
+    logger.debug(f"Routed agent run {agent_run_id} of project {kwargs['project_id']} to {queue}")
+
+
+async def release(agent_run_id: str) -> Optional[str]:
+    """Remove a finished run from its shard's load, returning the shard."""
+    global _release_script
+    if _release_script is None:
+        redis_client = await redis.get_client()
+        _release_script = redis_client.register_script(RELEASE_SCRIPT)
+    shard = await _release_script(keys=[LOAD_KEY, RUNS_KEY], args=[agent_run_id])
+    return shard or None
+
+
+async def run_heartbeat(shards: List[str]) -> None:
+    """Report the shards a worker consumes as alive, for the lifetime of the worker."""
+    logger.info(f"Worker consuming affinity shards: {', '.join(shards)}")
+    while True:
+        try:
+            redis_client = await redis.get_client()
+            now = time.time()
+            await redis_client.hset(SHARDS_KEY, mapping={shard: now for shard in shards})
+        except Exception as e:
+            logger.warning(f"Failed to report affinity shards {shards}: {e}")
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+
+async def get_affinity_stats() -> Dict[str, Any]:
+    """Routing counters of this process with the liveness and load of every shard."""
+    stats: Dict[str, Any] = dict(affinity_stats)
+    if config.AGENT_RUN_AFFINITY_SHARDS <= 0:
+        return stats
+    redis_client = await redis.get_client()
+    heartbeats = await redis_client.hgetall(SHARDS_KEY)
+    load = await redis_client.hgetall(LOAD_KEY)
+    now = time.time()
+    stats["shards"] = {
+        queue: {
+            "alive": queue in heartbeats and now - float(heartbeats[queue]) <= HEARTBEAT_TIMEOUT,
+            "load": int(load.get(queue, 0)),
+        }
+        for queue in get_shard_queues()
+    }
+    return stats
@@ -0,0 +1,212 @@
+"""
+Leases of agent runs in Redis.
+
+Every agent run holds a lease while a worker executes it:
+- run_lease:{agent_run_id}: the lease holder, with a short TTL renewed by the
+  worker's heartbeat task (RUN_LEASE_TTL, RUN_LEASE_HEARTBEAT_INTERVAL)
+- run_leases: sorted set of agent_run_id by lease expiry time, so expired leases
+  are found without scanning keys
+
+A run gets a longer "queued" lease when it is submitted, refreshed when the run
+scheduler sends it to dramatiq, which the worker takes over when it starts the
+run. A lease that expires means the worker died (or
+never picked the run up); the orphan reaper claims such runs, one reaper per
+run, and marks them as failed.
+"""
+
+import json
+import os
+import socket
+import time
+import uuid
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from services import redis
+from utils.config import config
+from utils.logger import logger
+
+LEASE_INDEX_KEY = "run_leases"
+# Holder of a lease granted at enqueue time, before a worker picks the run up
+QUEUED_HOLDER = "queued"
+# How long a run may wait in the queue before it is considered orphaned
+QUEUED_LEASE_TTL = 3600
+
+STATS_REDIS_KEY = "run_lease_stats"
+STATS_REDIS_TTL = 3600
+# Number of recent renewal latencies kept for percentiles
+LATENCY_WINDOW = 200
+
+# Takes the lease unless another worker holds it.
+# KEYS: lease key, lease index. ARGV: agent_run_id, holder, ttl, now
+ACQUIRE_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current and current ~= ARGV[2] and current ~= 'queued' then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+redis.call('ZADD', KEYS[2], tonumber(ARGV[4]) + tonumber(ARGV[3]), ARGV[1])
+return 1
+"""
+
+# Extends the lease if it is still held by the holder.
+# KEYS: lease key, lease index. ARGV: agent_run_id, holder, ttl, now
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[2] then
+    return 0
+end
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('ZADD', KEYS[2], tonumber(ARGV[4]) + tonumber(ARGV[3]), ARGV[1])
+return 1
+"""
+
+# KEYS: lease key, lease index. ARGV: agent_run_id, holder
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[2] then
+    redis.call('DEL', KEYS[1])
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+# Claims an orphaned run for the calling reaper: the lease must be gone and
+# its index entry expired. Removing the entry makes the claim exclusive.
+# KEYS: lease key, lease index. ARGV: agent_run_id, now
+CLAIM_ORPHAN_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+local expiry = redis.call('ZSCORE', KEYS[2], ARGV[1])
+if not expiry or tonumber(expiry) > tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('ZREM', KEYS[2], ARGV[1])
+return 1
+"""
+
+# Stats of this process
+lease_stats: Dict[str, Any] = {"acquired": 0, "renewals": 0, "renewal_failures": 0, "lost": 0, "orphans_detected": 0, "orphans_reaped": 0}
+_renewal_latencies: deque = deque(maxlen=LATENCY_WINDOW)
+_process_id = f"{socket.gethostname()}:{os.getpid()}"
+_scripts: Dict[str, object] = {}
+
+
+def _lease_key(agent_run_id: str) -> str:
+    return f"run_lease:{agent_run_id}"
+
+
+def new_holder() -> str:
+    """Unique lease holder id for one execution of a run."""
+    return f"{_process_id}:{uuid.uuid4().hex[:8]}"
+
+
+async def _get_script(name: str, source: str):
+    if name not in _scripts:
+        redis_client = await redis.get_client()
+        _scripts[name] = redis_client.register_script(source)
+    return _scripts[name]
+
+
+async def grant_queued(agent_run_id: str) -> None:
+    """Give a newly enqueued run a lease covering its time in the queue."""
+    await acquire(agent_run_id, QUEUED_HOLDER, QUEUED_LEASE_TTL)
+
+
+async def acquire(agent_run_id: str, holder: str, ttl: Optional[int] = None) -> bool:
+    """Take the lease of a run, False if another worker holds it."""
+    script = await _get_script("acquire", ACQUIRE_SCRIPT)
+    acquired = await script(
+        keys=[_lease_key(agent_run_id), LEASE_INDEX_KEY],
+        args=[agent_run_id, holder, ttl or config.RUN_LEASE_TTL, time.time()]
+    )
+    if acquired and holder != QUEUED_HOLDER:
+        lease_stats["acquired"] += 1
+    return bool(acquired)
+
+
+async def renew(agent_run_id: str, holder: str, ttl: Optional[int] = None) -> bool:
+    """Extend a run's lease, False if the holder lost it."""
+    script = await _get_script("renew", RENEW_SCRIPT)
+    start = time.monotonic()
+    try:
+        renewed = await script(
+            keys=[_lease_key(agent_run_id), LEASE_INDEX_KEY],
+            args=[agent_run_id, holder, ttl or config.RUN_LEASE_TTL, time.time()]
+        )
+    except Exception:
+        lease_stats["renewal_failures"] += 1
+        raise
+    _renewal_latencies.append((time.monotonic() - start) * 1000)
+    if renewed:
+        lease_stats["renewals"] += 1
+    else:
+        lease_stats["lost"] += 1
+    return bool(renewed)
+
+
+async def release(agent_run_id: str, holder: str) -> None:
+    """Give up a run's lease once the run has finished."""
+    script = await _get_script("release", RELEASE_SCRIPT)
+    await script(keys=[_lease_key(agent_run_id), LEASE_INDEX_KEY], args=[agent_run_id, holder])
+
+
+async def has_lease(agent_run_ids: List[str]) -> Dict[str, bool]:
+    """Whether each run has an entry in the lease index, expired or not."""
+    if not agent_run_ids:
+        return {}
+    redis_client = await redis.get_client()
+    scores = await redis_client.zmscore(LEASE_INDEX_KEY, agent_run_ids)
+    return {agent_run_id: score is not None for agent_run_id, score in zip(agent_run_ids, scores)}
+
+
+async def claim_expired(limit: int = 100) -> List[str]:
+    """Find runs whose lease expired and claim them for this reaper."""
+    redis_client = await redis.get_client()
+    now = time.time()
+    candidates = await redis_client.zrangebyscore(LEASE_INDEX_KEY, "-inf", now, start=0, num=limit)
+    if not candidates:
+        return []
+    script = await _get_script("claim_orphan", CLAIM_ORPHAN_SCRIPT)
+    claimed = []
+    for agent_run_id in candidates:
+        if await script(keys=[_lease_key(agent_run_id), LEASE_INDEX_KEY], args=[agent_run_id, now]):
+            claimed.append(agent_run_id)
+    return claimed
+
+
+def get_lease_stats() -> Dict[str, Any]:
+    """Lease counters of this process with renewal latency percentiles in milliseconds."""
+    stats = dict(lease_stats)
+    latencies = sorted(_renewal_latencies)
+    if latencies:
+        stats["renewal_latency_ms"] = {
+            "p50": round(latencies[len(latencies) // 2], 2),
+            "p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+            "max": round(latencies[-1], 2),
+        }
+    return stats
+
+
+async def publish_stats() -> None:
+    """Publish this process's lease stats to Redis, one hash field per process."""
+    try:
+        redis_client = await redis.get_client()
+        snapshot = {"updated_at": time.time(), **get_lease_stats()}
+        await redis_client.hset(STATS_REDIS_KEY, _process_id, json.dumps(snapshot))
+        await redis_client.expire(STATS_REDIS_KEY, STATS_REDIS_TTL)
+    except Exception as e:
+        logger.debug(f"Failed to publish run lease stats: {e}")
+
+
+async def get_published_lease_stats(max_age: int = STATS_REDIS_TTL) -> Dict[str, Any]:
+    """Lease stats published by all processes within max_age seconds."""
+    redis_client = await redis.get_client()
+    published = await redis_client.hgetall(STATS_REDIS_KEY)
+    now = time.time()
+    result = {}
+    for process_id, value in published.items():
+        snapshot = json.loads(value)
+        if now - snapshot.get("updated_at", 0) <= max_age:
+            result[process_id] = snapshot
+    return result
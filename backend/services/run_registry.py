@@ -0,0 +1,123 @@
+"""
+Registry of active agent runs in Redis.
+
+Two structures are kept in step by Lua scripts, so a run is never visible in
+one and missing from the other:
+- active_runs:{instance_id}: hash of agent_run_id -> last heartbeat timestamp,
+  the runs started by an instance
+- active_run:{agent_run_id}: the instance_id handling the run (reverse map)
+
+Finding the instance of a run is O(1) and listing the runs of an instance is
+O(runs on that instance); neither needs a KEYS scan over the keyspace.
+"""
+
+import time
+from typing import Dict, List, Optional
+
+from services import redis
+from utils.logger import logger
+
+# Registrations expire if they are not renewed, as a safety net for crashed instances
+RUN_REGISTRY_TTL = redis.REDIS_KEY_TTL
+
+# KEYS: run key, instance hash. ARGV: instance_id, agent_run_id, ttl, now
+REGISTER_SCRIPT = """
+local previous = redis.call('GET', KEYS[1])
+if previous and previous ~= ARGV[1] then
+    redis.call('HDEL', 'active_runs:' .. previous, ARGV[2])
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+redis.call('HSET', KEYS[2], ARGV[2], ARGV[4])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return 1
+"""
+
+# Renews a registration if the run still belongs to the instance.
+# KEYS: run key, instance hash. ARGV: instance_id, agent_run_id, ttl, now
+HEARTBEAT_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('HSET', KEYS[2], ARGV[2], ARGV[4])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return 1
+"""
+
+# Returns the instance the run was registered to, or false.
+# KEYS: run key. ARGV: agent_run_id
+UNREGISTER_SCRIPT = """
+local instance_id = redis.call('GET', KEYS[1])
+redis.call('DEL', KEYS[1])
+if instance_id then
+    redis.call('HDEL', 'active_runs:' .. instance_id, ARGV[1])
+end
+return instance_id
+"""
+
+_scripts: Dict[str, object] = {}
+
+
+def _run_key(agent_run_id: str) -> str:
+    return f"active_run:{agent_run_id}"
+
+
+def _instance_key(instance_id: str) -> str:
+    return f"active_runs:{instance_id}"
+
+
+async def _get_script(name: str, source: str):
+    if name not in _scripts:
+        redis_client = await redis.get_client()
+        _scripts[name] = redis_client.register_script(source)
+    return _scripts[name]
+
+
+async def register(instance_id: str, agent_run_id: str, ttl: int = RUN_REGISTRY_TTL) -> None:
+    """Register a run as active on an instance."""
+    script = await _get_script("register", REGISTER_SCRIPT)
+    await script(
+        keys=[_run_key(agent_run_id), _instance_key(instance_id)],
+        args=[instance_id, agent_run_id, ttl, time.time()]
+    )
+
+
+async def heartbeat(instance_id: str, agent_run_id: str, ttl: int = RUN_REGISTRY_TTL) -> bool:
+    """Renew a run's registration, False if the run is no longer registered to the instance."""
+    script = await _get_script("heartbeat", HEARTBEAT_SCRIPT)
+    renewed = await script(
+        keys=[_run_key(agent_run_id), _instance_key(instance_id)],
+        args=[instance_id, agent_run_id, ttl, time.time()]
+    )
+    return bool(renewed)
+
+
+async def unregister(agent_run_id: str) -> Optional[str]:
+    """Remove a run from the registry, returning the instance it was registered to."""
+    script = await _get_script("unregister", UNREGISTER_SCRIPT)
+    instance_id = await script(keys=[_run_key(agent_run_id)], args=[agent_run_id])
+    return instance_id or None
+
+
+async def get_run_instance(agent_run_id: str) -> Optional[str]:
+    """Instance handling a run, None if the run is not active."""
+    return await redis.get(_run_key(agent_run_id))
+
+
+async def get_instance_runs(instance_id: str) -> List[str]:
+    """Runs registered to an instance."""
+    redis_client = await redis.get_client()
+    return list(await redis_client.hkeys(_instance_key(instance_id)))
+
+
+async def get_instance_heartbeats(instance_id: str) -> Dict[str, float]:
+    """Last heartbeat timestamp of every run registered to an instance."""
+    redis_client = await redis.get_client()
+    heartbeats = await redis_client.hgetall(_instance_key(instance_id))
+    result = {}
+    for agent_run_id, timestamp in heartbeats.items():
+        try:
+            result[agent_run_id] = float(timestamp)
+        except (TypeError, ValueError):
+            logger.warning(f"Invalid heartbeat for run {agent_run_id} on instance {instance_id}: {timestamp}")
+    return result
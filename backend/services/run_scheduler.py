@@ -0,0 +1,286 @@
+"""
+Fair scheduling of agent runs in front of the dramatiq queue.
+
+Runs are not sent to dramatiq directly. They wait in Redis and are dispatched
+when a slot is free:
+- At most AGENT_RUN_MAX_IN_FLIGHT runs are in the dramatiq queue or executing
+- Each account runs at most max_concurrent runs, by subscription tier
+  (see AGENT_RUN_TIER_LIMITS)
+- Accounts share slots by weighted fair queuing: every dispatch advances the
+  account's virtual time by 1/weight and the account with the lowest virtual
+  time goes next, so one account's backlog cannot starve other accounts
+- The interactive lane is always served before the batch lane (agent builder runs)
+
+Layout:
+- run_queue:{lane}: sorted set of accounts with queued runs, by virtual time
+- run_queue:{lane}:{account_id}: list of the account's queued run ids
+- run_queue_vtime:{lane}: virtual time of the last dispatch, new accounts start there
+- run_sched:payloads: hash of queued run id -> actor arguments
+- run_sched:dispatched: hash of dispatched run id -> account id
+- run_sched:running: hash of account id -> dispatched runs, '__total__' for all accounts
+- run_sched:limits: hash of account id -> "max_concurrent:weight"
+
+If Redis is unavailable runs are sent to dramatiq directly.
+"""
+
+import inspect
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from services import redis
+from services import run_lease
+from utils.config import config, EnvMode
+from utils.constants import AGENT_RUN_TIER_LIMITS
+from utils.logger import logger
+
+RUN_LANES = ("interactive", "batch")
+
+RUNNING_KEY = "run_sched:running"
+LIMITS_KEY = "run_sched:limits"
+PAYLOADS_KEY = "run_sched:payloads"
+DISPATCHED_KEY = "run_sched:dispatched"
+WAIT_STATS_KEY = "run_sched:wait_stats"
+
+# KEYS: limits, payloads. ARGV: lane, account_id, agent_run_id, payload, "max_concurrent:weight"
+SUBMIT_SCRIPT = """
+local lane_key = 'run_queue:' .. ARGV[1]
+redis.call('HSET', KEYS[1], ARGV[2], ARGV[5])
+redis.call('HSET', KEYS[2], ARGV[3], ARGV[4])
+redis.call('RPUSH', lane_key .. ':' .. ARGV[2], ARGV[3])
+if not redis.call('ZSCORE', lane_key, ARGV[2]) then
+    local vtime = tonumber(redis.call('GET', 'run_queue_vtime:' .. ARGV[1]) or '0')
+    redis.call('ZADD', lane_key, vtime, ARGV[2])
+end
+return 1
+"""
+
+# Takes the next run to dispatch, or returns false when nothing can run now.
+# KEYS: running, limits, payloads, dispatched. ARGV: max in flight, lanes in priority order
+DISPATCH_SCRIPT = """
+local max_in_flight = tonumber(ARGV[1])
+local in_flight = tonumber(redis.call('HGET', KEYS[1], '__total__') or '0')
+if max_in_flight > 0 and in_flight >= max_in_flight then
+    return false
+end
+for i = 2, #ARGV do
+    local lane_key = 'run_queue:' .. ARGV[i]
+    local accounts = redis.call('ZRANGE', lane_key, 0, -1, 'WITHSCORES')
+    for j = 1, #accounts, 2 do
+        local account = accounts[j]
+        local vtime = tonumber(accounts[j + 1])
+        local queue_key = lane_key .. ':' .. account
+        local max_concurrent, weight = 1, 1
+        local limits = redis.call('HGET', KEYS[2], account)
+        if limits then
+            local sep = string.find(limits, ':')
+            max_concurrent = tonumber(string.sub(limits, 1, sep - 1))
+            weight = tonumber(string.sub(limits, sep + 1))
+        end
+        local running = tonumber(redis.call('HGET', KEYS[1], account) or '0')
+        if max_concurrent <= 0 or running < max_concurrent then
+            while true do
+                local run_id = redis.call('LPOP', queue_key)
+                if not run_id then
+                    break
+                end
+                local payload = redis.call('HGET', KEYS[3], run_id)
+                -- Runs without a payload were cancelled while queued
+                if payload then
+                    redis.call('HDEL', KEYS[3], run_id)
+                    redis.call('HINCRBY', KEYS[1], account, 1)
+                    redis.call('HINCRBY', KEYS[1], '__total__', 1)
+                    redis.call('HSET', KEYS[4], run_id, account)
+                    if redis.call('LLEN', queue_key) > 0 then
+                        redis.call('ZADD', lane_key, vtime + 1 / weight, account)
+                    else
+                        redis.call('ZREM', lane_key, account)
+                    end
+                    redis.call('SET', 'run_queue_vtime:' .. ARGV[i], tostring(vtime))
+                    return payload
+                end
+            end
+            redis.call('ZREM', lane_key, account)
+        end
+    end
+end
+return false
+"""
+
+# Frees the slot of a dispatched run, or drops a queued one.
+# KEYS: running, payloads, dispatched. ARGV: agent_run_id
+RELEASE_SCRIPT = """
+if redis.call('HDEL', KEYS[2], ARGV[1]) == 1 then
+    return 'queued'
+end
+local account = redis.call('HGET', KEYS[3], ARGV[1])
+if not account then
+    return false
+end
+redis.call('HDEL', KEYS[3], ARGV[1])
+if redis.call('HINCRBY', KEYS[1], account, -1) <= 0 then
+    redis.call('HDEL', KEYS[1], account)
+end
+if redis.call('HINCRBY', KEYS[1], '__total__', -1) < 0 then
+    redis.call('HSET', KEYS[1], '__total__', 0)
+end
+return 'running'
+"""
+
+_scripts: Dict[str, object] = {}
+
+
+async def _get_script(name: str, source: str):
+    if name not in _scripts:
+        redis_client = await redis.get_client()
+        _scripts[name] = redis_client.register_script(source)
+    return _scripts[name]
+
+
+def get_run_lane(is_agent_builder: bool) -> str:
+    """Lane of a run: interactive agent runs go before agent builder runs."""
+    return "batch" if is_agent_builder else "interactive"
+
+
+def _get_account_limits(account_tier: Optional[str]) -> str:
+    limits = AGENT_RUN_TIER_LIMITS.get(account_tier or 'free', AGENT_RUN_TIER_LIMITS['free'])
+    # Local development has no billing, do not cap accounts
+    max_concurrent = 0 if config.ENV_MODE == EnvMode.LOCAL else limits['max_concurrent']
+    return f"{max_concurrent}:{limits['weight']}"
+
+
+async def submit(
+    send: Callable[..., Any],
+    agent_run_id: str,
+    account_id: Optional[str],
+    account_tier: Optional[str],
+    lane: str = "interactive",
+    **kwargs
+) -> None:
+    """Queue a run for the account and dispatch whatever can run now.
+
+    Args:
+        send: Function (or coroutine function) that enqueues the run in dramatiq, called with kwargs
+        agent_run_id: ID of the run
+        account_id: Account the run is charged to
+        account_tier: Subscription tier name of the account
+        lane: One of RUN_LANES
+        **kwargs: Arguments of the run_agent_background actor
+    """
+    kwargs["agent_run_id"] = agent_run_id
+    if not config.AGENT_RUN_SCHEDULER_ENABLED or not account_id:
+        await _send(send, kwargs)
+        return
+
+    payload = json.dumps({"kwargs": kwargs, "tier": account_tier or 'free', "lane": lane, "enqueued_at": time.time()})
+    try:
+        script = await _get_script("submit", SUBMIT_SCRIPT)
+        await script(
+            keys=[LIMITS_KEY, PAYLOADS_KEY],
+            args=[lane, account_id, agent_run_id, payload, _get_account_limits(account_tier)]
+        )
+    except Exception as e:
+        logger.warning(f"Failed to queue agent run {agent_run_id} in the scheduler, sending it directly: {e}")
+        await _send(send, kwargs)
+        return
+    await dispatch(send)
+
+
+async def dispatch(send: Callable[..., Any]) -> int:
+    """Send queued runs to dramatiq while slots are free, returning how many were sent."""
+    if not config.AGENT_RUN_SCHEDULER_ENABLED:
+        return 0
+    dispatched = 0
+    try:
+        script = await _get_script("dispatch", DISPATCH_SCRIPT)
+        while True:
+            payload = await script(
+                keys=[RUNNING_KEY, LIMITS_KEY, PAYLOADS_KEY, DISPATCHED_KEY],
+                args=[config.AGENT_RUN_MAX_IN_FLIGHT, *RUN_LANES]
+            )
+            if not payload:
+                break
+            run = json.loads(payload)
+            agent_run_id = run["kwargs"]["agent_run_id"]
+            # The lease granted at submit time may be close to expiring after a long wait
+            try:
+                await run_lease.grant_queued(agent_run_id)
+            except Exception as e:
+                logger.warning(f"Failed to refresh the queued lease of agent run {agent_run_id}: {e}")
+            try:
+                await _send(send, run["kwargs"])
+            except Exception as e:
+                logger.error(f"Failed to send agent run {agent_run_id} to the queue: {e}")
+                await release(agent_run_id)
+                continue
+            dispatched += 1
+            wait = time.time() - run["enqueued_at"]
+            logger.debug(f"Dispatched agent run {agent_run_id} ({run['lane']}, {run['tier']}) after {wait:.2f}s in queue")
+            await _record_wait(run["tier"], wait)
+    except Exception as e:
+        logger.error(f"Error dispatching queued agent runs: {e}")
+    return dispatched
+
+
+async def _send(send: Callable[..., Any], kwargs: Dict[str, Any]) -> None:
+    result = send(**kwargs)
+    if inspect.isawaitable(result):
+        await result
+
+
+async def release(agent_run_id: str) -> Optional[str]:
+    """Free the slot of a finished run or drop a queued run.
+
+    Returns:
+        Optional[str]: 'running' or 'queued' for the state the run was released from,
+        None if the scheduler did not know the run
+    """
+    script = await _get_script("release", RELEASE_SCRIPT)
+    released = await script(keys=[RUNNING_KEY, PAYLOADS_KEY, DISPATCHED_KEY], args=[agent_run_id])
+    return released or None
+
+
+async def get_queued(agent_run_ids: List[str]) -> Set[str]:
+    """Runs among agent_run_ids that are still waiting in the queue."""
+    if not agent_run_ids:
+        return set()
+    redis_client = await redis.get_client()
+    payloads = await redis_client.hmget(PAYLOADS_KEY, agent_run_ids)
+    return {agent_run_id for agent_run_id, payload in zip(agent_run_ids, payloads) if payload is not None}
+
+
+async def _record_wait(tier: str, wait: float) -> None:
+    try:
+        redis_client = await redis.get_client()
+        await redis_client.hincrbyfloat(WAIT_STATS_KEY, f"{tier}:wait_seconds", wait)
+        await redis_client.hincrby(WAIT_STATS_KEY, f"{tier}:dispatched", 1)
+    except Exception as e:
+        logger.debug(f"Failed to record queue wait for tier {tier}: {e}")
+
+
+async def get_scheduler_stats() -> Dict[str, Any]:
+    """Queued runs per lane, runs in flight and the average queue wait per tier."""
+    redis_client = await redis.get_client()
+    lanes = {}
+    for lane in RUN_LANES:
+        accounts = await redis_client.zrange(f"run_queue:{lane}", 0, -1)
+        queued = 0
+        for account_id in accounts:
+            queued += await redis_client.llen(f"run_queue:{lane}:{account_id}")
+        lanes[lane] = {"accounts": len(accounts), "queued": queued}
+
+    wait_stats = await redis_client.hgetall(WAIT_STATS_KEY)
+    tiers = {}
+    for field, value in wait_stats.items():
+        tier, metric = field.rsplit(":", 1)
+        tiers.setdefault(tier, {})[metric] = float(value)
+    for tier_stats in tiers.values():
+        dispatched = tier_stats.get("dispatched", 0)
+        tier_stats["avg_wait_seconds"] = round(tier_stats.get("wait_seconds", 0) / dispatched, 3) if dispatched else 0.0
+
+    return {
+        "in_flight": int(await redis_client.hget(RUNNING_KEY, "__total__") or 0),
+        "max_in_flight": config.AGENT_RUN_MAX_IN_FLIGHT,
+        "lanes": lanes,
+        "wait_by_tier": tiers,
+    }
@@ -0,0 +1,64 @@
+-- Per-iteration agent state in a single round trip (used by agent/run.py)
+--
+-- Returns, for a thread:
+--   latest_message_type: type of the latest assistant/tool/user message
+--   browser_state:       latest browser_state message without its base64 screenshot
+--                        (has_screenshot_base64 tells whether one is stored)
+--   image_context:       latest image_context message (agent/run.py deletes it once
+--                        it has been shown to the model)
+
+CREATE INDEX IF NOT EXISTS idx_messages_thread_type_created_at ON messages(thread_id, type, created_at DESC);
+
+-- Drop the former (UUID, BOOLEAN) signature, which could delete the image context
+DROP FUNCTION IF EXISTS get_agent_run_state(UUID, BOOLEAN);
+
+CREATE OR REPLACE FUNCTION get_agent_run_state(p_thread_id UUID)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    latest_message_type TEXT;
+    browser_state JSONB;
+    image_context JSONB;
+BEGIN
+    SELECT m.type INTO latest_message_type
+    FROM messages m
+    WHERE m.thread_id = p_thread_id
+      AND m.type IN ('assistant', 'tool', 'user')
+    ORDER BY m.created_at DESC
+    LIMIT 1;
+
+    -- Content may be stored as a JSON object or as a JSON-encoded string
+    SELECT jsonb_build_object(
+        'message_id', m.message_id,
+        'content', c.content - 'screenshot_base64',
+        'has_screenshot_base64', c.content ? 'screenshot_base64'
+    ) INTO browser_state
+    FROM messages m
+    CROSS JOIN LATERAL (
+        SELECT CASE WHEN jsonb_typeof(m.content) = 'string' THEN (m.content #>> '{}')::jsonb ELSE m.content END AS content
+    ) c
+    WHERE m.thread_id = p_thread_id
+      AND m.type = 'browser_state'
+    ORDER BY m.created_at DESC
+    LIMIT 1;
+
+    SELECT jsonb_build_object(
+        'message_id', m.message_id,
+        'content', CASE WHEN jsonb_typeof(m.content) = 'string' THEN (m.content #>> '{}')::jsonb ELSE m.content END
+    ) INTO image_context
+    FROM messages m
+    WHERE m.thread_id = p_thread_id
+      AND m.type = 'image_context'
+    ORDER BY m.created_at DESC
+    LIMIT 1;
+
+    RETURN jsonb_build_object(
+        'latest_message_type', latest_message_type,
+        'browser_state', browser_state,
+        'image_context', image_context
+    );
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION get_agent_run_state(UUID) TO authenticated, service_role;
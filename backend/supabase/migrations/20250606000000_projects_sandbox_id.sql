@@ -0,0 +1,9 @@
+-- Indexed sandbox id of a project (used by sandbox/api.py)
+--
+-- Sandbox file API calls look up the project that owns a sandbox. Filtering on
+-- the sandbox JSONB (sandbox->>'id') has no supporting index; the generated
+-- column keeps the id in sync with the JSONB and makes the lookup an index scan.
+
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS sandbox_id TEXT GENERATED ALWAYS AS (sandbox->>'id') STORED;
+
+CREATE INDEX IF NOT EXISTS idx_projects_sandbox_id ON projects(sandbox_id) WHERE sandbox_id IS NOT NULL;
@@ -1,9 +1,18 @@
 import sentry
+import time
 from fastapi import HTTPException, Request
-from typing import Optional
+from typing import Dict, Optional, Tuple
 import jwt
 from jwt.exceptions import PyJWTError
 
+# Account memberships are cached per (user, account); non-members for less time
+# so a user who was just invited gets access quickly
+ACCOUNT_MEMBER_CACHE_TTL = 60
+ACCOUNT_NON_MEMBER_CACHE_TTL = 10
+ACCOUNT_MEMBER_CACHE_MAX_SIZE = 10000
+
+_account_members: Dict[Tuple[str, str], Tuple[float, bool]] = {}
+
 # This function extracts the user ID from Supabase JWT
 async def get_current_user_id_from_jwt(request: Request) -> str:
     """
@@ -179,13 +188,43 @@ async def verify_thread_access(client, thread_id: str, user_id: str):
                 return True
         
     account_id = thread_data.get('account_id')
-    # When using service role, we need to manually check account membership instead of using current_user_account_role
-    if account_id:
-        account_user_result = await client.schema('basejump').from_('account_user').select('account_role').eq('user_id', user_id).eq('account_id', account_id).execute()
-        if account_user_result.data and len(account_user_result.data) > 0:
-            return True
+    if account_id and await is_account_member(client, user_id, account_id):
+        return True
     raise HTTPException(status_code=403, detail="Not authorized to access this thread")
 
+async def is_account_member(client, user_id: str, account_id: str) -> bool:
+    """
+    Check whether a user belongs to an account, cached per (user, account).
+    
+    When using the service role, account membership has to be checked manually
+    instead of using current_user_account_role.
+    
+    Args:
+        client: The Supabase client
+        user_id: The user ID to check
+        account_id: The account ID to check
+        
+    Returns:
+        bool: True if the user is a member of the account
+    """
+    key = (user_id, account_id)
+    now = time.monotonic()
+    cached = _account_members.get(key)
+    if cached and now < cached[0]:
+        return cached[1]
+    
+    account_user_result = await client.schema('basejump').from_('account_user').select('account_role').eq('user_id', user_id).eq('account_id', account_id).execute()
+    is_member = bool(account_user_result.data)
+    
+    if len(_account_members) >= ACCOUNT_MEMBER_CACHE_MAX_SIZE:
+        for expired_key in [k for k, (expires_at, _) in _account_members.items() if expires_at <= now]:
+            del _account_members[expired_key]
+        if len(_account_members) >= ACCOUNT_MEMBER_CACHE_MAX_SIZE:
+            _account_members.clear()
+    ttl = ACCOUNT_MEMBER_CACHE_TTL if is_member else ACCOUNT_NON_MEMBER_CACHE_TTL
+    _account_members[key] = (now + ttl, is_member)
+    return is_member
+
 async def get_optional_user_id(request: Request) -> Optional[str]:
     """
     Extract the user ID from the JWT in the Authorization header if present,
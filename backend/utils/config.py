@@ -125,6 +125,32 @@ class Configuration:
     # Model configuration
     MODEL_TO_USE: Optional[str] = "anthropic/claude-3-7-sonnet-latest"
     
+    # Route LLM calls across equivalent provider deployments (see MODEL_DEPLOYMENTS)
+    LLM_ROUTER_ENABLED: bool = True
+    # Hedged streams: when no first chunk arrives within the given percentile of the
+    # deployment's time to first token, a second request goes to an alternate deployment
+    LLM_HEDGING_ENABLED: bool = False
+    LLM_HEDGE_TTFT_PERCENTILE: int = 95
+    LLM_HEDGE_MIN_DELAY_MS: int = 1000
+    LLM_HEDGE_DEFAULT_DELAY_MS: int = 5000
+    # Redis token-bucket admission control per provider and account tier (seconds a call may queue)
+    LLM_RATE_LIMIT_ENABLED: bool = True
+    LLM_RATE_LIMIT_MAX_WAIT: int = 60
+    # Agent run leases: workers renew a short lease while a run executes, the API
+    # reaps runs whose lease expired (seconds). Renewals run on the worker's event
+    # loop, which synchronous sandbox calls can stall, so the TTL leaves room for that
+    RUN_LEASE_TTL: int = 120
+    RUN_LEASE_HEARTBEAT_INTERVAL: int = 20
+    RUN_ORPHAN_REAPER_INTERVAL: int = 30
+    # Fair scheduling of agent runs per account; runs in flight should match the
+    # worker pool size (dramatiq processes x threads)
+    AGENT_RUN_SCHEDULER_ENABLED: bool = True
+    AGENT_RUN_MAX_IN_FLIGHT: int = 64
+    # Route runs to worker shard queues by project (0 disables), falling back to the
+    # default queue when a shard is down or has this many runs in flight
+    AGENT_RUN_AFFINITY_SHARDS: int = 0
+    AGENT_RUN_AFFINITY_MAX_LOAD: int = 16
+    
     # Supabase configuration
     SUPABASE_URL: str
     SUPABASE_ANON_KEY: str
@@ -141,6 +167,11 @@ class Configuration:
     DAYTONA_SERVER_URL: str
     DAYTONA_TARGET: str
     
+    # Warm sandbox pool for new projects, sized between min and max by the initiate rate
+    SANDBOX_POOL_ENABLED: bool = False
+    SANDBOX_POOL_MIN_SIZE: int = 1
+    SANDBOX_POOL_MAX_SIZE: int = 10
+    
     # Search and other API keys
     TAVILY_API_KEY: str
     RAPID_API_KEY: str
@@ -148,6 +179,10 @@ class Configuration:
     FIRECRAWL_API_KEY: str
     FIRECRAWL_URL: Optional[str] = "https://api.firecrawl.dev"
     
+    # Web search cache (seconds, 0 disables caching) and coalescing of identical concurrent searches
+    WEB_SEARCH_CACHE_TTL: int = 3600
+    WEB_SEARCH_COALESCE_REQUESTS: bool = True
+    
     # Stripe configuration
     STRIPE_SECRET_KEY: Optional[str] = None
     STRIPE_WEBHOOK_SECRET: Optional[str] = None
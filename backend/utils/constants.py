@@ -142,4 +142,64 @@ MODEL_NAME_ALIASES = {
     
     # "qwen/qwen3-235b-a22b": "openrouter/qwen/qwen3-235b-a22b",
     # "xai/grok-3-mini-fast-beta": "xai/grok-3-mini-fast-beta",  # Commented out in constants.py
-}
\ No newline at end of file
+}
+
+# Equivalent provider deployments of a model, in order of preference.
+# The LLM router only uses deployments whose provider credentials are configured.
+# Bedrock Claude 3.7 is left out: it needs an account-specific inference profile.
+MODEL_DEPLOYMENTS = {
+    "anthropic/claude-3-7-sonnet-latest": [
+        "anthropic/claude-3-7-sonnet-latest",
+        "openrouter/anthropic/claude-3.7-sonnet",
+    ],
+    "anthropic/claude-sonnet-4-20250514": [
+        "anthropic/claude-sonnet-4-20250514",
+        "bedrock/us.anthropic.claude-sonnet-4-20250514-v1:0",
+        "openrouter/anthropic/claude-sonnet-4",
+    ],
+    "anthropic/claude-3-5-sonnet-latest": [
+        "anthropic/claude-3-5-sonnet-latest",
+        "openrouter/anthropic/claude-3.5-sonnet",
+    ],
+    "openai/gpt-4o": [
+        "openai/gpt-4o",
+        "openrouter/openai/gpt-4o",
+    ],
+    "openai/gpt-4.1": [
+        "openai/gpt-4.1",
+        "openrouter/openai/gpt-4.1",
+    ],
+}
+
+# LLM admission control (services/llm_rate_limiter.py): requests and prompt tokens per minute
+LLM_PROVIDER_RATE_LIMITS = {
+    "anthropic": {"rpm": 4000, "tpm": 2000000},
+    "openai": {"rpm": 5000, "tpm": 2000000},
+    "openrouter": {"rpm": 2000, "tpm": 2000000},
+    "bedrock": {"rpm": 500, "tpm": 1000000},
+}
+
+# Per account, keyed by subscription tier name (see SUBSCRIPTION_TIERS in services/billing.py)
+LLM_ACCOUNT_TIER_RATE_LIMITS = {
+    "free": {"rpm": 20, "tpm": 1000000},
+    "tier_2_20": {"rpm": 40, "tpm": 2000000},
+    "tier_6_50": {"rpm": 60, "tpm": 3000000},
+    "tier_12_100": {"rpm": 90, "tpm": 4000000},
+    "tier_25_200": {"rpm": 120, "tpm": 6000000},
+    "tier_50_400": {"rpm": 180, "tpm": 8000000},
+    "tier_125_800": {"rpm": 240, "tpm": 12000000},
+    "tier_200_1000": {"rpm": 300, "tpm": 16000000},
+}
+
+# Agent run scheduling per account, keyed by subscription tier name: concurrent runs
+# and the account's share of free slots when accounts compete (see services/run_scheduler.py)
+AGENT_RUN_TIER_LIMITS = {
+    "free": {"max_concurrent": 1, "weight": 1},
+    "tier_2_20": {"max_concurrent": 2, "weight": 2},
+    "tier_6_50": {"max_concurrent": 3, "weight": 3},
+    "tier_12_100": {"max_concurrent": 5, "weight": 4},
+    "tier_25_200": {"max_concurrent": 8, "weight": 6},
+    "tier_50_400": {"max_concurrent": 12, "weight": 8},
+    "tier_125_800": {"max_concurrent": 20, "weight": 12},
+    "tier_200_1000": {"max_concurrent": 30, "weight": 16},
+}
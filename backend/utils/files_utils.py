@@ -1,5 +1,7 @@
 
+import json
 import os
+import shlex
 
 # Files to exclude from operations
 EXCLUDED_FILES = {
@@ -64,6 +66,50 @@ def should_exclude_file(rel_path: str) -> bool:
 
     return False 
 
+# Run in the sandbox by get_manifest_command: prints one JSON line per file under
+# the root that should_exclude_file keeps, with its size, mtime and sha1
+MANIFEST_SCRIPT = """
+import hashlib, json, os, stat, sys
+root, rules = sys.argv[1], json.loads(sys.argv[2])
+files, dirs, exts = set(rules["files"]), rules["dirs"], set(rules["ext"])
+for current, subdirs, names in os.walk(root):
+    rel_dir = os.path.relpath(current, root)
+    rel_dir = "" if rel_dir == "." else rel_dir
+    if any(excluded in rel_dir for excluded in dirs):
+        subdirs[:] = []
+        continue
+    for name in names:
+        if name in files or os.path.splitext(name)[1].lower() in exts:
+            continue
+        path = os.path.join(current, name)
+        try:
+            info = os.lstat(path)
+            if not stat.S_ISREG(info.st_mode):
+                continue
+            digest = hashlib.sha1()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+        except OSError:
+            continue
+        print(json.dumps({"path": os.path.join(rel_dir, name), "size": info.st_size, "mtime": info.st_mtime, "sha1": digest.hexdigest()}))
+"""
+
+def get_manifest_command(workspace_path: str = "/workspace") -> str:
+    """Build the shell command that prints the manifest of a workspace
+    
+    The command applies the same exclusion rules as should_exclude_file, in the sandbox.
+    
+    Args:
+        workspace_path: The workspace directory to walk (default: "/workspace")
+        
+    Returns:
+        The command, printing one JSON object per line with path (relative to the
+        workspace), size, mtime and sha1
+    """
+    rules = json.dumps({"files": sorted(EXCLUDED_FILES), "dirs": sorted(EXCLUDED_DIRS), "ext": sorted(EXCLUDED_EXT)})
+    return f"python3 -c {shlex.quote(MANIFEST_SCRIPT)} {shlex.quote(workspace_path)} {shlex.quote(rules)}"
+
 def clean_path(path: str, workspace_path: str = "/workspace") -> str:
     """Clean and normalize a path to be relative to the workspace
     
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+"""
+Benchmark MCP tool call latency with and without the session pool.
+
+Usage:
+    python -m utils.scripts.benchmark_mcp_session_pool [--calls N] [--concurrency C] [--latency-ms MS]
+
+This script:
+1. Starts a local MCP stand-in server (streamable HTTP) with an echo tool
+2. Measures per-call latency when every call opens its own session (the old
+   MCPManager.execute_tool behaviour: new HTTP client, ClientSession and initialize)
+3. Measures per-call latency through mcp_local.session_pool
+4. Repeats the pooled measurement with concurrent calls
+
+--latency-ms adds an artificial delay to every HTTP request the stand-in server
+handles, to approximate the round trip to a remote server such as Smithery.
+
+The backend configuration is loaded on import, so the usual environment
+variables must be set (see utils/config.py).
+"""
+
+import argparse
+import asyncio
+import socket
+import statistics
+import threading
+import time
+from typing import List
+
+import uvicorn
+from mcp import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
+from mcp.server.fastmcp import FastMCP
+
+from mcp_local.session_pool import MCPSessionPool
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_stand_in_server(port: int, latency_ms: int) -> uvicorn.Server:
+    """Run a FastMCP echo server on a background thread"""
+    server = FastMCP("benchmark-stand-in")
+
+    @server.tool()
+    def echo(text: str) -> str:
+        """Return the input text"""
+        return text
+
+    app = server.streamable_http_app()
+
+    async def delayed_app(scope, receive, send):
+        if scope["type"] == "http" and latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        await app(scope, receive, send)
+
+    uvicorn_server = uvicorn.Server(uvicorn.Config(delayed_app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=uvicorn_server.run, daemon=True)
+    thread.start()
+    while not uvicorn_server.started:
+        time.sleep(0.05)
+    return uvicorn_server
+
+
+async def call_with_fresh_session(url: str, text: str):
+    async with streamablehttp_client(url) as (read_stream, write_stream, _):
+        async with ClientSession(read_stream, write_stream) as session:
+            await session.initialize()
+            return await session.call_tool("echo", {"text": text})
+
+
+def summarize(label: str, latencies: List[float], wall_time: float) -> None:
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(
+        f"{label:<32} calls={len(ordered):<4} mean={statistics.mean(ordered):7.1f}ms "
+        f"p50={statistics.median(ordered):7.1f}ms p95={p95:7.1f}ms wall={wall_time * 1000:8.1f}ms"
+    )
+
+
+async def timed(coro_factory) -> float:
+    start = time.perf_counter()
+    await coro_factory()
+    return (time.perf_counter() - start) * 1000
+
+
+async def run_benchmark(calls: int, concurrency: int, latency_ms: int) -> None:
+    port = _free_port()
+    server = start_stand_in_server(port, latency_ms)
+    url = f"http://127.0.0.1:{port}/mcp/"
+    config = {"benchmark": True}
+
+    try:
+        # Warm up the server so the first measured call is not an outlier
+        await call_with_fresh_session(url, "warmup")
+
+        start = time.perf_counter()
+        fresh = [await timed(lambda: call_with_fresh_session(url, f"call {i}")) for i in range(calls)]
+        summarize("fresh session per call", fresh, time.perf_counter() - start)
+
+        pool = MCPSessionPool()
+        start = time.perf_counter()
+        pooled = [
+            await timed(lambda: pool.run("stand-in", config, url, lambda s: s.call_tool("echo", {"text": f"call {i}"})))
+            for i in range(calls)
+        ]
+        summarize("pooled session (sequential)", pooled, time.perf_counter() - start)
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def pooled_call(i: int) -> float:
+            async with semaphore:
+                return await timed(lambda: pool.run("stand-in", config, url, lambda s: s.call_tool("echo", {"text": f"call {i}"})))
+
+        start = time.perf_counter()
+        concurrent = await asyncio.gather(*[pooled_call(i) for i in range(calls)])
+        summarize(f"pooled session (concurrency={concurrency})", list(concurrent), time.perf_counter() - start)
+
+        print(f"pool stats: {pool.stats}")
+        await pool.close_all()
+    finally:
+        server.should_exit = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MCP session pooling against a local stand-in server")
+    parser.add_argument("--calls", type=int, default=50, help="Number of tool calls per scenario (default: 50)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent callers for the last scenario (default: 4)")
+    parser.add_argument("--latency-ms", type=int, default=0, help="Artificial per-request server latency (default: 0)")
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.calls, args.concurrency, args.latency_ms))
+
+
+if __name__ == "__main__":
+    main()